@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from .services import get_db
+from .models import Archive
+from .card_renderer import card_renderer
+from .metrics import registry
+
+# Archives read from Firestore (and rendered) per step of an export.
+EXPORT_PAGE_SIZE = int(os.getenv("NEX_EXPORT_PAGE_SIZE", "20"))
+# Threads for the Firestore page reads of exports, kept off the default
+# executor that LLM calls occupy.
+EXPORT_THREADS = int(os.getenv("NEX_EXPORT_THREADS", "2"))
+# Manifest bytes held in memory before it spills to a temporary file.
+MANIFEST_SPOOL_BYTES = 256 * 1024
+
+exported_cards = registry.counter("nex_export_cards", "Archive cards written to exports, by source (cache, rendered).", ("source",))
+
+
+class _ZipSink:
+    """
+    Write-only file object for zipfile; the ZIP is written in streaming mode
+    (no seeks) and its bytes are handed out as they are produced.
+    """
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ArchiveExporter:
+    """
+    Streams a ZIP of a user's archive cards plus manifest.json. Archives are
+    read a page at a time and the page's cards rendered on the card
+    renderer's bounded pool, so memory stays bounded by the page size, not
+    the archive count.
+    """
+    def __init__(self, page_size: int = EXPORT_PAGE_SIZE, threads: int = EXPORT_THREADS):
+        self.page_size = page_size
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="archive-export")
+
+    def _page(self, uid: str, after) -> list:
+        query = get_db().collection("archives").where("user_id", "==", uid).order_by("__name__").limit(self.page_size)
+        if after is not None:
+            query = query.start_after(after)
+        return list(query.stream())
+
+    async def _card(self, archive: Archive, fmt: str, size: int) -> bytes:
+        cached = card_renderer.cached(archive, fmt, size)
+        if cached is not None:
+            exported_cards.inc(source="cache")
+            return cached
+        exported_cards.inc(source="rendered")
+        return await card_renderer.render_async(archive, fmt, size)
+
+    async def stream(self, uid: str, fmt: str, size: int):
+        """
+        Yields the ZIP's bytes: one card per archive, then manifest.json.
+        """
+        extension = fmt if fmt != "jpeg" else "jpg"
+        sink = _ZipSink()
+        with tempfile.SpooledTemporaryFile(max_size=MANIFEST_SPOOL_BYTES, mode="w+") as manifest, \
+                zipfile.ZipFile(sink, "w") as zf:
+            manifest.write("[")
+            count, after = 0, None
+            loop = asyncio.get_running_loop()
+            while True:
+                docs = await loop.run_in_executor(self._executor, self._page, uid, after)
+                if not docs:
+                    break
+                after = docs[-1]
+                archives = [Archive(**doc.to_dict()) for doc in docs]
+                # The whole page renders concurrently (bounded by the pool) and is written in order.
+                cards = await asyncio.gather(*(self._card(archive, fmt, size) for archive in archives))
+                for archive, card in zip(archives, cards):
+                    filename = f"cards/{archive.created_at:%Y-%m-%d}-{archive.archive_id}.{extension}"
+                    # Images are already compressed; store them as-is.
+                    zf.writestr(filename, card, compress_type=zipfile.ZIP_STORED)
+                    entry = archive.model_dump(mode="json")
+                    entry["file"] = filename
+                    manifest.write(("," if count else "") + json.dumps(entry))
+                    count += 1
+                    if data := sink.drain():
+                        yield data
+                if len(docs) < self.page_size:
+                    break
+            manifest.write("]")
+
+            manifest.seek(0)
+            info = zipfile.ZipInfo("manifest.json", time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with zf.open(info, "w") as entry_file:
+                while chunk := manifest.read(64 * 1024):
+                    entry_file.write(chunk.encode())
+                    if data := sink.drain():
+                        yield data
+        yield sink.drain()
+
+
+archive_exporter = ArchiveExporter()
@@ -1,23 +1,23 @@
 from datetime import datetime, timezone
 import uuid
-from .services import get_db
+from .services import get_db, services
+from .deadline import Deadline, MIN_LLM_BUDGET, WRITE_RESERVE
+from .model_router import model_router, is_light_reflection
+from .user_service import user_service
 from .models import Archive, Message, Tier, TIER_LIMITS
 from .prompts import get_reflection_prompt
-from firebase_admin import firestore
+from .doc_loader import document_loader
+from .card_renderer import card_renderer, DEFAULT_CARD_SIZE
 from loguru import logger
-import asyncio
-import vertexai
-from vertexai.generative_models import GenerativeModel, GenerationConfig
 import json
 from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont
 import random
 
+# Fields returned by the archive list endpoint, in response order.
+ARCHIVE_FIELDS = tuple(Archive.model_fields)
 
-class ArchiveService:
-    def __init__(self):
-        self.model_name = "gemini-2.0-flash"
 
+class ArchiveService:
     @property
     def db(self):
         return get_db()
@@ -25,10 +25,11 @@ class ArchiveService:
     def _get_archive_ref(self):
         return self.db.collection("archives")
 
-    async def generate_reflection(self, transcript: list[Message]) -> dict:
+    async def generate_reflection(self, transcript: list[Message], deadline: Deadline = None) -> dict:
         """
         Generates a reflection from the session transcript using an LLM.
-        Returns a dict with: title, reflection, emotion_tag.
+        Returns a dict with: title, reflection, emotion_tag. Falls back to a
+        generic reflection when the LLM fails or the deadline can't cover it.
         """
         # Format transcript
         if not transcript:
@@ -42,16 +43,23 @@ class ArchiveService:
         prompt = get_reflection_prompt(transcript_str)
         
         try:
-             model = GenerativeModel(self.model_name)
+             generative_models = services.generative_models()
              # Use json output
-             generation_config = GenerationConfig(response_mime_type="application/json")
+             generation_config = generative_models.GenerationConfig(response_mime_type="application/json")
              
-             response = await asyncio.to_thread(
-                 model.generate_content,
+             if deadline is not None:
+                 deadline.check("reflection", MIN_LLM_BUDGET + WRITE_RESERVE)
+             # Short sessions go to the light model; every route failing falls back below.
+             call = model_router.generate(
                  prompt,
-                 generation_config=generation_config
+                 generation_config=generation_config,
+                 light=is_light_reflection(len(transcript))
              )
-             data = json.loads(response.text)
+             if deadline is None:
+                 response_text = await call
+             else:
+                 response_text = await deadline.run("reflection", call, reserve=WRITE_RESERVE)
+             data = json.loads(response_text)
              # Basic validation
              if "title" not in data or "reflection" not in data:
                  raise ValueError("Invalid JSON structure")
@@ -65,11 +73,14 @@ class ArchiveService:
                 "emotion_tag": "reflective"
             }
 
-    async def create_archive_entry(self, uid: str, transcript: list[Message]) -> Archive:
-        reflection_data = await self.generate_reflection(transcript)
+    async def prepare_archive_entry(self, uid: str, transcript: list[Message], deadline: Deadline = None) -> Archive:
+        """
+        Generates the reflection and builds the archive entry, without saving it.
+        """
+        reflection_data = await self.generate_reflection(transcript, deadline)
         
         archive_id = str(uuid.uuid4())
-        archive_entry = Archive(
+        return Archive(
             archive_id=archive_id,
             user_id=uid,
             title=reflection_data.get("title", "Untitled"),
@@ -77,135 +88,55 @@ class ArchiveService:
             emotion_tag=reflection_data.get("emotion_tag", "neutral"),
             created_at=datetime.now(timezone.utc)
         )
-        
-        # Save to Firestore
-        self._get_archive_ref().document(archive_id).set(archive_entry.dict())
-        
-        return archive_entry
-        
-    async def get_user_archives(self, uid: str, limit: int = 10) -> list[Archive]:
+
+    def add_archive_entry(self, writer, archive_entry: Archive):
+        """
+        Saves `archive_entry` through `writer` (a WriteBatch), bumping the user's
+        archive_version (list ETag) in the same commit. After committing, call
+        `user_service.apply_usage_delta(uid, bump=("archive_version",))`.
+        """
+        writer.set(self._get_archive_ref().document(archive_entry.archive_id), archive_entry.dict())
+        user_service.add_usage(writer, archive_entry.user_id, bump=("archive_version",))
+
+    async def get_user_archives(self, uid: str, limit: int = 10) -> list[dict]:
+        """
+        Most recent archives as plain dicts with Archive's fields, for the
+        list endpoint's lean path. Documents are written from Archive, so they
+        are not validated again.
+        """
         docs = self._get_archive_ref().where("user_id", "==", uid)\
             .limit(50).stream() # Get recent archives (unordered)
             
-        archives = [Archive(**doc.to_dict()) for doc in docs]
+        archives = [{field: data[field] for field in ARCHIVE_FIELDS} for data in (doc.to_dict() for doc in docs)]
         # Sort desc
-        archives.sort(key=lambda x: x.created_at, reverse=True)
+        archives.sort(key=lambda x: x["created_at"], reverse=True)
         
         return archives[:limit]
 
     async def get_archive(self, archive_id: str) -> Archive | None:
-        doc = self._get_archive_ref().document(archive_id).get()
+        archive, _ = await self.get_archive_with_version(archive_id)
+        return archive
+
+    async def get_archive_with_version(self, archive_id: str) -> tuple[Archive | None, str | None]:
+        """
+        Returns the archive and its document update time, for use as an ETag.
+        """
+        doc = await document_loader.load(self._get_archive_ref().document(archive_id))
         if not doc.exists:
-            return None
-        return Archive(**doc.to_dict())
+            return None, None
+        return Archive(**doc.to_dict()), str(doc.update_time)
 
-    def generate_archive_image(self, archive: Archive) -> BytesIO:
+    def generate_archive_image(self, archive: Archive, fmt: str = "png", size: int = DEFAULT_CARD_SIZE) -> BytesIO:
         """
         Generates a shareable image for the archive entry.
-        Returns a BytesIO object containing the PNG image.
+        Returns a BytesIO object containing the encoded image.
         """
-        # Canvas setup
-        width, height = 1080, 1080 # Instagram square
-        
-        # Determine background color based on emotion
-        emotion_colors = {
-            "hopeful": (135, 206, 250), # Light Sky Blue
-            "conflicted": (221, 160, 221), # Plum
-            "lonely": (119, 136, 153), # Light Slate Gray
-            "weary": (169, 169, 169), # Dark Gray
-            "determined": (255, 127, 80), # Coral
-            "peaceful": (144, 238, 144), # Light Green
-            "reflective": (176, 196, 222) # Light Steel Blue
-        }
-        bg_color = emotion_colors.get(archive.emotion_tag.lower(), (240, 248, 255)) # Alice Blue default
-        
-        # Create image
-        img = Image.new('RGB', (width, height), color=bg_color)
-        draw = ImageDraw.Draw(img)
-        
-        # Load fonts - try a few common linux ones or fallback
-        try:
-            # Try specific aesthetic fonts if available, else default sans
-            font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
-            font_large = ImageFont.truetype(font_path, 60)
-            font_medium = ImageFont.truetype(font_path, 40)
-            font_small = ImageFont.truetype(font_path, 30)
-        except OSError:
-            # Fallback to default
-            font_large = ImageFont.load_default()
-            font_medium = ImageFont.load_default()
-            font_small = ImageFont.load_default()
+        return BytesIO(card_renderer.render(archive, fmt, size))
 
-        # Config
-        text_color = (40, 40, 40)
-        padding = 100
-        
-        # Draw Reflection (Centered, wrapped)
-        reflection_text = f'"{archive.reflection}"'
-        
-        # Simple text wrapping logic
-        def wrap_text(text, font, max_width):
-            lines = []
-            words = text.split()
-            current_line = []
-            
-            for word in words:
-                current_line.append(word)
-                # Check width
-                test_line = ' '.join(current_line)
-                bbox = draw.textbbox((0, 0), test_line, font=font)
-                w = bbox[2] - bbox[0]
-                if w > max_width:
-                    # Pop last word and save line
-                    current_line.pop()
-                    lines.append(' '.join(current_line))
-                    current_line = [word]
-            
-            if current_line:
-                lines.append(' '.join(current_line))
-            return lines
-
-        lines = wrap_text(reflection_text, font_large, width - 2*padding)
-        
-        # Calculate total height of text block to center responsibly
-        line_heights = []
-        for line in lines:
-            bbox = draw.textbbox((0, 0), line, font=font_large)
-            line_heights.append(bbox[3] - bbox[1] + 20) # +20 line spacing
-            
-        total_text_height = sum(line_heights)
-        current_y = (height - total_text_height) / 2 - 50 # Slightly up
-
-        for i, line in enumerate(lines):
-             # Center each line
-            bbox = draw.textbbox((0, 0), line, font=font_large)
-            w = bbox[2] - bbox[0]
-            x = (width - w) / 2
-            draw.text((x, current_y), line, font=font_large, fill=text_color)
-            current_y += line_heights[i]
-
-        # Draw Title (Top)
-        # title_text = archive.title.upper()
-        # bbox = draw.textbbox((0, 0), title_text, font=font_medium)
-        # w = bbox[2] - bbox[0]
-        # draw.text(((width - w)/2, 100), title_text, font=font_medium, fill=(80, 80, 80))
-
-        # Footer
-        footer_text = "From NEX"
-        bbox = draw.textbbox((0, 0), footer_text, font=font_medium)
-        w = bbox[2] - bbox[0]
-        draw.text(((width - w)/2, height - 150), footer_text, font=font_medium, fill=(100, 100, 100))
-        
-        # Date
-        date_str = archive.created_at.strftime("%B %d, %Y")
-        bbox = draw.textbbox((0, 0), date_str, font=font_small)
-        w = bbox[2] - bbox[0]
-        draw.text(((width - w)/2, height - 100), date_str, font=font_small, fill=(130, 130, 130))
-
-        # Output
-        img_io = BytesIO()
-        img.save(img_io, 'PNG')
-        img_io.seek(0)
-        return img_io
+    async def render_card(self, archive: Archive, fmt: str = "png", size: int = DEFAULT_CARD_SIZE) -> bytes:
+        """
+        Returns the encoded card, rendering it off the event loop on a cache miss.
+        """
+        return await card_renderer.render_async(archive, fmt, size)
 
 archive_service = ArchiveService()
@@ -1,19 +1,48 @@
+import os
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from firebase_admin import auth
 from loguru import logger
 
 security = HTTPBearer()
 
+# Operators allowed on admin endpoints besides users carrying the `admin: true` custom claim.
+ADMIN_UIDS = {uid.strip() for uid in os.getenv("NEX_ADMIN_UIDS", "").split(",") if uid.strip()}
+
+def verify_claims(token: str) -> dict:
+    """
+    Verifies a Firebase ID Token and returns its claims. Raises if it is invalid.
+    """
+    from firebase_admin import auth
+    return auth.verify_id_token(token)
+
+def verify_token(token: str) -> str:
+    """
+    Verifies a Firebase ID Token and returns the uid. Raises if it is invalid.
+    """
+    return verify_claims(token)['uid']
+
 async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
     """
     Dependency to verify Firebase ID Token and return the uid.
     """
     token = credentials.credentials
     try:
-        decoded_token = auth.verify_id_token(token)
-        uid = decoded_token['uid']
-        return uid
+        return verify_token(token)
+    except Exception as e:
+        logger.error(f"Auth error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired Firebase ID token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+async def get_admin_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    """
+    Dependency for operator endpoints: a valid token whose user has the
+    `admin` custom claim or is listed in NEX_ADMIN_UIDS.
+    """
+    try:
+        claims = verify_claims(credentials.credentials)
     except Exception as e:
         logger.error(f"Auth error: {e}")
         raise HTTPException(
@@ -21,3 +50,6 @@ async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depend
             detail="Invalid or expired Firebase ID token",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if claims.get("admin") is not True and claims["uid"] not in ADMIN_UIDS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return claims["uid"]
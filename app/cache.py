@@ -0,0 +1,221 @@
+import json
+import os
+import time
+from loguru import logger
+from .metrics import registry
+
+# redis://host:6379/0 for a shared Redis, memory:// for the embedded single-process
+# stand-in (local dev and tests). Unset disables the cache tier entirely.
+NEX_CACHE_URL = os.getenv("NEX_CACHE_URL")
+
+# TTLs are a safety net only; mutations write through to the cache.
+USER_STATE_TTL = int(os.getenv("NEX_CACHE_USER_TTL", "60"))
+ACTIVE_SESSION_TTL = int(os.getenv("NEX_CACHE_SESSION_TTL", "1200"))
+MEMORY_CONTEXT_TTL = int(os.getenv("NEX_CACHE_MEMORY_TTL", "300"))
+
+cache_requests = registry.counter(
+    "nex_cache_requests", "Shared cache lookups by namespace and result.", ("namespace", "result")
+)
+cache_errors = registry.counter(
+    "nex_cache_errors", "Shared cache operations that failed.", ("operation",)
+)
+
+# Applies HSET/HINCRBY operations only when the hash is still cached, so a
+# write-through never resurrects a partially populated entry after expiry.
+_UPDATE_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+for i = 1, #ARGV, 3 do
+    if ARGV[i] == 'set' then
+        redis.call('HSET', KEYS[1], ARGV[i + 1], ARGV[i + 2])
+    else
+        redis.call('HINCRBY', KEYS[1], ARGV[i + 1], ARGV[i + 2])
+    end
+end
+return 1
+"""
+
+
+class RedisBackend:
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url, decode_responses=True)
+        self._update_if_exists = self.client.register_script(_UPDATE_IF_EXISTS)
+
+    async def ping(self):
+        await self.client.ping()
+
+    async def get(self, key: str) -> str | None:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: str, ttl: int):
+        await self.client.set(key, value, ex=ttl)
+
+    async def set_nx(self, key: str, value: str, ttl: int) -> bool:
+        return bool(await self.client.set(key, value, ex=ttl, nx=True))
+
+    async def delete(self, *keys: str):
+        await self.client.delete(*keys)
+
+    async def hgetall(self, key: str) -> dict:
+        return await self.client.hgetall(key)
+
+    async def hset(self, key: str, mapping: dict, ttl: int):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, ttl)
+            await pipe.execute()
+
+    async def hupdate_if_exists(self, key: str, sets: dict, increments: dict) -> bool:
+        args = []
+        for field, value in sets.items():
+            args += ["set", field, value]
+        for field, delta in increments.items():
+            args += ["incr", field, delta]
+        return bool(await self._update_if_exists(keys=[key], args=args))
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class MemoryBackend:
+    """
+    Embedded stand-in with the same semantics as RedisBackend, kept in process memory.
+    Not shared across gunicorn workers; use it for local runs and tests.
+    """
+    def __init__(self):
+        self._data: dict[str, tuple[object, float]] = {}
+
+    def _live(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def ping(self):
+        return True
+
+    async def get(self, key: str) -> str | None:
+        return self._live(key)
+
+    async def set(self, key: str, value: str, ttl: int):
+        self._data[key] = (value, time.monotonic() + ttl)
+
+    async def set_nx(self, key: str, value: str, ttl: int) -> bool:
+        if self._live(key) is not None:
+            return False
+        self._data[key] = (value, time.monotonic() + ttl)
+        return True
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def hgetall(self, key: str) -> dict:
+        return dict(self._live(key) or {})
+
+    async def hset(self, key: str, mapping: dict, ttl: int):
+        self._data[key] = ({k: str(v) for k, v in mapping.items()}, time.monotonic() + ttl)
+
+    async def hupdate_if_exists(self, key: str, sets: dict, increments: dict) -> bool:
+        value = self._live(key)
+        if value is None:
+            return False
+        for field, new_value in sets.items():
+            value[field] = str(new_value)
+        for field, delta in increments.items():
+            value[field] = str(int(value.get(field, 0)) + delta)
+        return True
+
+    async def close(self):
+        self._data.clear()
+
+
+class SharedCache:
+    """
+    Optional cache tier shared by all workers. Every operation degrades to a
+    miss (or a no-op) on error so Firestore stays the source of truth.
+    """
+    def __init__(self):
+        self.backend = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def connect(self, url: str = None):
+        url = url or NEX_CACHE_URL
+        if not url:
+            logger.info("Shared cache disabled (NEX_CACHE_URL not set).")
+            return
+        try:
+            if url.startswith("memory://"):
+                backend = MemoryBackend()
+            else:
+                backend = RedisBackend(url)
+            await backend.ping()
+            self.backend = backend
+            logger.info(f"Shared cache connected: {url.split('@')[-1]}")
+        except Exception as e:
+            logger.warning(f"Shared cache unavailable, continuing without it: {e}")
+            self.backend = None
+
+    async def close(self):
+        if self.backend:
+            await self.backend.close()
+            self.backend = None
+
+    async def _call(self, operation: str, coro_factory, default=None):
+        if not self.backend:
+            return default
+        try:
+            return await coro_factory()
+        except Exception as e:
+            cache_errors.inc(operation=operation)
+            logger.warning(f"Shared cache {operation} failed: {e}")
+            return default
+
+    async def get_json(self, namespace: str, key: str):
+        raw = await self._call("get", lambda: self.backend.get(f"{namespace}:{key}"))
+        if self.backend:
+            cache_requests.inc(namespace=namespace, result="hit" if raw is not None else "miss")
+        return json.loads(raw) if raw is not None else None
+
+    async def set_json(self, namespace: str, key: str, value, ttl: int):
+        await self._call("set", lambda: self.backend.set(f"{namespace}:{key}", json.dumps(value), ttl))
+
+    async def claim(self, namespace: str, key: str, ttl: int) -> bool:
+        """
+        Sets a marker only if it is absent (SET NX). Returns True when this
+        caller now holds it, and also when the cache is disabled or failing,
+        so callers fall back to acting alone.
+        """
+        return await self._call("set_nx", lambda: self.backend.set_nx(f"{namespace}:{key}", "1", ttl), default=True)
+
+    async def get_hash(self, namespace: str, key: str, required: tuple = ()) -> dict | None:
+        data = await self._call("hgetall", lambda: self.backend.hgetall(f"{namespace}:{key}"))
+        if data and all(field in data for field in required):
+            cache_requests.inc(namespace=namespace, result="hit")
+            return data
+        if self.backend:
+            cache_requests.inc(namespace=namespace, result="miss")
+        return None
+
+    async def set_hash(self, namespace: str, key: str, mapping: dict, ttl: int):
+        await self._call("hset", lambda: self.backend.hset(f"{namespace}:{key}", mapping, ttl))
+
+    async def update_hash(self, namespace: str, key: str, sets: dict = None, increments: dict = None):
+        await self._call(
+            "hupdate",
+            lambda: self.backend.hupdate_if_exists(f"{namespace}:{key}", sets or {}, increments or {}),
+        )
+
+    async def delete(self, namespace: str, key: str):
+        await self._call("delete", lambda: self.backend.delete(f"{namespace}:{key}"))
+
+
+shared_cache = SharedCache()
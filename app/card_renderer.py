@@ -0,0 +1,229 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from .models import Archive
+
+# Card edge lengths that can be requested; templates and fonts are cached per size.
+CARD_SIZES = (360, 540, 720, 1080)
+DEFAULT_CARD_SIZE = 1080
+# Output formats: (media type, Pillow format, save options). PNG deflate level 3
+# encodes ~1.5x faster than the default 6 for a ~20% larger file. WebP method 2
+# is ~2x faster to encode than the default 4 for a ~5% larger file.
+CARD_FORMATS = {
+    "png": ("image/png", "PNG", {"compress_level": 3}),
+    "webp": ("image/webp", "WEBP", {"quality": int(os.getenv("NEX_CARD_WEBP_QUALITY", "85")), "method": 2}),
+    "jpeg": ("image/jpeg", "JPEG", {"quality": int(os.getenv("NEX_CARD_JPEG_QUALITY", "88"))}),
+}
+# PNGs are lossless by default. Cards are flat colour plus anti-aliased text, so
+# a palette (e.g. 64) gives about a third of the RGB size, with slightly coarser
+# text edges; 0 keeps full RGB.
+PNG_PALETTE_COLORS = int(os.getenv("NEX_CARD_PNG_COLORS", "0"))
+# Threads rendering cards (downloads and exports). Kept off the default
+# executor, where LLM calls can hold every thread for seconds.
+CARD_RENDER_THREADS = int(os.getenv("NEX_CARD_RENDER_THREADS", "2"))
+# Encoded cards kept per worker, by total size.
+CARD_CACHE_BYTES = int(os.getenv("NEX_CARD_CACHE_MB", "32")) * 1024 * 1024
+
+FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+
+EMOTION_COLORS = {
+    "hopeful": (135, 206, 250),     # Light Sky Blue
+    "conflicted": (221, 160, 221),  # Plum
+    "lonely": (119, 136, 153),      # Light Slate Gray
+    "weary": (169, 169, 169),       # Dark Gray
+    "determined": (255, 127, 80),   # Coral
+    "peaceful": (144, 238, 144),    # Light Green
+    "reflective": (176, 196, 222),  # Light Steel Blue
+}
+DEFAULT_COLOR = (240, 248, 255)     # Alice Blue
+
+TEXT_COLOR = (40, 40, 40)
+FOOTER_COLOR = (100, 100, 100)
+DATE_COLOR = (130, 130, 130)
+
+# Layout at 1080px, scaled for smaller cards.
+_PADDING = 100
+_LINE_SPACING = 20
+_FOOTER_Y = 150
+_DATE_Y = 100
+
+
+@lru_cache(maxsize=len(CARD_SIZES))
+def load_fonts(size: int = DEFAULT_CARD_SIZE):
+    """
+    Loads the card fonts for a card size once per worker (large, medium, small).
+    """
+    from PIL import ImageFont
+    scale = size / DEFAULT_CARD_SIZE
+    try:
+        return tuple(ImageFont.truetype(FONT_PATH, round(points * scale)) for points in (60, 40, 30))
+    except OSError:
+        # Fallback to default
+        default = ImageFont.load_default()
+        return default, default, default
+
+
+class GlyphWidths:
+    """
+    Advance widths of a font's characters, measured once each, so wrapping a
+    line costs a dict lookup per character instead of a layout per word.
+    """
+    def __init__(self, font):
+        self.font = font
+        self._widths: dict[str, float] = {}
+        self.space = self.char(" ")
+
+    def char(self, ch: str) -> float:
+        width = self._widths.get(ch)
+        if width is None:
+            width = self._widths[ch] = self.font.getlength(ch)
+        return width
+
+    def text(self, text: str) -> float:
+        return sum(self.char(ch) for ch in text)
+
+
+@lru_cache(maxsize=len(CARD_SIZES))
+def glyph_widths(size: int) -> GlyphWidths:
+    return GlyphWidths(load_fonts(size)[0])
+
+
+def wrap_text(text: str, widths: GlyphWidths, max_width: float) -> list[str]:
+    """
+    Greedy word wrap in one pass over the words. Kerning is ignored, so
+    lines can come out a pixel or two off the exact layout width.
+    """
+    lines = []
+    current, current_width = [], 0.0
+    for word in text.split():
+        word_width = widths.text(word)
+        if current and current_width + widths.space + word_width > max_width:
+            lines.append(" ".join(current))
+            current, current_width = [word], word_width
+        elif current:
+            current.append(word)
+            current_width += widths.space + word_width
+        else:
+            current, current_width = [word], word_width
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+
+@lru_cache(maxsize=16)
+def card_template(emotion: str, size: int):
+    """
+    Background and "From NEX" footer for an emotion, composited once; each
+    card starts from a copy.
+    """
+    from PIL import Image, ImageDraw
+    img = Image.new("RGB", (size, size), color=EMOTION_COLORS.get(emotion, DEFAULT_COLOR))
+    draw = ImageDraw.Draw(img)
+    _, font_medium, _ = load_fonts(size)
+    scale = size / DEFAULT_CARD_SIZE
+    footer_text = "From NEX"
+    w = draw.textlength(footer_text, font=font_medium)
+    draw.text(((size - w) / 2, size - _FOOTER_Y * scale), footer_text, font=font_medium, fill=FOOTER_COLOR)
+    return img
+
+
+def encode(img, fmt: str) -> bytes:
+    from io import BytesIO
+    from PIL import Image
+    _, pil_format, options = CARD_FORMATS[fmt]
+    if fmt == "png" and PNG_PALETTE_COLORS:
+        img = img.quantize(PNG_PALETTE_COLORS, method=Image.Quantize.FASTOCTREE)
+    buffer = BytesIO()
+    img.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+class CardRenderer:
+    """
+    Renders archive cards from per-emotion templates and keeps recently
+    encoded cards in a byte-bounded LRU cache. Thread-safe; from the event
+    loop use render_async, which renders on the renderer's own threads.
+    """
+    def __init__(self, cache_bytes: int = CARD_CACHE_BYTES, threads: int = CARD_RENDER_THREADS):
+        self.cache_bytes = cache_bytes
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="card-render")
+        self._cache: OrderedDict[tuple, bytes] = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(archive: Archive, fmt: str, size: int) -> tuple:
+        return (archive.archive_id, archive.reflection, archive.emotion_tag, archive.created_at, fmt, size)
+
+    def cached(self, archive: Archive, fmt: str = "png", size: int = DEFAULT_CARD_SIZE) -> bytes | None:
+        key = self.cache_key(archive, fmt, size)
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+            return data
+
+    def _store(self, key: tuple, data: bytes):
+        if len(data) > self.cache_bytes:
+            return
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = data
+            self._cached_bytes += len(data)
+            while self._cached_bytes > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+
+    def draw(self, archive: Archive, size: int = DEFAULT_CARD_SIZE):
+        """
+        Returns the card as a Pillow image.
+        """
+        from PIL import ImageDraw
+        img = card_template(archive.emotion_tag.lower(), size).copy()
+        draw = ImageDraw.Draw(img)
+        font_large, _, font_small = load_fonts(size)
+        scale = size / DEFAULT_CARD_SIZE
+
+        lines = wrap_text(f'"{archive.reflection}"', glyph_widths(size), size - 2 * _PADDING * scale)
+        boxes = [font_large.getbbox(line) for line in lines]
+        line_heights = [bbox[3] - bbox[1] + _LINE_SPACING * scale for bbox in boxes]
+        current_y = (size - sum(line_heights)) / 2 - 50 * scale  # Slightly up
+        for line, bbox, line_height in zip(lines, boxes, line_heights):
+            draw.text(((size - (bbox[2] - bbox[0])) / 2, current_y), line, font=font_large, fill=TEXT_COLOR)
+            current_y += line_height
+
+        date_str = archive.created_at.strftime("%B %d, %Y")
+        w = draw.textlength(date_str, font=font_small)
+        draw.text(((size - w) / 2, size - _DATE_Y * scale), date_str, font=font_small, fill=DATE_COLOR)
+        return img
+
+    def render(self, archive: Archive, fmt: str = "png", size: int = DEFAULT_CARD_SIZE) -> bytes:
+        """
+        Returns the encoded card, from the cache when it was rendered recently.
+        """
+        key = self.cache_key(archive, fmt, size)
+        data = self.cached(archive, fmt, size)
+        if data is not None:
+            return data
+
+        data = encode(self.draw(archive, size), fmt)
+        self._store(key, data)
+        return data
+
+    async def render_async(self, archive: Archive, fmt: str = "png", size: int = DEFAULT_CARD_SIZE) -> bytes:
+        """
+        render() for the event loop: cache hits return directly, misses
+        render on the renderer's thread pool.
+        """
+        cached = self.cached(archive, fmt, size)
+        if cached is not None:
+            return cached
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.render, archive, fmt, size)
+
+
+card_renderer = CardRenderer()
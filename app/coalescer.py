@@ -0,0 +1,95 @@
+import asyncio
+import os
+import time
+from loguru import logger
+from .lifecycle import lifecycle
+from .metrics import registry
+
+# A turn is answered once no new fragment arrived for this long...
+COALESCE_WINDOW = float(os.getenv("NEX_COALESCE_WINDOW_MS", "700")) / 1000
+# ...or once its first fragment has waited this long, whichever comes first.
+COALESCE_MAX_WAIT = float(os.getenv("NEX_COALESCE_MAX_WAIT_MS", "2500")) / 1000
+
+# Returned to a fragment's request when a later fragment took over its turn.
+MERGED = "MERGED"
+
+fragments_per_turn = registry.histogram(
+    "nex_coalesced_turn_fragments", "Fragments merged into each coalesced turn.",
+    buckets=(1, 2, 3, 4, 6, 8, 12),
+)
+
+
+class _PendingTurn:
+    def __init__(self):
+        self.fragments: list[str] = []
+        self.waiter: asyncio.Future | None = None
+        self.started_at = time.monotonic()
+        self.last_at = self.started_at
+
+
+class TurnCoalescer:
+    """
+    Debounces fragments submitted under the same key (uid, session) into a
+    single turn. The request holding the latest fragment receives the turn's
+    result; each earlier one is released with MERGED as soon as a newer
+    fragment arrives.
+
+    State is per worker, so fragments coalesce only when they reach the same
+    process (voice clients reuse one keep-alive connection).
+    """
+    def __init__(self, window: float = COALESCE_WINDOW, max_wait: float = COALESCE_MAX_WAIT):
+        self.window = window
+        self.max_wait = max_wait
+        self._pending: dict[tuple, _PendingTurn] = {}
+
+    async def submit(self, key: tuple, fragment: str, run_turn):
+        """
+        Queues `fragment` and waits for its outcome: the result of
+        `run_turn(merged_text)` or MERGED. run_turn comes from the request
+        that opened the turn.
+        """
+        turn = self._pending.get(key)
+        if turn is None:
+            turn = _PendingTurn()
+            self._pending[key] = turn
+            lifecycle.spawn(self._run_when_quiet(key, turn, run_turn), name="coalesced-turn")
+        elif turn.waiter is not None and not turn.waiter.done():
+            turn.waiter.set_result(MERGED)
+
+        turn.fragments.append(fragment)
+        turn.last_at = time.monotonic()
+        turn.waiter = asyncio.get_running_loop().create_future()
+        return await turn.waiter
+
+    async def _run_when_quiet(self, key: tuple, turn: _PendingTurn, run_turn):
+        try:
+            while True:
+                due = min(turn.last_at + self.window, turn.started_at + self.max_wait)
+                remaining = due - time.monotonic()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(remaining)
+
+            # Fragments arriving from here on start the next turn.
+            if self._pending.get(key) is turn:
+                del self._pending[key]
+            fragments_per_turn.observe(len(turn.fragments))
+            if len(turn.fragments) > 1:
+                logger.info(f"Coalesced {len(turn.fragments)} fragments into one turn")
+
+            result = await run_turn(" ".join(f.strip() for f in turn.fragments if f.strip()))
+        except asyncio.CancelledError:
+            # Cancelled by shutdown drain; don't leave the request hanging.
+            if self._pending.get(key) is turn:
+                del self._pending[key]
+            turn.waiter.cancel()
+            raise
+        except Exception as e:
+            if not turn.waiter.done():
+                turn.waiter.set_exception(e)
+            return
+        if not turn.waiter.done():
+            turn.waiter.set_result(result)
+
+
+turn_coalescer = TurnCoalescer()
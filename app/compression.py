@@ -0,0 +1,127 @@
+import os
+import zlib
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Bodies smaller than this are sent as-is; compressing them costs more than it saves.
+COMPRESS_MIN_SIZE = int(os.getenv("NEX_COMPRESS_MIN_SIZE", "1024"))
+# Moderate levels: API responses are compressed per request, not once at build time.
+GZIP_LEVEL = int(os.getenv("NEX_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("NEX_BROTLI_QUALITY", "4"))
+
+# Images and archives are already compressed.
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+
+class _GzipCompressor:
+    """
+    zlib in gzip framing, with the process/flush/finish interface of brotli.Compressor.
+    """
+    def __init__(self, level: int):
+        self._zlib = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def process(self, data: bytes) -> bytes:
+        return self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._zlib.flush()
+
+
+CODINGS = {
+    "br": lambda: brotli.Compressor(quality=BROTLI_QUALITY),
+    "gzip": lambda: _GzipCompressor(GZIP_LEVEL),
+}
+
+
+class _CompressingSend:
+    """
+    Wraps the ASGI send of one response. http.response.start is held back until
+    the first body message shows whether the response gets compressed.
+    """
+    def __init__(self, send: Send, coding: str, minimum_size: int):
+        self.send = send
+        self.coding = coding
+        self.minimum_size = minimum_size
+        self.start: Message | None = None
+        self.passthrough = False
+        self.compressor = None
+
+    async def _send_start(self):
+        if self.start is not None:
+            start, self.start = self.start, None
+            await self.send(start)
+
+    def _compress(self, body: bytes, more_body: bool) -> bytes:
+        data = self.compressor.process(body)
+        return data + (self.compressor.flush() if more_body else self.compressor.finish())
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            self.start = message
+            self.passthrough = (
+                "content-encoding" in headers
+                or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            )
+            return
+        # Anything but a body (e.g. pathsend) and excluded responses go out unchanged
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send_start()
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self._send_start()
+                await self.send(message)
+                return
+            self.compressor = CODINGS[self.coding]()
+            body = self._compress(body, more_body)
+            headers = MutableHeaders(raw=self.start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            headers["Content-Encoding"] = self.coding
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await self._send_start()
+        else:
+            body = self._compress(body, more_body)
+        await self.send({**message, "body": body})
+
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() == coding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class CompressionMiddleware:
+    """
+    Compresses textual responses above COMPRESS_MIN_SIZE, preferring brotli
+    over gzip when the client accepts both.
+    """
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        coding = next((c for c in CODINGS if _accepts(accept_encoding, c)), None)
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, coding, self.minimum_size))
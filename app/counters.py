@@ -0,0 +1,83 @@
+import asyncio
+import os
+import random
+from .doc_loader import document_loader
+from .metrics import registry
+
+# Shard documents per counter. Firestore sustains about one write per second
+# per document, so this bounds the sustained increment rate of one user's (or
+# one session's) counters. Shards are addressed by index, so before lowering
+# this the higher shards must be folded into their parents (for usage shards:
+# python -m app.jobs.reconcile_usage --fold).
+COUNTER_SHARDS = int(os.getenv("NEX_COUNTER_SHARDS", "8"))
+
+counter_increments = registry.counter(
+    "nex_counter_increments", "Increments written to sharded counters, by counter collection.", ("counter",)
+)
+
+
+class ShardedCounter:
+    """
+    Integer counters of one parent document (a user, a session) spread over
+    shard documents `{parent}/{collection}/{index}`. Each increment lands on
+    a random shard, so concurrent increments rarely touch the same document.
+
+    A counter's value is the parent's own field (its base: values written
+    before sharding, or shards folded back in) plus every shard's field.
+    """
+    def __init__(self, collection: str, shards: int = COUNTER_SHARDS):
+        self.collection = collection
+        self.shards = shards
+
+    def shard_refs(self, parent_ref) -> list:
+        return [parent_ref.collection(self.collection).document(str(i)) for i in range(self.shards)]
+
+    def increment(self, writer, parent_ref, deltas: dict):
+        """
+        Adds `deltas` ({field: n}) to a random shard through `writer`, a
+        WriteBatch to commit along with other writes. Use `commit` for a
+        standalone increment.
+        """
+        from firebase_admin import firestore
+        shard = parent_ref.collection(self.collection).document(str(random.randrange(self.shards)))
+        writer.set(shard, {field: firestore.Increment(delta) for field, delta in deltas.items()}, merge=True)
+        counter_increments.inc(counter=self.collection)
+
+    def commit(self, db, parent_ref, deltas: dict, timeout: float = None):
+        batch = db.batch()
+        self.increment(batch, parent_ref, deltas)
+        batch.commit(timeout=timeout)
+
+    async def load(self, parent_ref):
+        """
+        Reads the parent and its shards in one batched round trip. Returns
+        (parent snapshot, shard snapshots); see `rollup`.
+        """
+        snapshots = await asyncio.gather(
+            document_loader.load(parent_ref), *(document_loader.load(ref) for ref in self.shard_refs(parent_ref))
+        )
+        return snapshots[0], snapshots[1:]
+
+    @staticmethod
+    def rollup(base: dict, shards: list, fields: tuple) -> dict:
+        """
+        `base` (the parent's data) with each of `fields` replaced by its total.
+        """
+        totals = dict(base)
+        for field in fields:
+            totals[field] = int(base.get(field) or 0)
+        for shard in shards:
+            if shard.exists:
+                data = shard.to_dict()
+                for field in fields:
+                    totals[field] += int(data.get(field) or 0)
+        return totals
+
+    async def totals(self, parent_ref, fields: tuple) -> dict | None:
+        """
+        The parent's data with `fields` rolled up, or None if it does not exist.
+        """
+        parent, shards = await self.load(parent_ref)
+        if not parent.exists:
+            return None
+        return self.rollup(parent.to_dict(), shards, fields)
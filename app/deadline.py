@@ -0,0 +1,76 @@
+import asyncio
+import os
+import time
+from .metrics import registry
+
+# Time budget per route, in seconds. Keep these below gunicorn's worker
+# timeout so a slow dependency produces a 504 instead of a killed worker.
+ROUTE_BUDGETS = {
+    "interact": float(os.getenv("NEX_DEADLINE_INTERACT", "20")),
+    "session_end": float(os.getenv("NEX_DEADLINE_SESSION_END", "25")),
+    "ws_turn": float(os.getenv("NEX_DEADLINE_WS_TURN", "20")),
+}
+# An LLM call is not started with less than this left...
+MIN_LLM_BUDGET = float(os.getenv("NEX_DEADLINE_MIN_LLM", "2"))
+# ...and leaves this much for the writes that follow it.
+WRITE_RESERVE = float(os.getenv("NEX_DEADLINE_WRITE_RESERVE", "1"))
+
+deadline_exceeded = registry.counter(
+    "nex_deadline_exceeded", "Requests that ran out of their deadline budget, by the stage that was cut.", ("stage",)
+)
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline exceeded at {stage}")
+        self.stage = stage
+        deadline_exceeded.inc(stage=stage)
+
+
+class Deadline:
+    """
+    Absolute time budget for one request, passed down to each stage so it
+    can skip work, bound SDK timeouts, or give up when the budget is spent.
+    """
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def for_route(cls, route: str) -> "Deadline":
+        return cls(ROUTE_BUDGETS[route])
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def covers(self, seconds: float) -> bool:
+        return self.remaining() >= seconds
+
+    def check(self, stage: str, need: float = 0.0):
+        """
+        Raises DeadlineExceeded unless at least `need` seconds are left.
+        """
+        if self.remaining() <= need:
+            raise DeadlineExceeded(stage)
+
+    def timeout(self, stage: str, reserve: float = 0.0) -> float:
+        """
+        Timeout for an SDK call (Firestore `timeout=`), leaving `reserve` for later stages.
+        """
+        self.check(stage, reserve)
+        return self.remaining() - reserve
+
+    async def run(self, stage: str, awaitable, reserve: float = 0.0):
+        """
+        Awaits `awaitable`, cancelling it when the budget (minus `reserve`) runs out.
+        """
+        try:
+            timeout = self.timeout(stage, reserve)
+        except DeadlineExceeded:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(stage) from None
@@ -0,0 +1,92 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from .services import get_db
+from .lifecycle import lifecycle
+from .metrics import registry
+
+# Point reads issued within this window are sent to Firestore as one get_all.
+LOADER_WINDOW = float(os.getenv("NEX_LOADER_WINDOW_MS", "2")) / 1000
+# A batch is sent as soon as it holds this many distinct documents.
+LOADER_MAX_BATCH = int(os.getenv("NEX_LOADER_MAX_BATCH", "100"))
+# Threads issuing get_all. Separate from the default executor, where LLM calls
+# can hold every thread for seconds.
+LOADER_THREADS = int(os.getenv("NEX_LOADER_THREADS", "4"))
+
+loader_batch_size = registry.histogram(
+    "nex_loader_batch_size", "Distinct documents per batched Firestore get_all.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 100),
+)
+loader_reads = registry.counter(
+    "nex_loader_reads", "Point reads through the document loader, by outcome (batched, deduplicated).",
+    ("outcome",),
+)
+
+
+class DocumentLoader:
+    """
+    Micro-batches document point reads from concurrent requests: reads
+    issued within LOADER_WINDOW share one get_all round trip, and reads of a
+    document already waiting in the batch share its result.
+
+    Deduplication only spans the collecting batch, never a get_all already
+    sent, so a read issued after a write always observes it.
+    """
+    def __init__(self, window: float = LOADER_WINDOW, max_batch: int = LOADER_MAX_BATCH):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: dict[str, tuple[object, asyncio.Future]] = {}
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._executor = ThreadPoolExecutor(max_workers=LOADER_THREADS, thread_name_prefix="doc-loader")
+
+    async def load(self, ref):
+        """
+        Returns the snapshot of a DocumentReference (check .exists as with ref.get()).
+        """
+        pending = self._pending.get(ref.path)
+        if pending is not None:
+            loader_reads.inc(outcome="deduplicated")
+            return await asyncio.shield(pending[1])
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[ref.path] = (ref, future)
+        loader_reads.inc(outcome="batched")
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        # Shielded: one caller giving up must not cancel the read for the others.
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            loader_batch_size.observe(len(batch))
+            lifecycle.spawn(self._fetch(batch), name="doc-loader-batch")
+
+    async def _fetch(self, batch: dict):
+        refs = [ref for ref, _ in batch.values()]
+        try:
+            loop = asyncio.get_running_loop()
+            snapshots = await loop.run_in_executor(self._executor, lambda: list(get_db().get_all(refs)))
+        except Exception as e:
+            logger.error(f"Batched read of {len(refs)} documents failed: {e}")
+            for _, future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for snapshot in snapshots:
+            _, future = batch[snapshot.reference.path]
+            if not future.done():
+                future.set_result(snapshot)
+        for _, future in batch.values():
+            if not future.done():
+                future.set_exception(LookupError("Document missing from get_all response"))
+
+
+document_loader = DocumentLoader()
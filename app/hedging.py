@@ -0,0 +1,108 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from .metrics import registry
+
+# Hedging is opt-in: it trades extra Gemini calls (up to HEDGE_MAX_PERCENT) for a shorter tail.
+HEDGE_ENABLED = os.getenv("NEX_HEDGE_ENABLED", "0") == "1"
+# At most this share of calls gets a second request.
+HEDGE_MAX_PERCENT = float(os.getenv("NEX_HEDGE_MAX_PERCENT", "5"))
+# Never hedge sooner than this, whatever the p95 says.
+HEDGE_MIN_DELAY = float(os.getenv("NEX_HEDGE_MIN_DELAY_MS", "250")) / 1000
+# Latencies per key kept for the rolling p95, and how many are needed before hedging starts.
+HEDGE_WINDOW = int(os.getenv("NEX_HEDGE_WINDOW", "500"))
+HEDGE_MIN_SAMPLES = 20
+
+hedge_calls = registry.counter(
+    "nex_hedge_calls",
+    "Hedgeable calls by outcome (primary: no hedge needed, hedged_primary_won, hedged_hedge_won, capped).",
+    ("key", "outcome"),
+)
+
+
+class Hedger:
+    """
+    Issues a second identical request when the first has not returned
+    within the rolling p95 latency for its key, and uses whichever finishes
+    first; the other is cancelled. Hedges are capped at HEDGE_MAX_PERCENT of
+    the last HEDGE_WINDOW calls.
+
+    A cancelled call that runs in a thread keeps running until the SDK
+    returns; only its result is dropped.
+    """
+    def __init__(self, enabled: bool = HEDGE_ENABLED, max_percent: float = HEDGE_MAX_PERCENT,
+                 min_delay: float = HEDGE_MIN_DELAY, window: int = HEDGE_WINDOW):
+        self.enabled = enabled
+        self.max_percent = max_percent
+        self.min_delay = min_delay
+        self.window = window
+        self._latencies: dict[str, deque] = {}
+        self._hedged = deque(maxlen=window)
+
+    def threshold(self, key: str) -> float | None:
+        """
+        Delay after which a call under `key` is hedged, or None until enough samples.
+        """
+        samples = self._latencies.get(key)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        p95 = ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+        return max(p95, self.min_delay)
+
+    def _budget_left(self) -> bool:
+        return sum(self._hedged) < self.max_percent / 100 * max(len(self._hedged), HEDGE_MIN_SAMPLES)
+
+    def _record(self, key: str, latency: float, hedged: bool):
+        self._latencies.setdefault(key, deque(maxlen=self.window)).append(latency)
+        self._hedged.append(1 if hedged else 0)
+
+    async def call(self, key: str, attempt):
+        """
+        Awaits `attempt()` (a coroutine factory), hedging it with a second
+        `attempt()` if it is slow. Raises only when every started attempt failed.
+        """
+        started = time.monotonic()
+        delay = self.threshold(key) if self.enabled else None
+        if delay is None:
+            result = await attempt()
+            self._record(key, time.monotonic() - started, hedged=False)
+            return result
+
+        primary = asyncio.ensure_future(attempt())
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                hedge_calls.inc(key=key, outcome="primary")
+                self._record(key, time.monotonic() - started, hedged=False)
+                return primary.result()
+            if not self._budget_left():
+                hedge_calls.inc(key=key, outcome="capped")
+                result = await primary
+                self._record(key, time.monotonic() - started, hedged=False)
+                return result
+
+            hedge = asyncio.ensure_future(attempt())
+            pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = "hedged_primary_won" if task is primary else "hedged_hedge_won"
+                        hedge_calls.inc(key=key, outcome=winner)
+                        self._record(key, time.monotonic() - started, hedged=True)
+                        return task.result()
+                    error = error or task.exception()
+            self._record(key, time.monotonic() - started, hedged=True)
+            raise error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+
+hedger = Hedger()
@@ -0,0 +1,36 @@
+import hashlib
+from fastapi import Request, Response
+
+# Clients may keep the body but must revalidate it on every poll.
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """
+    Builds a weak ETag from the values that determine a response, e.g. a
+    version counter or a document update time. Weak because the body bytes
+    differ with Content-Encoding while the representation stays the same.
+    """
+    digest = hashlib.sha1(":".join(str(p) for p in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Response | None:
+    """
+    Sets the validator headers on the response. Returns a bodyless 304 when
+    the client's If-None-Match already matches, so the caller can skip the
+    remaining reads and serialization; returns None otherwise.
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
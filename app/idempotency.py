@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from fastapi import HTTPException
+from loguru import logger
+from .cache import shared_cache
+from .lifecycle import lifecycle
+from .metrics import registry
+
+# How long a completed response is replayed for a retried key.
+IDEMPOTENCY_TTL = int(os.getenv("NEX_IDEMPOTENCY_TTL", "86400"))
+# Upper bound on how long a request can hold a key while running; a crashed
+# worker's claim expires after this.
+IDEMPOTENCY_PENDING_TTL = int(os.getenv("NEX_IDEMPOTENCY_PENDING_TTL", "120"))
+# How long a retry waits for the original request running on another worker.
+IDEMPOTENCY_WAIT = float(os.getenv("NEX_IDEMPOTENCY_WAIT", "30"))
+# Completed responses also kept in this worker (the only store without NEX_CACHE_URL).
+IDEMPOTENCY_LOCAL_MAX = int(os.getenv("NEX_IDEMPOTENCY_LOCAL_MAX", "10000"))
+MAX_KEY_LENGTH = 255
+
+idempotency_requests = registry.counter(
+    "nex_idempotency_requests",
+    "Requests carrying an Idempotency-Key, by outcome (executed, replayed, joined, conflict).",
+    ("outcome",),
+)
+
+
+def fingerprint(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Idempotency-Key handling, scoped per uid.
+
+    A key's first request runs the work; its response is stored for
+    IDEMPOTENCY_TTL and replayed to retries. A retry that arrives while the
+    original is still running attaches to the same in-flight task on this
+    worker, or waits for the result when another worker holds the key.
+    Failed requests (exceptions) are not stored, so they can be retried.
+    """
+    def __init__(self):
+        self._inflight: dict[str, tuple[str, asyncio.Task]] = {}
+        self._completed: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    def _local_get(self, scope: str) -> dict | None:
+        entry = self._completed.get(scope)
+        if entry is None:
+            return None
+        expires_at, record = entry
+        if expires_at < time.monotonic():
+            del self._completed[scope]
+            return None
+        return record
+
+    async def _store(self, scope: str, record: dict):
+        self._completed[scope] = (time.monotonic() + IDEMPOTENCY_TTL, record)
+        self._completed.move_to_end(scope)
+        while len(self._completed) > IDEMPOTENCY_LOCAL_MAX:
+            self._completed.popitem(last=False)
+        await shared_cache.set_json("idem", scope, record, IDEMPOTENCY_TTL)
+
+    async def _execute(self, scope: str, request_fingerprint: str, fn) -> dict:
+        try:
+            status_code, body = await fn()
+            record = {
+                "fingerprint": request_fingerprint,
+                "status_code": status_code,
+                "body": body.model_dump(mode="json"),
+            }
+            await self._store(scope, record)
+            return record
+        finally:
+            self._inflight.pop(scope, None)
+            await shared_cache.delete("idem:pending", scope)
+
+    @staticmethod
+    def _check(record_fingerprint: str, request_fingerprint: str):
+        if record_fingerprint != request_fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used with a different request body."
+            )
+
+    async def run(self, uid: str, key: str, request_fingerprint: str, fn) -> tuple[dict, bool]:
+        """
+        Runs `fn` (returning (status_code, pydantic model)) at most once per
+        (uid, key). Returns (record, replayed).
+        """
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters.")
+        scope = f"{uid}:{key}"
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT
+
+        while True:
+            record = self._local_get(scope) or await shared_cache.get_json("idem", scope)
+            if record is not None:
+                self._check(record["fingerprint"], request_fingerprint)
+                idempotency_requests.inc(outcome="replayed")
+                return record, True
+
+            inflight = self._inflight.get(scope)
+            if inflight is not None:
+                inflight_fingerprint, task = inflight
+                self._check(inflight_fingerprint, request_fingerprint)
+                idempotency_requests.inc(outcome="joined")
+                # Shielded: a retry that disconnects must not cancel the shared work.
+                return await asyncio.shield(task), True
+
+            if await shared_cache.claim("idem:pending", scope, IDEMPOTENCY_PENDING_TTL):
+                # Runs as a background task so the response is still stored
+                # (and replayed to the retry) if the original client goes away.
+                task = lifecycle.spawn(self._execute(scope, request_fingerprint, fn), name="idempotent-request")
+                self._inflight[scope] = (request_fingerprint, task)
+                idempotency_requests.inc(outcome="executed")
+                return await asyncio.shield(task), False
+
+            # Another worker is running the original request.
+            if time.monotonic() >= deadline:
+                idempotency_requests.inc(outcome="conflict")
+                logger.warning(f"Idempotency-Key still in progress on another worker after {IDEMPOTENCY_WAIT}s")
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress.")
+            await asyncio.sleep(0.25)
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,122 @@
+"""
+Compacts ended sessions still stored in `sessions` into each user's session
+history (see SessionService.compact), so per-user session queries only ever
+see active sessions. end_session compacts as it goes; this job clears the
+backlog of documents ended before that, and any a failed end left behind.
+
+Compacted entries live in session_history/{uid}/entries with an expire_at
+field. To have Firestore delete them after NEX_SESSION_HISTORY_RETENTION_DAYS,
+enable a TTL policy once per project:
+
+    gcloud firestore fields ttls update expire_at --collection-group=entries --enable-ttl
+
+Usage:
+    python -m app.jobs.compact_sessions             # one pass, then exit
+    python -m app.jobs.compact_sessions --dry-run   # count what would be compacted
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter, defaultdict
+from datetime import timezone
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+from ..services import services, get_db
+from ..cache import shared_cache
+from ..session_service import session_service
+
+# Users compacted in parallel (each is one summary read and one or more batch commits).
+COMPACTION_CONCURRENCY = int(os.getenv("NEX_COMPACTION_CONCURRENCY", "8"))
+# Ended sessions read per page of the scan.
+COMPACTION_PAGE_SIZE = int(os.getenv("NEX_COMPACTION_PAGE_SIZE", "500"))
+# Sessions per batch commit: two writes each plus the summary, under Firestore's 500.
+COMPACTION_BATCH_SIZE = 200
+
+
+def _ended_page(after):
+    query = get_db().collection("sessions").where("is_active", "==", False).limit(COMPACTION_PAGE_SIZE)
+    if after is not None:
+        query = query.start_after(after)
+    return list(query.stream())
+
+
+def _aware(value):
+    return value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+
+
+def _compact_user(uid: str, sessions: list[dict]):
+    db = get_db()
+    history = session_service._get_history_ref(uid).get()
+    stored = _aware(history.to_dict().get("last_started_at")) if history.exists else None
+    for start in range(0, len(sessions), COMPACTION_BATCH_SIZE):
+        chunk = sessions[start:start + COMPACTION_BATCH_SIZE]
+        newest = max(_aware(data["started_at"]) for data in chunk)
+        last_started_at = newest if stored is None or newest > stored else None
+        batch = db.batch()
+        session_service.compact(batch, uid, chunk, last_started_at)
+        batch.commit()
+        stored = last_started_at or stored
+
+
+async def run_once(dry_run: bool = False) -> Counter:
+    """
+    One pass over every ended session, a page at a time, compacting the
+    users on each page COMPACTION_CONCURRENCY at a time.
+    """
+    started = time.monotonic()
+    outcomes = Counter()
+    after = None
+    failed, users = set(), set()
+    while True:
+        page = await asyncio.to_thread(_ended_page, after)
+        page = [doc for doc in page if doc.id not in failed]
+        if not page:
+            break
+        after = page[-1]
+        by_user = defaultdict(list)
+        for doc in page:
+            data = doc.to_dict()
+            by_user[data["user_id"]].append({**data, "session_id": doc.id})
+        if dry_run:
+            outcomes["sessions"] += len(page)
+            users.update(by_user)
+            outcomes["users"] = len(users)
+            continue
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in by_user.items():
+            queue.put_nowait(item)
+
+        async def worker():
+            while not queue.empty():
+                uid, sessions = queue.get_nowait()
+                try:
+                    await asyncio.to_thread(_compact_user, uid, sessions)
+                    outcomes["compacted"] += len(sessions)
+                except Exception as e:
+                    logger.error(f"Session compaction failed for {uid}: {e}")
+                    outcomes["failed"] += len(sessions)
+                    failed.update(data["session_id"] for data in sessions)
+
+        await asyncio.gather(*(worker() for _ in range(COMPACTION_CONCURRENCY)))
+    logger.info(f"Session compaction: {dict(outcomes)} in {time.monotonic() - started:.1f}s")
+    return outcomes
+
+
+async def main(dry_run: bool):
+    await services.init_services()
+    try:
+        await run_once(dry_run)
+    finally:
+        await shared_cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Count ended sessions and their users without writing.")
+    args = parser.parse_args()
+    asyncio.run(main(args.dry_run))
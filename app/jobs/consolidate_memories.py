@@ -0,0 +1,214 @@
+"""
+Condenses each user's memories/{uid}/items into a compact profile document,
+memory_profiles/{uid}, which interact reads instead of the whole collection
+(see MemoryService.get_memory_context).
+
+Only users whose memories/{uid} document is flagged profile_dirty (set on
+every memory add, update and delete) are processed. The profile is written,
+and the flag cleared, only if no memory changed while the profile was being
+built, so a concurrent change is picked up by the next run. Updating or
+deleting a memory also deletes the profile, so prompts fall back to the items
+themselves until it is rebuilt.
+
+Each pass also stores the dedup signature and LSH bands (see
+MemoryService.remember) on memories written before they existed, which
+dedup cannot otherwise find. Releases before the flag moved off the user doc
+set memory_profile_dirty on users/{uid}, and their memories have no bands:
+run once with --all to pick those users up.
+
+Usage:
+    python -m app.jobs.consolidate_memories                 # one pass, then exit
+    python -m app.jobs.consolidate_memories --interval 900  # keep running every 15 minutes
+    python -m app.jobs.consolidate_memories --all           # rebuild every user with memories
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
+from collections import Counter
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+from ..services import services, get_db
+from ..cache import shared_cache
+from ..nex_service import nex_service
+from ..prompts import get_memory_profile_prompt
+from ..memory_dedup import signature, band_keys
+
+# Users consolidated in parallel (each needs a few Firestore reads and one LLM call).
+CONSOLIDATION_CONCURRENCY = int(os.getenv("NEX_CONSOLIDATION_CONCURRENCY", "4"))
+# Below this many memories the items are kept verbatim, without an LLM call.
+CONSOLIDATION_MIN_ITEMS = int(os.getenv("NEX_CONSOLIDATION_MIN_ITEMS", "5"))
+# Memories given LSH bands per batch commit (Firestore allows 500 writes).
+BACKFILL_BATCH_SIZE = 400
+
+PROFILE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "themes": {"type": "array", "items": {"type": "string"}},
+        "facts": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["themes", "facts"],
+}
+
+
+def _pending_users(rebuild_all: bool) -> list[str]:
+    db = get_db()
+    if rebuild_all:
+        return [doc.id for doc in db.collection("users").select([]).stream()]
+    return [doc.id for doc in db.collection("memories").where("profile_dirty", "==", True).stream()]
+
+
+def _load(uid: str):
+    """
+    Returns (memories/{uid} snapshot, items oldest first, item snapshots without LSH bands).
+    """
+    db = get_db()
+    state = db.collection("memories").document(uid).get()
+    docs = list(
+        db.collection("memories").document(uid).collection("items")
+        .order_by("created_at").select(["content", "created_at", "lsh_bands"]).stream()
+    )
+    return state, [doc.to_dict() for doc in docs], [doc for doc in docs if not doc.to_dict().get("lsh_bands")]
+
+
+def _backfill_bands(docs: list) -> int:
+    """
+    Stores MinHash signatures and LSH bands on memories written before
+    dedup looked candidates up by band. Returns how many were updated.
+    """
+    from google.api_core import exceptions
+    db = get_db()
+    updated = 0
+    for start in range(0, len(docs), BACKFILL_BATCH_SIZE):
+        batch = db.batch()
+        chunk = docs[start:start + BACKFILL_BATCH_SIZE]
+        for doc in chunk:
+            minhash = signature(doc.to_dict()["content"])
+            batch.update(doc.reference, {"minhash": minhash, "lsh_bands": band_keys(minhash)})
+        try:
+            batch.commit()
+        except exceptions.NotFound:
+            # A memory was deleted meanwhile; the rest are picked up next run.
+            continue
+        updated += len(chunk)
+    return updated
+
+
+def _save(uid: str, state, profile: dict | None) -> bool:
+    """
+    Writes the profile (deletes it when `profile` is None) and clears the
+    dirty flag in one commit, unless memories/{uid} changed since `state` was
+    read (every memory add, update and delete writes it). Returns whether it
+    was written.
+    """
+    from firebase_admin import firestore
+    from google.api_core import exceptions
+    db = get_db()
+    profile_ref = db.collection("memory_profiles").document(uid)
+    batch = db.batch()
+    if profile is None:
+        batch.delete(profile_ref)
+    else:
+        batch.set(profile_ref, {
+            **profile,
+            "version": firestore.Increment(1),
+            "updated_at": datetime.now(timezone.utc),
+        }, merge=True)
+    if state.exists:
+        batch.update(state.reference, {"profile_dirty": False}, option=db.write_option(last_update_time=state.update_time))
+    else:
+        # Memories last changed before the flag moved to memories/{uid} (--all).
+        batch.create(state.reference, {"profile_dirty": False})
+    try:
+        batch.commit()
+    except (exceptions.FailedPrecondition, exceptions.AlreadyExists):
+        # Memories changed while the profile was built; keep the user dirty.
+        return False
+    return True
+
+
+async def consolidate_user(uid: str) -> str:
+    """
+    Builds and stores one user's profile. Returns the outcome for the run summary.
+    """
+    state, items, unbanded = await asyncio.to_thread(_load, uid)
+    if unbanded:
+        backfilled = await asyncio.to_thread(_backfill_bands, unbanded)
+        logger.info(f"Added LSH bands to {backfilled} of {len(unbanded)} memories for {uid}")
+    if not items:
+        if not state.exists:
+            return "empty"
+        # Every memory was deleted: drop the profile so none of them reach prompts.
+        cleared = await asyncio.to_thread(_save, uid, state, None)
+        await shared_cache.delete("memctx", uid)
+        return "empty" if cleared else "changed"
+
+    contents = [item["content"] for item in items]
+    if len(contents) < CONSOLIDATION_MIN_ITEMS:
+        profile = {"themes": [], "facts": contents}
+    else:
+        response_json = await nex_service._generate_with_retry(
+            get_memory_profile_prompt("\n".join(contents)),
+            response_schema=PROFILE_SCHEMA
+        )
+        try:
+            data = json.loads(response_json)
+        except json.JSONDecodeError:
+            logger.error(f"Failed to parse memory profile for {uid}: {response_json}")
+            return "failed"
+        profile = {"themes": data.get("themes", [])[:5], "facts": data.get("facts", [])[:15]}
+
+    profile["covered_until"] = max(item["created_at"] for item in items)
+    profile["item_count"] = len(items)
+    cleared = await asyncio.to_thread(_save, uid, state, profile)
+    await shared_cache.delete("memctx", uid)
+    return "consolidated" if cleared else "changed"
+
+
+async def run_once(rebuild_all: bool = False) -> Counter:
+    """
+    One pass over every pending user, CONSOLIDATION_CONCURRENCY at a time.
+    """
+    started = time.monotonic()
+    queue: asyncio.Queue = asyncio.Queue()
+    for uid in await asyncio.to_thread(_pending_users, rebuild_all):
+        queue.put_nowait(uid)
+    outcomes = Counter()
+
+    async def worker():
+        while not queue.empty():
+            uid = queue.get_nowait()
+            try:
+                outcomes[await consolidate_user(uid)] += 1
+            except Exception as e:
+                logger.error(f"Memory consolidation failed for {uid}: {e}")
+                outcomes["failed"] += 1
+
+    await asyncio.gather(*(worker() for _ in range(CONSOLIDATION_CONCURRENCY)))
+    logger.info(f"Memory consolidation: {dict(outcomes)} in {time.monotonic() - started:.1f}s")
+    return outcomes
+
+
+async def main(interval: float | None, rebuild_all: bool):
+    await services.init_services()
+    try:
+        while True:
+            await run_once(rebuild_all)
+            if not interval:
+                return
+            await asyncio.sleep(interval)
+    finally:
+        await shared_cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interval", type=float, help="Seconds between passes; runs a single pass when omitted.")
+    parser.add_argument("--all", action="store_true", help="Rebuild every user with memories, not only changed ones.")
+    args = parser.parse_args()
+    asyncio.run(main(args.interval, args.all))
@@ -0,0 +1,308 @@
+"""
+Exports Firestore collections to local files for product analytics, without
+the ad-hoc full scans that compete with production traffic.
+
+Each dataset is split with a partition query into ranges of document names,
+which are read in parallel, a page at a time, under one shared read rate
+limit. Rows are written to compressed NDJSON (default) or Parquet files of up
+to NEX_ANALYTICS_CHUNK_ROWS rows:
+
+    OUT/{dataset}/part-{partition}-{chunk}.ndjson.gz | .parquet
+    OUT/{dataset}/_checkpoint.json
+
+The checkpoint records the partition bounds and, per partition, the last
+exported document and the next chunk number. It is written after each chunk
+file is in place, so an interrupted export picks up from the last complete
+chunk when run again with the same OUT (a half-written chunk is rewritten).
+A finished dataset is skipped; pass --restart to export it again.
+
+Each row is the document's fields plus `_id`, `_path` and `_parent` (the id
+of the parent document for subcollections, e.g. the uid for usage_shards).
+Conversation text is left out: session transcripts and archive reflections.
+Reads are not a point-in-time snapshot; documents written during the export
+may or may not be included.
+
+Parquet needs pyarrow (poetry install -E analytics).
+
+Usage:
+    python -m app.jobs.export_analytics --out /data/nex-export
+    python -m app.jobs.export_analytics --out /data/nex-export --datasets archives,users --format parquet
+    python -m app.jobs.export_analytics --out /data/nex-export --rate 100   # gentler on production
+"""
+import argparse
+import asyncio
+import base64
+import gzip
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+import orjson
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+from ..services import services, get_db
+from ..cache import shared_cache
+from ..responses import ORJSON_OPTIONS
+from .rate_limit import RateLimiter
+
+# Dataset name -> (collection group, fields left out of the export).
+DATASETS = {
+    "archives": ("archives", ("reflection",)),
+    "sessions": ("sessions", ("transcript",)),
+    "session_history": ("entries", ()),
+    "users": ("users", ()),
+    "usage_shards": ("usage_shards", ()),
+}
+# Partitions requested per dataset (Firestore may return fewer for small ones).
+ANALYTICS_PARTITIONS = int(os.getenv("NEX_ANALYTICS_PARTITIONS", "16"))
+# Partitions read at the same time, across all datasets.
+ANALYTICS_CONCURRENCY = int(os.getenv("NEX_ANALYTICS_CONCURRENCY", "4"))
+# Documents read per second, across all partitions.
+ANALYTICS_RATE = float(os.getenv("NEX_ANALYTICS_RATE", "500"))
+# Documents per query page.
+ANALYTICS_PAGE_SIZE = int(os.getenv("NEX_ANALYTICS_PAGE_SIZE", "500"))
+# Rows per output file, and so per checkpoint.
+ANALYTICS_CHUNK_ROWS = int(os.getenv("NEX_ANALYTICS_CHUNK_ROWS", "10000"))
+
+FORMATS = {"ndjson": ".ndjson.gz", "parquet": ".parquet"}
+
+
+def _json_default(obj):
+    if isinstance(obj, datetime):
+        return obj.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+    if isinstance(obj, bytes):
+        return base64.b64encode(obj).decode()
+    if hasattr(obj, "path"):  # DocumentReference
+        return obj.path
+    if hasattr(obj, "latitude"):  # GeoPoint
+        return {"latitude": obj.latitude, "longitude": obj.longitude}
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _row(doc, excluded: tuple) -> dict:
+    path = doc.reference.path
+    segments = path.split("/")
+    row = {"_id": doc.id, "_path": path, "_parent": segments[-3] if len(segments) > 2 else None}
+    for field, value in doc.to_dict().items():
+        if field not in excluded:
+            row[field] = value
+    return row
+
+
+def _json_text(value):
+    return None if value is None else orjson.dumps(value, default=_json_default, option=ORJSON_OPTIONS).decode()
+
+
+def _write_ndjson(path: str, rows: list[dict]):
+    with gzip.open(path, "wb", compresslevel=6) as f:
+        for row in rows:
+            f.write(orjson.dumps(row, default=_json_default, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE))
+
+
+def _write_parquet(path: str, rows: list[dict]):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    columns = list(dict.fromkeys(field for row in rows for field in row))
+    arrays = []
+    for column in columns:
+        values = [row.get(column) for row in rows]
+        if any(isinstance(value, (dict, list)) for value in values):
+            values = [_json_text(value) for value in values]
+        try:
+            arrays.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed types across documents: fall back to their JSON text.
+            arrays.append(pa.array([_json_text(value) for value in values]))
+    pq.write_table(pa.Table.from_arrays(arrays, names=columns), path, compression="zstd")
+
+
+WRITERS = {"ndjson": _write_ndjson, "parquet": _write_parquet}
+
+
+class DatasetExport:
+    """
+    One dataset's output directory and checkpoint. Partition state is
+    updated from the reader threads, under a lock.
+    """
+    def __init__(self, out: str, name: str, fmt: str):
+        self.name = name
+        self.group, self.excluded = DATASETS[name]
+        self.format = fmt
+        self.dir = os.path.join(out, name)
+        self.checkpoint_path = os.path.join(self.dir, "_checkpoint.json")
+        self.state: dict | None = None
+        self._lock = threading.Lock()
+
+    def load(self, restart: bool) -> bool:
+        """
+        Reads the checkpoint, if any. Returns whether one was found.
+        """
+        if restart or not os.path.exists(self.checkpoint_path):
+            return False
+        with open(self.checkpoint_path) as f:
+            self.state = json.load(f)
+        if self.state["format"] != self.format:
+            raise ValueError(f"{self.name} was started as {self.state['format']}; pass --restart to switch formats")
+        return True
+
+    def plan(self, partition_count: int):
+        """
+        Splits the collection group with a partition query and starts a fresh checkpoint.
+        """
+        partitions = get_db().collection_group(self.group).get_partitions(partition_count)
+        self.state = {
+            "dataset": self.name,
+            "collection_group": self.group,
+            "format": self.format,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "partitions": [
+                {
+                    "start": p.start_at.path if p.start_at else None,
+                    "end": p.end_at.path if p.end_at else None,
+                    "after": None, "chunks": 0, "rows": 0, "done": False,
+                }
+                for p in partitions
+            ],
+        }
+        os.makedirs(self.dir, exist_ok=True)
+        # Files from an earlier export used other partition bounds.
+        for name in os.listdir(self.dir):
+            if name.startswith("part-"):
+                os.remove(os.path.join(self.dir, name))
+        self.save()
+
+    def save(self):
+        with self._lock:
+            tmp = self.checkpoint_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(tmp, self.checkpoint_path)
+
+    @property
+    def pending(self) -> list[int]:
+        return [i for i, p in enumerate(self.state["partitions"]) if not p["done"]]
+
+    @property
+    def rows(self) -> int:
+        return sum(p["rows"] for p in self.state["partitions"])
+
+    def _page(self, partition: dict) -> list:
+        db = get_db()
+        query = db.collection_group(self.group).order_by("__name__")
+        if partition["after"]:
+            query = query.start_after({"__name__": db.document(partition["after"])})
+        elif partition["start"]:
+            query = query.start_at({"__name__": db.document(partition["start"])})
+        if partition["end"]:
+            query = query.end_before({"__name__": db.document(partition["end"])})
+        return list(query.limit(ANALYTICS_PAGE_SIZE).stream())
+
+    def _flush(self, index: int, rows: list[dict], done: bool):
+        partition = self.state["partitions"][index]
+        if rows:
+            path = os.path.join(self.dir, f"part-{index:04d}-{partition['chunks']:05d}{FORMATS[self.format]}")
+            WRITERS[self.format](path + ".tmp", rows)
+            os.replace(path + ".tmp", path)
+        with self._lock:
+            if rows:
+                partition["after"] = rows[-1]["_path"]
+                partition["chunks"] += 1
+                partition["rows"] += len(rows)
+            partition["done"] = done
+        self.save()
+
+    def export_partition(self, index: int, limiter: RateLimiter) -> int:
+        """
+        Reads one partition from its checkpointed position to the end.
+        Returns the number of rows written.
+        """
+        partition = self.state["partitions"][index]
+        cursor = dict(partition)
+        rows, written = [], 0
+        while True:
+            limiter.acquire(ANALYTICS_PAGE_SIZE)
+            page = self._page(cursor)
+            rows.extend(_row(doc, self.excluded) for doc in page)
+            if page:
+                cursor["after"] = page[-1].reference.path
+            done = len(page) < ANALYTICS_PAGE_SIZE
+            if len(rows) >= ANALYTICS_CHUNK_ROWS or done:
+                self._flush(index, rows, done)
+                written += len(rows)
+                rows = []
+            if done:
+                return written
+
+
+async def run_once(out: str, datasets: list[str], fmt: str = "ndjson", restart: bool = False,
+                   rate: float = ANALYTICS_RATE) -> Counter:
+    """
+    Exports `datasets` into `out`, ANALYTICS_CONCURRENCY partitions at a time.
+    """
+    started = time.monotonic()
+    limiter = RateLimiter(rate)
+    queue: asyncio.Queue = asyncio.Queue()
+    exports = []
+    for name in datasets:
+        export = DatasetExport(out, name, fmt)
+        if not await asyncio.to_thread(export.load, restart):
+            await asyncio.to_thread(export.plan, ANALYTICS_PARTITIONS)
+        if not export.pending:
+            logger.info(f"Analytics export: {name} already complete ({export.rows} rows), skipping")
+            continue
+        logger.info(f"Analytics export: {name} has {len(export.pending)} of {len(export.state['partitions'])} partitions to read")
+        exports.append(export)
+        for index in export.pending:
+            queue.put_nowait((export, index))
+    outcomes = Counter()
+
+    async def worker():
+        while not queue.empty():
+            export, index = queue.get_nowait()
+            try:
+                outcomes[export.name] += await asyncio.to_thread(export.export_partition, index, limiter)
+            except Exception as e:
+                logger.error(f"Analytics export of {export.name} partition {index} failed: {e}")
+                outcomes["failed_partitions"] += 1
+
+    await asyncio.gather(*(worker() for _ in range(ANALYTICS_CONCURRENCY)))
+    for export in exports:
+        if not export.pending:
+            logger.info(f"Analytics export: {export.name} complete, {export.rows} rows in {export.dir}")
+    logger.info(f"Analytics export: {dict(outcomes)} rows written in {time.monotonic() - started:.1f}s")
+    return outcomes
+
+
+async def main(args):
+    await services.init_services()
+    try:
+        outcomes = await run_once(args.out, args.datasets, args.format, args.restart, args.rate)
+    finally:
+        await shared_cache.close()
+    if outcomes["failed_partitions"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="Output directory; rerun with the same one to resume.")
+    parser.add_argument("--datasets", default=",".join(DATASETS), help=f"Comma-separated, from: {', '.join(DATASETS)}.")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--rate", type=float, default=ANALYTICS_RATE, help="Documents read per second, in total.")
+    parser.add_argument("--restart", action="store_true", help="Ignore existing checkpoints and export from scratch.")
+    args = parser.parse_args()
+    args.datasets = [name.strip() for name in args.datasets.split(",") if name.strip()]
+    unknown = [name for name in args.datasets if name not in DATASETS]
+    if unknown:
+        parser.error(f"unknown datasets: {', '.join(unknown)}")
+    if args.format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("--format parquet needs pyarrow (poetry install -E analytics)")
+    asyncio.run(main(args))
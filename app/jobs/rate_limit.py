@@ -0,0 +1,34 @@
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket shared by a job's workers, in operations per second. Bursts
+    are capped at one second's worth. `acquire(n)` blocks the calling thread
+    until n more operations may run; `wait(n)` is the same for coroutines.
+    """
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, count: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= count
+            return -self._tokens / self.rate if self._tokens < 0 else 0
+
+    def acquire(self, count: int):
+        wait = self._reserve(count)
+        if wait:
+            time.sleep(wait)
+
+    async def wait(self, count: int):
+        wait = self._reserve(count)
+        if wait:
+            await asyncio.sleep(wait)
@@ -0,0 +1,205 @@
+"""
+Repairs drifted usage counters. memory_used is counted by increments that
+are separate writes from the memories they count, so a partial failure
+leaves it wrong, and tier limits are then enforced against the wrong number.
+
+For each user, the user doc and its usage shards (one batched get_all,
+shared with other users in flight) are compared with a count aggregation
+over memories/{uid}/items:
+
+- memory_used is set to the number of memory items;
+- messages_used_today cannot be recounted (transcripts are not kept), so
+  only a negative total is repaired, to 0.
+
+A user with drift is read again after NEX_RECONCILE_SETTLE seconds and only
+repaired if nothing changed in between, so a memory write in flight is not
+mistaken for drift. The repair is one batch per user: the corrected totals
+(and the list versions counted in the shards) go on the user doc and the
+usage shards are deleted, both conditional on the documents being unchanged
+since that read, so a concurrent increment makes the batch fail (counted as
+"changed") instead of being lost.
+
+Reads and writes each have a rate limit, shared by NEX_RECONCILE_CONCURRENCY
+workers, to keep the job from competing with live traffic.
+
+Usage:
+    python -m app.jobs.reconcile_usage --dry-run      # report drift only
+    python -m app.jobs.reconcile_usage                # repair drifted users
+    python -m app.jobs.reconcile_usage --fold         # also fold every user's shards into the user doc
+    python -m app.jobs.reconcile_usage --users a,b    # only these users
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+from ..services import services, get_db
+from ..cache import shared_cache
+from ..user_service import user_service, usage_counter, USAGE_FIELDS, VERSION_FIELDS
+from ..memory_service import memory_service
+from .rate_limit import RateLimiter
+
+# Users reconciled in parallel.
+RECONCILE_CONCURRENCY = int(os.getenv("NEX_RECONCILE_CONCURRENCY", "8"))
+# Document reads per second (a user costs its doc, its shards and one per 1000 memories counted).
+RECONCILE_READ_RATE = float(os.getenv("NEX_RECONCILE_READ_RATE", "500"))
+# Document writes per second (a repair writes the user doc and deletes its existing shards).
+RECONCILE_WRITE_RATE = float(os.getenv("NEX_RECONCILE_WRITE_RATE", "50"))
+# Seconds between the two reads of a drifted user.
+RECONCILE_SETTLE = float(os.getenv("NEX_RECONCILE_SETTLE", "5"))
+# Users listed per page.
+RECONCILE_PAGE_SIZE = int(os.getenv("NEX_RECONCILE_PAGE_SIZE", "200"))
+
+
+def _user_page(after):
+    query = get_db().collection("users").order_by("__name__").limit(RECONCILE_PAGE_SIZE)
+    if after is not None:
+        query = query.start_after({"__name__": get_db().collection("users").document(after)})
+    return [doc.id for doc in query.stream()]
+
+
+def _count_memories(uid: str) -> int:
+    result = memory_service._get_memory_collection(uid).count(alias="memories").get()
+    return int(result[0][0].value)
+
+
+def _repair(parent, shards: list, totals: dict):
+    db = get_db()
+    batch = db.batch()
+    batch.update(parent.reference, totals, option=db.write_option(last_update_time=parent.update_time))
+    for shard in shards:
+        if shard.exists:
+            batch.delete(shard.reference, option=db.write_option(last_update_time=shard.update_time))
+    batch.commit()
+
+
+class UsageReconciler:
+    def __init__(self, dry_run: bool = False, fold: bool = False,
+                 read_rate: float = RECONCILE_READ_RATE, write_rate: float = RECONCILE_WRITE_RATE):
+        self.dry_run = dry_run
+        self.fold = fold
+        self.reads = RateLimiter(read_rate)
+        self.writes = RateLimiter(write_rate)
+
+    async def _snapshot(self, uid: str):
+        """
+        Reads one user's counters and memory count. Returns (user snapshot,
+        shard snapshots, memory count, corrected totals or None when in sync).
+        """
+        await self.reads.wait(1 + usage_counter.shards)
+        parent, shards = await usage_counter.load(user_service._get_user_ref(uid))
+        if not parent.exists:
+            return parent, shards, 0, None
+        memories = await asyncio.to_thread(_count_memories, uid)
+        await self.reads.wait(1 + memories // 1000)
+
+        current = usage_counter.rollup(parent.to_dict(), shards, USAGE_FIELDS + VERSION_FIELDS)
+        corrected = {
+            "memory_used": memories,
+            "messages_used_today": max(0, current["messages_used_today"]),
+            # The shards are deleted by the repair; keep the versions they count.
+            **{field: current[field] for field in VERSION_FIELDS},
+        }
+        drifted = any(corrected[field] != current[field] for field in USAGE_FIELDS)
+        return parent, shards, memories, corrected if drifted else None
+
+    async def reconcile(self, uid: str) -> str:
+        """
+        Checks and, unless dry_run, repairs one user. Returns the outcome for the run summary.
+        """
+        parent, shards, memories, corrected = await self._snapshot(uid)
+        if not parent.exists:
+            return "missing"
+        has_shards = any(shard.exists for shard in shards)
+        if corrected is None and not (self.fold and has_shards):
+            return "ok"
+        if corrected is not None:
+            current = usage_counter.rollup(parent.to_dict(), shards, USAGE_FIELDS)
+            logger.info(
+                f"Usage drift for {uid}: memory_used {current['memory_used']} (counted {memories}), "
+                f"messages_used_today {current['messages_used_today']}"
+            )
+        if self.dry_run:
+            return "drifted" if corrected is not None else "ok"
+
+        if corrected is not None:
+            # A write in flight would show up as drift; only repair what stays put.
+            await asyncio.sleep(RECONCILE_SETTLE)
+            first = parent.update_time, [shard.update_time for shard in shards], memories
+            parent, shards, memories, corrected = await self._snapshot(uid)
+            if not parent.exists or first != (parent.update_time, [shard.update_time for shard in shards], memories):
+                return "changed"
+            if corrected is None:
+                return "ok"
+
+        from google.api_core import exceptions
+        if corrected is None:
+            rolled = usage_counter.rollup(parent.to_dict(), shards, USAGE_FIELDS + VERSION_FIELDS)
+            corrected = {field: rolled[field] for field in USAGE_FIELDS + VERSION_FIELDS}
+            folded = True
+        else:
+            folded = False
+        await self.writes.wait(1 + sum(shard.exists for shard in shards))
+        try:
+            await asyncio.to_thread(_repair, parent, shards, corrected)
+        except exceptions.FailedPrecondition:
+            return "changed"
+        await shared_cache.delete("user", uid)
+        return "folded" if folded else "repaired"
+
+    async def run_once(self, uids: list[str] = None) -> Counter:
+        """
+        One pass over `uids`, or every user a page at a time,
+        RECONCILE_CONCURRENCY users at a time.
+        """
+        started = time.monotonic()
+        outcomes = Counter()
+
+        async def worker(queue: asyncio.Queue):
+            while not queue.empty():
+                uid = queue.get_nowait()
+                try:
+                    outcomes[await self.reconcile(uid)] += 1
+                except Exception as e:
+                    logger.error(f"Usage reconciliation failed for {uid}: {e}")
+                    outcomes["failed"] += 1
+
+        after = None
+        while True:
+            if uids is not None:
+                page, uids = uids, []
+            else:
+                await self.reads.wait(RECONCILE_PAGE_SIZE)
+                page = await asyncio.to_thread(_user_page, after)
+            if not page:
+                break
+            after = page[-1]
+            queue: asyncio.Queue = asyncio.Queue()
+            for uid in page:
+                queue.put_nowait(uid)
+            await asyncio.gather(*(worker(queue) for _ in range(RECONCILE_CONCURRENCY)))
+        logger.info(f"Usage reconciliation: {dict(outcomes)} in {time.monotonic() - started:.1f}s")
+        return outcomes
+
+
+async def main(args):
+    await services.init_services()
+    try:
+        await UsageReconciler(args.dry_run, args.fold).run_once(args.users)
+    finally:
+        await shared_cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Report drift without writing.")
+    parser.add_argument("--fold", action="store_true", help="Fold usage shards into every user doc, not only drifted ones.")
+    parser.add_argument("--users", help="Comma-separated uids; all users when omitted.")
+    args = parser.parse_args()
+    args.users = [uid.strip() for uid in args.users.split(",") if uid.strip()] if args.users else None
+    asyncio.run(main(args))
@@ -0,0 +1,189 @@
+import asyncio
+import os
+import signal
+import threading
+import time
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from loguru import logger
+from .metrics import registry
+
+# Budget for each warmup step; a dependency that hangs shouldn't hold the worker back forever.
+WARMUP_STEP_TIMEOUT = float(os.getenv("NEX_WARMUP_TIMEOUT", "15"))
+# How often a worker whose required warmup steps failed tries again.
+WARMUP_RETRY_INTERVAL = float(os.getenv("NEX_WARMUP_RETRY_INTERVAL", "5"))
+# How long shutdown waits for in-flight LLM calls and background tasks.
+# Keep it plus NEX_DRAIN_GRACE below gunicorn's graceful_timeout.
+DRAIN_TIMEOUT = float(os.getenv("NEX_DRAIN_TIMEOUT", "25"))
+# How long a worker keeps accepting connections after SIGTERM while /ready reports 503,
+# so the proxy's health check (every 5s) stops routing to it before the listener closes.
+DRAIN_GRACE = float(os.getenv("NEX_DRAIN_GRACE", "6"))
+
+llm_calls_in_flight = registry.gauge(
+    "nex_llm_calls_in_flight", "Gemini calls currently running in this worker."
+)
+background_tasks = registry.gauge(
+    "nex_background_tasks", "Background tasks currently running in this worker."
+)
+warmup_seconds = registry.gauge(
+    "nex_warmup_seconds", "Duration of each warmup step at startup.", ("step",)
+)
+worker_ready = registry.gauge(
+    "nex_worker_ready", "1 once warmup completed and the worker is not draining."
+)
+
+
+class Lifecycle:
+    """
+    Tracks worker readiness and the work that must finish before shutdown:
+    in-flight LLM calls and background tasks started with spawn().
+    """
+    def __init__(self):
+        self.warmed_up = False
+        self.draining = False
+        self.warmup_results: dict[str, str] = {}
+        self._llm_calls = 0
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def ready(self) -> bool:
+        return self.warmed_up and not self.draining
+
+    def _publish_ready(self):
+        worker_ready.set(1 if self.ready else 0)
+
+    async def _run_step(self, name: str, fn) -> str:
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(asyncio.to_thread(fn), WARMUP_STEP_TIMEOUT)
+            status = "skipped" if result is False else "ok"
+        except asyncio.TimeoutError:
+            status = "timeout"
+        except Exception as e:
+            logger.warning(f"Warmup step '{name}' failed: {e}")
+            status = "failed"
+        elapsed = time.perf_counter() - started
+        warmup_seconds.set(round(elapsed, 3), step=name)
+        logger.info(f"Warmup step '{name}': {status} in {elapsed * 1000:.0f}ms")
+        return status
+
+    async def warmup(self, steps: dict, required: tuple = ()):
+        """
+        Runs the blocking warmup steps concurrently in threads. A step returns
+        False when it does not apply. The worker is ready once every required
+        step succeeded; otherwise warmup is retried in the background.
+        """
+        statuses = await asyncio.gather(*(self._run_step(name, fn) for name, fn in steps.items()))
+        self.warmup_results = dict(zip(steps, statuses))
+        failed = [name for name in required if self.warmup_results.get(name) not in ("ok", "skipped")]
+        if failed:
+            logger.error(f"Required warmup steps failed: {', '.join(failed)}. Worker not ready, retrying.")
+            self.spawn(self._retry_warmup(steps, required), name="warmup-retry")
+        else:
+            self.warmed_up = True
+        self._publish_ready()
+
+    async def _retry_warmup(self, steps: dict, required: tuple):
+        while not self.warmed_up and not self.draining:
+            await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+            retry = {name: steps[name] for name in required}
+            statuses = await asyncio.gather(*(self._run_step(name, fn) for name, fn in retry.items()))
+            self.warmup_results.update(zip(retry, statuses))
+            if all(status in ("ok", "skipped") for status in statuses):
+                self.warmed_up = True
+                logger.info("Warmup completed on retry. Worker ready.")
+        self._publish_ready()
+
+    def install_signal_handlers(self):
+        """
+        Reports not ready as soon as SIGTERM/SIGINT arrives and passes the signal on
+        to the server's own handler DRAIN_GRACE seconds later. A second signal stops
+        the server right away. Call from the lifespan, after the server installed
+        its handlers; signals can only be handled in the main thread.
+        """
+        if DRAIN_GRACE <= 0 or threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            server_handler = signal.getsignal(sig)
+            if not callable(server_handler):
+                continue
+
+            def _handle(signum, frame, server_handler=server_handler):
+                if self.draining:
+                    server_handler(signum, frame)
+                    return
+                # Only flip the flag here; logging and metrics take locks the
+                # interrupted code may hold, so the rest runs on the loop.
+                self.draining = True
+                loop.call_soon_threadsafe(self._begin_drain, server_handler, signum)
+
+            signal.signal(sig, _handle)
+
+    def _begin_drain(self, server_handler, signum: int):
+        self._publish_ready()
+        logger.info(f"Received {signal.Signals(signum).name}, not ready. Stopping in {DRAIN_GRACE}s.")
+        asyncio.get_running_loop().call_later(DRAIN_GRACE, server_handler, signum, None)
+
+    @asynccontextmanager
+    async def llm_call(self):
+        """
+        Marks an LLM call as in flight so shutdown waits for it.
+        """
+        self._llm_calls += 1
+        llm_calls_in_flight.inc()
+        try:
+            yield
+        finally:
+            self._llm_calls -= 1
+            llm_calls_in_flight.dec()
+
+    def spawn(self, coro, name: str = None) -> asyncio.Task:
+        """
+        Starts a background task that shutdown will wait for (up to DRAIN_TIMEOUT).
+        """
+        task = asyncio.create_task(coro, name=name)
+        self._tasks.add(task)
+        background_tasks.inc()
+
+        def _done(t: asyncio.Task):
+            self._tasks.discard(t)
+            background_tasks.dec()
+            if t.cancelled():
+                return
+            error = t.exception()
+            # An HTTPException is a request outcome (e.g. a 409 from an idempotent
+            # turn) that whoever awaits the task turns into a response.
+            if error and not isinstance(error, HTTPException):
+                logger.error(f"Background task {t.get_name()} failed: {error}")
+
+        task.add_done_callback(_done)
+        return task
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT):
+        """
+        Stops reporting ready, then waits for in-flight LLM calls and background
+        tasks. Tasks still running at the deadline are cancelled.
+        """
+        self.draining = True
+        self._publish_ready()
+        deadline = time.monotonic() + timeout
+        if self._llm_calls or self._tasks:
+            logger.info(f"Draining {self._llm_calls} LLM calls and {len(self._tasks)} background tasks...")
+        while (self._llm_calls or self._tasks) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        if self._llm_calls or self._tasks:
+            logger.warning(
+                f"Drain timed out after {timeout}s with {self._llm_calls} LLM calls "
+                f"and {len(self._tasks)} background tasks still running."
+            )
+            pending = list(self._tasks)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        else:
+            logger.info("Drain complete.")
+
+
+lifecycle = Lifecycle()
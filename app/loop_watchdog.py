@@ -0,0 +1,132 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from loguru import logger
+from .metrics import registry
+
+# Watchdog on unless NEX_LOOP_WATCHDOG=0.
+LOOP_WATCHDOG_ENABLED = os.getenv("NEX_LOOP_WATCHDOG", "1") == "1"
+# How often the loop is asked to wake up, and how often the monitor thread checks on it.
+LOOP_WATCHDOG_INTERVAL = float(os.getenv("NEX_LOOP_WATCHDOG_INTERVAL_MS", "100")) / 1000
+# A wake-up this late counts as a stall; the monitor captures what the loop is running.
+LOOP_LAG_THRESHOLD = float(os.getenv("NEX_LOOP_LAG_THRESHOLD_MS", "200")) / 1000
+# Each blocking site is logged at most once per this many seconds (it is still counted).
+LOOP_STALL_LOG_INTERVAL = float(os.getenv("NEX_LOOP_STALL_LOG_INTERVAL", "60"))
+# Frames of the blocking stack written to the log, innermost last.
+LOOP_STALL_LOG_FRAMES = 25
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+loop_lag = registry.histogram(
+    "nex_event_loop_lag_seconds", "How late the event loop ran a timer it was given (scheduling lag).",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+loop_stalls = registry.counter(
+    "nex_event_loop_stalls", "Event loop stalls past the lag threshold, by innermost app frame running at the time.", ("site",)
+)
+
+
+def _site(frames: traceback.StackSummary) -> str:
+    """
+    Innermost frame in this app's code, else the innermost frame (e.g. a
+    library called straight from the loop).
+    """
+    for frame in reversed(frames):
+        if frame.filename.startswith(APP_DIR):
+            module = os.path.relpath(frame.filename, os.path.dirname(APP_DIR))[:-3].replace(os.sep, ".")
+            return f"{module}:{frame.name}"
+    if frames:
+        return f"{os.path.basename(frames[-1].filename)}:{frames[-1].name}"
+    return "unknown"
+
+
+class LoopWatchdog:
+    """
+    Measures event loop scheduling lag and catches blocking calls in the act.
+
+    A heartbeat task sleeps LOOP_WATCHDOG_INTERVAL at a time and records how
+    late it woke up. A monitor thread watches the heartbeat; once it is
+    LOOP_LAG_THRESHOLD overdue, the loop is stuck in one callback, and the
+    loop thread's current stack is the blocking code. That stack is captured
+    once per stall, counted by site and logged (rate-limited per site).
+    """
+    def __init__(self, interval: float = LOOP_WATCHDOG_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD,
+                 log_interval: float = LOOP_STALL_LOG_INTERVAL):
+        self.interval = interval
+        self.threshold = threshold
+        self.log_interval = log_interval
+        self._beat = 0.0
+        self._captured_beat = None
+        self._logged_at: dict[str, float] = {}
+        self._loop = None
+        self._loop_thread: int | None = None
+        self._heartbeat: asyncio.Task | None = None
+        self._monitor: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """
+        Starts watching the running loop. Call from the loop (lifespan startup).
+        """
+        if self._heartbeat is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat = asyncio.create_task(self._run_heartbeat(), name="loop-watchdog")
+        self._monitor = threading.Thread(target=self._run_monitor, name="loop-watchdog", daemon=True)
+        self._monitor.start()
+
+    async def stop(self):
+        if self._heartbeat is None:
+            return
+        self._stop.set()
+        self._heartbeat.cancel()
+        await asyncio.gather(self._heartbeat, return_exceptions=True)
+        self._heartbeat = None
+
+    async def _run_heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            loop_lag.observe(max(0.0, now - expected))
+            self._beat = now
+
+    def _run_monitor(self):
+        while not self._stop.wait(self.interval):
+            beat = self._beat
+            overdue = time.monotonic() - beat - self.interval
+            if overdue >= self.threshold and self._captured_beat != beat:
+                self._captured_beat = beat
+                try:
+                    self._capture(overdue)
+                except Exception as e:
+                    logger.warning(f"Loop watchdog failed to capture a stall: {e}")
+
+    def _capture(self, overdue: float):
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        frames = traceback.extract_stack(frame)
+        site = _site(frames)
+        loop_stalls.inc(site=site)
+
+        now = time.monotonic()
+        if now - self._logged_at.get(site, -self.log_interval) < self.log_interval:
+            return
+        self._logged_at[site] = now
+        task = getattr(asyncio.tasks, "_current_tasks", {}).get(self._loop)
+        running = f"task {task.get_name()} ({task.get_coro().__qualname__})" if task is not None else "a loop callback"
+        stack = "".join(traceback.format_list(frames[-LOOP_STALL_LOG_FRAMES:]))
+        logger.warning(
+            f"Event loop blocked for {overdue * 1000:.0f}ms+ in {site}, running {running}. "
+            f"Blocking stack (innermost last):\n{stack}"
+        )
+
+
+loop_watchdog = LoopWatchdog()
@@ -10,7 +10,14 @@ from contextlib import asynccontextmanager
 from .services import services
 
 # Import Routers
-from .routers import auth, nex, memory, subscription, payment, session
+from .routers import auth, nex, memory, subscription, payment, session, ops, debug
+from .cache import shared_cache
+from .lifecycle import lifecycle
+from .compression import CompressionMiddleware
+from .profiler import ProfilerMiddleware
+from .loop_watchdog import loop_watchdog, LOOP_WATCHDOG_ENABLED
+from .region_pool import region_pool
+from .responses import NexJSONResponse
 
 # Initialize production-grade logging
 setup_logging()
@@ -18,9 +25,22 @@ setup_logging()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup logic
+    if LOOP_WATCHDOG_ENABLED:
+        # Flags anything that blocks the event loop, warmup included
+        loop_watchdog.start()
     await services.init_services()
+    # Prime connections and caches before this worker accepts traffic
+    await lifecycle.warmup(services.warmup_steps(), required=("firestore",))
+    # Rank Vertex regions by latency from this worker (no-op with a single region)
+    region_pool.start()
+    # On SIGTERM, fail /ready for a few seconds before the listener closes
+    lifecycle.install_signal_handlers()
     yield
-    # Shutdown logic (if any)
+    # Shutdown logic
+    await region_pool.stop()
+    await lifecycle.drain()
+    await shared_cache.close()
+    await loop_watchdog.stop()
 
 app = FastAPI(
     title="NEX Backend API",
@@ -31,6 +51,7 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json",
+    default_response_class=NexJSONResponse,
     lifespan=lifespan
 )
 
@@ -42,6 +63,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger JSON bodies (brotli or gzip, per Accept-Encoding)
+app.add_middleware(CompressionMiddleware)
+
+# Lets /debug/profile?route=... follow requests; a no-op unless a profile is running.
+# Added before the logging middleware so it runs in the same task as the endpoint.
+app.add_middleware(ProfilerMiddleware)
+
 # Add logging middleware
 @app.middleware("http")
 async def add_logging_middleware(request, call_next):
@@ -55,6 +83,8 @@ app.include_router(subscription.router)
 app.include_router(payment.router)
 app.include_router(session.router)
 app.include_router(session.archive_router)
+app.include_router(ops.router)
+app.include_router(debug.router)
 
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,79 @@
+import os
+import random
+import re
+import zlib
+
+# Estimated Jaccard similarity at or above which a new memory counts as a
+# near-duplicate of an existing one. Paraphrases of one fact typically score
+# 0.55-1.0 with this shingling; different facts about the same subject
+# ("has a dog named Rex" / "has a cat named Rex") stay below 0.4.
+MEMORY_DEDUP_THRESHOLD = float(os.getenv("NEX_MEMORY_DEDUP_THRESHOLD", "0.5"))
+
+NUM_PERMUTATIONS = 128
+SHINGLE_SIZE = 3
+# Locality-sensitive hashing over the first LSH_BANDS * LSH_ROWS signature
+# values: memories sharing any band key are dedup candidates. With 30 bands of
+# 3 rows a pair at similarity 0.5 shares a band 98% of the time, at 0.3 about
+# half the time; 30 is also the most values array-contains-any accepts.
+LSH_BANDS = 30
+LSH_ROWS = 3
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)  # fixed: signatures are stored and must stay comparable
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+# Words that carry no identity in model-written facts ("The user has a sister named Ana").
+_STOPWORDS = frozenset(
+    "a an the user users user's is are was were has have had their they them his her he she "
+    "of to and in on at for with that who named called i my me".split()
+)
+_SUFFIXES = ("ing", "ed", "es", "'s", "s")
+
+
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def shingles(text: str) -> set[int]:
+    """
+    Character trigrams of each normalized word (with word boundaries), hashed.
+    """
+    result = set()
+    for word in re.findall(r"[a-z0-9']+", text.lower()):
+        if word in _STOPWORDS:
+            continue
+        padded = f" {_stem(word)} "
+        for i in range(len(padded) - SHINGLE_SIZE + 1):
+            result.add(zlib.crc32(padded[i:i + SHINGLE_SIZE].encode()))
+    return result
+
+
+def signature(text: str) -> list[int]:
+    """
+    MinHash signature of the text's shingles (32-bit values, stored on the memory doc).
+    """
+    hashed = shingles(text) or {0}
+    return [min((a * h + b) % _PRIME for h in hashed) & 0xFFFFFFFF for a, b in _PERMUTATIONS]
+
+
+def similarity(a: list[int], b: list[int]) -> float:
+    """
+    Estimated Jaccard similarity of two signatures.
+    """
+    if len(a) != len(b) or not a:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def band_keys(sig: list[int]) -> list[str]:
+    """
+    LSH band keys of a signature (stored on the memory doc, queried with array-contains-any).
+    """
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = sig[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        keys.append(f"{band}:{zlib.crc32(b''.join(value.to_bytes(4, 'big') for value in rows)):08x}")
+    return keys
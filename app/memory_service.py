@@ -1,19 +1,54 @@
 from datetime import datetime, timezone
 from .services import get_db
-from .models import MemoryItem, MemoryListResponse, TIER_LIMITS
-from firebase_admin import firestore
+from .models import MemoryItem, TIER_LIMITS
+from .user_service import user_service
+from .cache import shared_cache, MEMORY_CONTEXT_TTL
+from .doc_loader import document_loader
+from .memory_dedup import signature, similarity, band_keys, MEMORY_DEDUP_THRESHOLD
+from .metrics import registry
+from .deadline import Deadline
 from loguru import logger
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+
+# Threads for the dedup candidate query remember() runs on every extracted
+# memory. Its own pool: the default one is where LLM calls wait on Gemini.
+MEMORY_QUERY_THREADS = int(os.getenv("NEX_MEMORY_QUERY_THREADS", "2"))
+
+memory_dedup = registry.counter(
+    "nex_memory_dedup",
+    "Model-extracted memories that near-duplicated an existing one, by action (merged, suppressed).",
+    ("action",),
+)
 
 class MemoryService:
+    def __init__(self, threads: int = MEMORY_QUERY_THREADS):
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="memory-query")
+
     @property
     def db(self):
         return get_db()
 
     def _get_memory_collection(self, uid: str):
         return self.db.collection("memories").document(uid).collection("items")
+
+    def _get_state_ref(self, uid: str):
+        return self.db.collection("memories").document(uid)
+
+    def _mark_changed(self, writer, uid: str, memory: int = 0):
+        """
+        Adds the bookkeeping for a memory add, update or delete to `writer`:
+        memory usage and memory_version (list ETag) in the usage shards, and
+        the profile_dirty flag consolidation looks for on memories/{uid}.
+        Follow the commit with apply_usage_delta(uid, memory=..., bump=("memory_version",)).
+        """
+        from firebase_admin import firestore
+        user_service.add_usage(writer, uid, memory=memory, bump=("memory_version",))
+        writer.set(self._get_state_ref(uid), {"profile_dirty": True, "changed_at": firestore.SERVER_TIMESTAMP}, merge=True)
     
     async def get_memory(self, uid: str, memory_id: str) -> MemoryItem | None:
-        doc = self._get_memory_collection(uid).document(memory_id).get()
+        doc = await document_loader.load(self._get_memory_collection(uid).document(memory_id))
         if not doc.exists:
             return None
         data = doc.to_dict()
@@ -23,42 +58,138 @@ class MemoryService:
             created_at=data["created_at"].isoformat() if hasattr(data["created_at"], "isoformat") else str(data["created_at"])
         )
 
-    async def list_memories(self, uid: str, tier: str, memory_used: int) -> MemoryListResponse:
-        docs = self._get_memory_collection(uid).order_by("created_at", direction=firestore.Query.DESCENDING).stream()
+    async def list_memories(self, uid: str, tier: str, memory_used: int) -> dict:
+        """
+        MemoryListResponse as a plain dict, for the list endpoint's lean path.
+        """
+        from firebase_admin import firestore
+        docs = self._get_memory_collection(uid)\
+            .order_by("created_at", direction=firestore.Query.DESCENDING)\
+            .select(["content", "created_at"]).stream()
         items = []
         for doc in docs:
             data = doc.to_dict()
-            items.append(MemoryItem(
-                id=doc.id,
-                content=data["content"],
-                created_at=data["created_at"].isoformat() if hasattr(data["created_at"], "isoformat") else str(data["created_at"])
-            ))
+            created_at = data["created_at"]
+            items.append({
+                "id": doc.id,
+                "content": data["content"],
+                "created_at": created_at.isoformat() if hasattr(created_at, "isoformat") else str(created_at)
+            })
         
-        limit = TIER_LIMITS[tier]["memory"]
-        return MemoryListResponse(
-            memory_limit=limit,
-            memory_used=memory_used,
-            items=items
-        )
+        return {
+            "memory_limit": TIER_LIMITS[tier]["memory"],
+            "memory_used": memory_used,
+            "items": items
+        }
+
+    async def _invalidate_context(self, uid: str):
+        await shared_cache.delete("memctx", uid)
 
-    async def add_memory(self, uid: str, content: str):
+    async def add_memory(self, uid: str, content: str, minhash: list[int] = None):
+        minhash = minhash or signature(content)
         mem_ref = self._get_memory_collection(uid).document()
         mem_ref.set({
             "content": content,
+            "minhash": minhash,
+            "lsh_bands": band_keys(minhash),
             "created_at": datetime.now(timezone.utc)
         })
         
-        # Increment memory_used in user doc
-        user_ref = self.db.collection("users").document(uid)
-        user_ref.update({"memory_used": firestore.Increment(1)})
+        batch = self.db.batch()
+        self._mark_changed(batch, uid, memory=1)
+        batch.commit()
+        await user_service.apply_usage_delta(uid, memory=1, bump=("memory_version",))
+        await self._invalidate_context(uid)
         return mem_ref.id
 
-    async def get_all_memory_content(self, uid: str) -> str:
-        docs = self._get_memory_collection(uid).stream()
+    def _candidates(self, uid: str, minhash: list[int]) -> dict:
+        """
+        {memory_id: {"content", "minhash"}} for the user's memories sharing an
+        LSH band with `minhash`: the only ones that can be near-duplicates.
+        Memories written before bands existed get them from the consolidation
+        job (python -m app.jobs.consolidate_memories --all, once).
+        """
+        docs = self._get_memory_collection(uid)\
+            .where("lsh_bands", "array_contains_any", band_keys(minhash))\
+            .select(["content", "minhash"]).stream()
+        return {doc.id: doc.to_dict() for doc in docs}
+
+    async def remember(self, uid: str, content: str) -> bool:
+        """
+        Stores a model-extracted memory unless it near-duplicates an existing
+        one. A near-duplicate replaces the existing text when it is at least as
+        detailed (newer phrasing wins), otherwise it is dropped.
+        Returns True when a new memory was added.
+        """
+        minhash = signature(content)
+        index = await asyncio.get_running_loop().run_in_executor(self._executor, self._candidates, uid, minhash)
+        best_id, best_score = None, 0.0
+        for memory_id, entry in index.items():
+            score = similarity(minhash, entry["minhash"])
+            if score > best_score:
+                best_id, best_score = memory_id, score
+
+        if best_id is None or best_score < MEMORY_DEDUP_THRESHOLD:
+            await self.add_memory(uid, content, minhash=minhash)
+            return True
+
+        if len(content) >= len(index[best_id]["content"]):
+            # The profile's older phrasing of a merged memory still holds.
+            await self.update_memory(uid, best_id, content, keep_profile=True)
+            action = "merged"
+        else:
+            action = "suppressed"
+        memory_dedup.inc(action=action)
+        logger.info(f"Near-duplicate memory {action} into {best_id} (similarity {best_score:.2f})")
+        return False
+
+    def _get_profile_ref(self, uid: str):
+        return self.db.collection("memory_profiles").document(uid)
+
+    async def get_memory_context(self, uid: str, deadline: Deadline = None) -> str:
+        """
+        Memory context for prompts: the consolidated profile (see
+        app/jobs/consolidate_memories.py) plus items added since it was built.
+        Falls back to every item for users without a profile yet.
+        `deadline` bounds the item queries (Firestore `timeout=`).
+        """
+        cached = await shared_cache.get_json("memctx", uid)
+        if cached is not None:
+            return cached
+
+        profile_doc = await document_loader.load(self._get_profile_ref(uid))
+        if not profile_doc.exists:
+            return await self.get_all_memory_content(uid, deadline)
+
+        profile = profile_doc.to_dict()
+        lines = []
+        if profile.get("themes"):
+            lines.append("Recurring themes: " + "; ".join(profile["themes"]))
+        lines.extend(f"- {fact}" for fact in profile.get("facts", []))
+        recent = self._get_memory_collection(uid).where("created_at", ">", profile["covered_until"])\
+            .select(["content"]).stream(timeout=deadline.timeout("memories") if deadline else None)
+        lines.extend(f"- {doc.to_dict()['content']}" for doc in recent)
+
+        memory_context = "\n".join(lines)
+        await shared_cache.set_json("memctx", uid, memory_context, MEMORY_CONTEXT_TTL)
+        return memory_context
+
+    async def get_all_memory_content(self, uid: str, deadline: Deadline = None) -> str:
+        cached = await shared_cache.get_json("memctx", uid)
+        if cached is not None:
+            return cached
+
+        docs = self._get_memory_collection(uid).select(["content"]).stream(timeout=deadline.timeout("memories") if deadline else None)
         contents = [doc.to_dict()["content"] for doc in docs]
-        return "\n".join(contents)
+        memory_context = "\n".join(contents)
+        await shared_cache.set_json("memctx", uid, memory_context, MEMORY_CONTEXT_TTL)
+        return memory_context
 
-    async def update_memory(self, uid: str, memory_id: str, content: str) -> bool:
+    async def update_memory(self, uid: str, memory_id: str, content: str, keep_profile: bool = False) -> bool:
+        """
+        Replaces a memory's text. The consolidated profile may quote the old
+        text, so it is deleted until the next consolidation unless `keep_profile`.
+        """
         mem_ref = self._get_memory_collection(uid).document(memory_id)
         try:
             # Check if exists to avoid creating if not present (though update usually fails if not found)
@@ -66,10 +197,20 @@ class MemoryService:
             if not doc.exists:
                 return False
                 
+            minhash = signature(content)
             mem_ref.update({
                 "content": content,
+                "minhash": minhash,
+                "lsh_bands": band_keys(minhash),
                 # We could add updated_at here if model supported it
             })
+            batch = self.db.batch()
+            self._mark_changed(batch, uid)
+            if not keep_profile:
+                batch.delete(self._get_profile_ref(uid))
+            batch.commit()
+            await user_service.apply_usage_delta(uid, bump=("memory_version",))
+            await self._invalidate_context(uid)
             return True
         except Exception as e:
             logger.error(f"Failed to update memory {memory_id}: {e}")
@@ -85,11 +226,16 @@ class MemoryService:
         mem_ref.delete()
         
         # Decrement memory_used
-        user_ref = self.db.collection("users").document(uid)
         # Ensure we don't go below 0
         # However, firestore increment(-1) is atomic. logic to prevent <0 should be robust but strict relies on check.
-        # We can just decrement. 
-        user_ref.update({"memory_used": firestore.Increment(-1)})
+        # We can just decrement. A shard may go negative; only the rolled-up total matters.
+        batch = self.db.batch()
+        self._mark_changed(batch, uid, memory=-1)
+        # The profile may still state the deleted memory; prompts use the items until it is rebuilt.
+        batch.delete(self._get_profile_ref(uid))
+        batch.commit()
+        await user_service.apply_usage_delta(uid, memory=-1, bump=("memory_version",))
+        await self._invalidate_context(uid)
         
         return True
 
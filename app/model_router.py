@@ -0,0 +1,194 @@
+import asyncio
+import os
+import time
+from loguru import logger
+from .services import services
+from .lifecycle import lifecycle
+from .hedging import hedger
+from .metrics import registry
+from .region_pool import region_pool
+
+# Ordered routes; the first healthy one is used and the rest are failed over
+# to. "model@region" pins a region; a bare "model" is tried in every region of
+# the region pool (NEX_VERTEX_REGIONS), fastest healthy region first. Light
+# routes serve short turns and reflections first, then fall back to the full routes.
+MODEL_ROUTES = os.getenv("NEX_MODEL_ROUTES", "gemini-2.0-flash")
+LIGHT_MODEL_ROUTES = os.getenv("NEX_LIGHT_MODEL_ROUTES", "gemini-2.0-flash-lite")
+# A route that was rate limited or unavailable is skipped for this long.
+ROUTE_COOLDOWN = float(os.getenv("NEX_ROUTE_COOLDOWN", "30"))
+# Routes whose recent error rate exceeds this, or whose recent latency is
+# this many times the best route's, go behind the healthy ones.
+ROUTE_MAX_ERROR_RATE = float(os.getenv("NEX_ROUTE_MAX_ERROR_RATE", "0.3"))
+ROUTE_SLOW_FACTOR = float(os.getenv("NEX_ROUTE_SLOW_FACTOR", "2.0"))
+# Weight of the newest call in the latency/error moving averages.
+ROUTE_EWMA_ALPHA = 0.2
+# The error average also halves every this many seconds, so a demoted route
+# that gets no traffic recovers on its own.
+ROUTE_ERROR_HALF_LIFE = 60.0
+
+# Turns this short (single sentence, no history to reason over) go to the light model.
+LIGHT_TURN_MAX_CHARS = int(os.getenv("NEX_LIGHT_TURN_MAX_CHARS", "80"))
+LIGHT_REFLECTION_MAX_MESSAGES = int(os.getenv("NEX_LIGHT_REFLECTION_MAX_MESSAGES", "6"))
+
+model_calls = registry.counter(
+    "nex_model_calls", "Gemini calls by route and outcome (ok, throttled, unavailable, error).", ("route", "outcome")
+)
+model_latency = registry.histogram("nex_model_latency_seconds", "Gemini call latency by route.", ("route",))
+
+
+class RoutesExhausted(Exception):
+    """
+    Every route was rate limited or unavailable for this call.
+    """
+
+
+class Route:
+    def __init__(self, model: str, region: str, light: bool = False, pooled: bool = False):
+        self.model = model
+        self.region = region
+        self.light = light
+        self.pooled = pooled
+        self.ewma_latency: float | None = None
+        self._ewma_errors = 0.0
+        self._errors_at = 0.0
+        self.cooldown_until = 0.0
+
+    @property
+    def name(self) -> str:
+        return f"{self.model}@{self.region}"
+
+    def resource_name(self, project: str) -> str:
+        return f"projects/{project}/locations/{self.region}/publishers/google/models/{self.model}"
+
+    @property
+    def available_at(self) -> float:
+        """
+        When the route's cooldown, or its pooled region's ejection, ends.
+        """
+        if self.pooled:
+            return max(self.cooldown_until, region_pool.ejected_until(self.region))
+        return self.cooldown_until
+
+    def cooling_down(self, now: float) -> bool:
+        return now < self.available_at
+
+    def error_rate(self, now: float) -> float:
+        return self._ewma_errors * 0.5 ** ((now - self._errors_at) / ROUTE_ERROR_HALF_LIFE)
+
+    def record(self, latency: float | None, failed: bool):
+        now = time.monotonic()
+        errors = self.error_rate(now)
+        self._ewma_errors = errors + ROUTE_EWMA_ALPHA * ((1.0 if failed else 0.0) - errors)
+        self._errors_at = now
+        if latency is not None:
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency += ROUTE_EWMA_ALPHA * (latency - self.ewma_latency)
+
+
+def _parse_routes(specs: str, light: bool = False) -> list[list[Route]]:
+    """
+    One group per spec: the pinned route, or the model in each pool region.
+    """
+    groups = []
+    for spec in filter(None, (spec.strip() for spec in specs.split(","))):
+        model, _, region = spec.partition("@")
+        if region:
+            groups.append([Route(model, region, light)])
+        else:
+            groups.append([Route(model, name, light, pooled=True) for name in region_pool.regions])
+    return groups
+
+
+def is_light_turn(user_input: str) -> bool:
+    text = user_input.strip()
+    return len(text) <= LIGHT_TURN_MAX_CHARS and sum(text.count(p) for p in ".?!") <= 1
+
+
+def is_light_reflection(message_count: int) -> bool:
+    return message_count <= LIGHT_REFLECTION_MAX_MESSAGES
+
+
+class ModelRouter:
+    """
+    Picks the Gemini model and region for each call from ordered route
+    lists, failing over immediately on rate limits and unavailability.
+    Latency and error moving averages per route move degraded routes behind
+    healthy ones; throttled routes are skipped during a cooldown. Pooled
+    routes follow the region pool's ranking, and a quota error ejects their
+    region for every pooled model.
+    """
+    def __init__(self, routes: str = MODEL_ROUTES, light_routes: str = LIGHT_MODEL_ROUTES):
+        self.routes = _parse_routes(routes)
+        self.light_routes = _parse_routes(light_routes, light=True)
+
+    def plan(self, light: bool = False) -> list[Route]:
+        """
+        Routes to try for one call, in order.
+        """
+        ranks = {name: i for i, name in enumerate(region_pool.ranked())}
+        candidates = []
+        for group in (self.light_routes if light else []) + self.routes:
+            candidates.extend(sorted(group, key=lambda r: ranks[r.region]) if group[0].pooled else group)
+        now = time.monotonic()
+        latencies = [r.ewma_latency for r in candidates if r.ewma_latency is not None and not r.cooling_down(now)]
+        best_latency = min(latencies) if latencies else None
+
+        def degraded(route: Route) -> bool:
+            if route.error_rate(now) > ROUTE_MAX_ERROR_RATE:
+                return True
+            # Light routes are only compared with each other; they are expected to be fastest.
+            return (not route.light and best_latency is not None and route.ewma_latency is not None
+                    and route.ewma_latency > best_latency * ROUTE_SLOW_FACTOR)
+
+        healthy = [r for r in candidates if not r.cooling_down(now) and not degraded(r)]
+        slow = [r for r in candidates if not r.cooling_down(now) and degraded(r)]
+        cooling = sorted((r for r in candidates if r.cooling_down(now)), key=lambda r: r.available_at)
+        return healthy + slow + cooling
+
+    def _model(self, route: Route, system_instruction):
+        generative_models = services.generative_models()
+        project = os.getenv("GOOGLE_CLOUD_PROJECT", "neuralexchange-b6b7f")
+        return generative_models.GenerativeModel(route.resource_name(project), system_instruction=system_instruction)
+
+    @staticmethod
+    async def _attempt(model, prompt, generation_config):
+        async with lifecycle.llm_call():
+            return await asyncio.to_thread(model.generate_content, prompt, generation_config=generation_config)
+
+    async def generate(self, prompt: str, system_instruction: str = None, generation_config=None, light: bool = False) -> str:
+        """
+        One generation, trying each planned route once. Raises RoutesExhausted
+        when all were rate limited or unavailable, and re-raises other errors.
+        """
+        from google.api_core import exceptions
+        for route in self.plan(light):
+            model = self._model(route, system_instruction)
+            started = time.monotonic()
+            try:
+                response = await hedger.call(route.name, lambda: self._attempt(model, prompt, generation_config))
+            except (exceptions.ResourceExhausted, exceptions.ServiceUnavailable) as e:
+                outcome = "throttled" if isinstance(e, exceptions.ResourceExhausted) else "unavailable"
+                route.record(None, failed=True)
+                route.cooldown_until = time.monotonic() + ROUTE_COOLDOWN
+                if route.pooled and outcome == "throttled":
+                    region_pool.eject(route.region)
+                model_calls.inc(route=route.name, outcome=outcome)
+                logger.warning(f"Gemini route {route.name} {outcome}; failing over")
+                continue
+            except Exception:
+                route.record(time.monotonic() - started, failed=True)
+                model_calls.inc(route=route.name, outcome="error")
+                raise
+            latency = time.monotonic() - started
+            route.record(latency, failed=False)
+            if route.pooled:
+                region_pool.record_success(route.region)
+            model_calls.inc(route=route.name, outcome="ok")
+            model_latency.observe(latency, route=route.name)
+            return response.text
+        raise RoutesExhausted()
+
+
+model_router = ModelRouter()
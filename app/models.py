@@ -22,10 +22,18 @@ class UserState(BaseModel):
     daily_limit: int | float
     memory_used: int
     memory_limit: int | float
+    # Bumped whenever the user's memory list or archive list changes; used
+    # for ETags only, never part of the API response.
+    memory_version: int = Field(0, exclude=True)
+    archive_version: int = Field(0, exclude=True)
 
 class InteractionRequest(BaseModel):
     input: str
     session_id: str = Field(..., description="Active session ID required")
+    coalesce: bool = Field(
+        False,
+        description="Voice fragment mode: fragments sent within the debounce window are merged into one turn"
+    )
 
 class InteractionResponse(BaseModel):
     reply: str
@@ -33,6 +41,11 @@ class InteractionResponse(BaseModel):
     messages_remaining: int | float
     tier: Tier
 
+class InteractionMergedResponse(BaseModel):
+    status: str = "MERGED"
+    session_id: str
+    detail: str = "Fragment merged into a later request's turn; the reply is returned there."
+
 class ErrorResponse(BaseModel):
     error: str
     tier: Tier
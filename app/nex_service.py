@@ -1,45 +1,65 @@
 # import google.generativeai as genai  <-- Removed
-import vertexai
-from vertexai.generative_models import GenerativeModel, GenerationConfig
 import random
 from .memory_service import memory_service
 from .user_service import user_service
 from .session_service import session_service
-from .models import Tier, TIER_LIMITS
+from .models import Message, Tier, TIER_LIMITS, UserState
 from loguru import logger
 import asyncio
-from google.api_core import exceptions
+import json
 from pydantic import BaseModel
 from typing import Optional
 from .prompts import get_system_instructions, get_user_prompt_header
+from .services import services
+from .deadline import Deadline, DeadlineExceeded, MIN_LLM_BUDGET, WRITE_RESERVE
+from .model_router import model_router, RoutesExhausted, is_light_turn
+from .coalescer import turn_coalescer, MERGED
 from datetime import datetime
 
+# Define schema manually to avoid "default" field issues in Pydantic conversion
+RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "reply": {"type": "STRING"},
+        "vibe_check": {"type": "STRING", "enum": ["anchoring", "echoing", "drifting"]},
+        "memory": {"type": "STRING", "nullable": True}
+    },
+    "required": ["reply", "vibe_check"]
+}
+
 class NexResponse(BaseModel):
     reply: str
     vibe_check: Optional[str] = None
     memory: Optional[str] = None
 
 class NexService:
-    def __init__(self):
-        self.model_name = "gemini-2.0-flash"
-
-    async def interact(self, uid: str, session_id: str, user_input: str):
+    async def interact(self, uid: str, session_id: str, user_input: str, deadline: Deadline = None, user_state: UserState = None):
         """
-        Interacts with NEX within a specific sessionContext.
-        Returns: (reply, vibe, tier)
+        Interacts with NEX within a specific sessionContext. Pass `user_state`
+        when the caller already has it; it is read here otherwise.
+        Returns: (reply, vibe, tier). reply is "DEADLINE_EXCEEDED" when the
+        request's budget ran out before a reply was stored.
         """
+        try:
+            return await self._interact(uid, session_id, user_input, deadline or Deadline.for_route("interact"), user_state)
+        except DeadlineExceeded as e:
+            logger.warning(f"Interact deadline exceeded at {e.stage} | Session: {session_id}")
+            return "DEADLINE_EXCEEDED", None, None
+
+    async def _interact(self, uid: str, session_id: str, user_input: str, deadline: Deadline, user_state: UserState = None):
         # 1. Get Session & Validate
-        session = await session_service.get_active_session(uid)
+        session = await deadline.run("session", session_service.get_active_session(uid, deadline))
         if not session or session.session_id != session_id:
             # If session is invalid or mismatch, return error.
             # Client should have started a session first.
             return "SESSION_INVALID", None, Tier.TIER_1
 
         # 2. Add User Message to Session
-        await session_service.add_message(session_id, "user", user_input)
+        await session_service.add_message(session_id, "user", user_input, timeout=deadline.timeout("session_write"))
 
         # 3. Get user state & Check Global Limits
-        user_state = await user_service.get_user_state(uid)
+        if user_state is None:
+            user_state = await deadline.run("user_state", user_service.get_user_state(uid))
         
         # Check Turn Limits (using session message count / 2 for turns, or just message count)
         # PRD: "Max 25 turns" -> 50 messages? 
@@ -53,126 +73,147 @@ class NexService:
             return "LIMIT_REACHED", None, user_state.tier
 
         # 4. Retrieve memories
-        memories = await memory_service.get_all_memory_content(uid)
+        memories = await deadline.run("memories", memory_service.get_memory_context(uid, deadline))
 
         # 5. Check Memory Availability
         mem_limit = TIER_LIMITS[user_state.tier]["memory"]
         can_add_memory = user_state.memory_used < mem_limit
         
-        # 6. Format History from Session Transcript
-        history_str = ""
-        for msg in session.transcript:
-             role = msg.role.upper()
-             content = msg.content
-             history_str += f"{role}: {content}\n"
-        # Add current input (already added to transcript in DB but maybe not in local object if we didn't refresh? 
-        # Actually add_message updates DB. The 'session' object is from get_active_session called BEFORE add_message.
-        # So we should append current input to history_str manually or re-fetch.
-        history_str += f"USER: {user_input}\n"
-
-        # 5. Construct Prompts
-        system_instruction = get_system_instructions()
-        header = get_user_prompt_header(memories, datetime.now().strftime("%A, %B %d, %Y, %H:%M:%S"))
-        
-        # history_str already contains current input concatenated in previous steps (line 69)
-        # but let's make it cleaner: history from transcript + current user input
-        full_conversation = history_str # This contains everything including current input
-        
-        user_prompt = f"{header}\n\n# CONVERSATION HISTORY:\n{full_conversation}"
-        
-        # Define schema manually to avoid "default" field issues in Pydantic conversion
-        response_schema = {
-            "type": "OBJECT",
-            "properties": {
-                "reply": {"type": "STRING"},
-                "vibe_check": {"type": "STRING", "enum": ["anchoring", "echoing", "drifting"]},
-                "memory": {"type": "STRING", "nullable": True}
-            },
-            "required": ["reply", "vibe_check"]
-        }
+        # 6. Build the prompt from the session transcript plus the current input.
+        # The 'session' object is from get_active_session called BEFORE add_message,
+        # so the current input is appended by build_prompt.
+        user_prompt = self.build_prompt(memories, session.transcript, user_input)
 
         try:
             # We don't use history here as per NEX philosophy (no threads)
             # but we pass memories as context
-            response_json = await self._generate_with_retry(
-                user_prompt,
-                system_instruction=system_instruction,
-                response_schema=response_schema
-            )
-            
-            # Parse response
-            import json
-            try:
-                data = json.loads(response_json)
-                reply = data.get("reply", "")
-                vibe = data.get("vibe_check", "unknown")
-                memory_content = data.get("memory")
-                logger.info(f"NEX Vibe: {vibe} | Session: {session_id}")
-            except json.JSONDecodeError:
-                # Fallback if something went wrong
-                logger.error(f"Failed to parse JSON from Gemini: {response_json}")
-                reply = str(response_json)
-                memory_content = None
+            reply, vibe, memory_content = await self.generate_reply(user_prompt, light=is_light_turn(user_input), deadline=deadline)
+            logger.info(f"NEX Vibe: {vibe} | Session: {session_id}")
 
             if reply == "RATE_LIMITED":
                 return "RATE_LIMITED", None, user_state.tier
 
-            # 7. Store Memory if generated and allowed
+            # 7. Store Memory if generated and allowed (near-duplicates merge into existing ones).
+            # Optional, so it is the first thing dropped when the budget is short.
             if memory_content and can_add_memory:
-                 await memory_service.add_memory(uid, memory_content)
+                if deadline.covers(WRITE_RESERVE):
+                    await deadline.run("memory", memory_service.remember(uid, memory_content))
+                else:
+                    logger.warning(f"Skipping memory write, deadline nearly spent | Session: {session_id}")
 
             # 8. Add Model Reply to Session
-            await session_service.add_message(session_id, "model", reply)
+            await session_service.add_message(session_id, "model", reply, timeout=deadline.timeout("session_write"))
 
             # 9. Increment global usage
-            await user_service.increment_message_usage(uid)
+            await user_service.increment_message_usage(uid, timeout=deadline.timeout("usage_write"))
             
             return reply, vibe, user_state.tier
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Gemini error: {e}")
             return "ERROR", None, user_state.tier
 
-    async def _generate_with_retry(self, prompt: str, system_instruction: str = None, response_schema=None, max_retries: int = 5) -> str:
+    def build_prompt(self, memories: str, transcript: list[Message], user_input: str) -> str:
+        """
+        Builds the user prompt: memory/time header plus the conversation history
+        ending with the current input.
+        """
+        history_str = ""
+        for msg in transcript:
+            history_str += f"{msg.role.upper()}: {msg.content}\n"
+        history_str += f"USER: {user_input}\n"
+
+        header = get_user_prompt_header(memories, datetime.now().strftime("%A, %B %d, %Y, %H:%M:%S"))
+        return f"{header}\n\n# CONVERSATION HISTORY:\n{history_str}"
+
+    async def generate_reply(self, user_prompt: str, light: bool = False, deadline: Deadline = None) -> tuple[str, str | None, str | None]:
         """
-        Generates content with exponential backoff retry logic for rate limits.
+        Runs one NEX turn against Gemini; `light` turns go to the light model first.
+        Returns: (reply, vibe, memory). reply is "RATE_LIMITED" when retries ran out.
+        Raises on non-retriable Gemini errors and DeadlineExceeded.
         """
-        model = GenerativeModel(
-            self.model_name,
-            system_instruction=system_instruction
+        response_json = await self._generate_with_retry(
+            user_prompt,
+            system_instruction=get_system_instructions(),
+            response_schema=RESPONSE_SCHEMA,
+            light=light,
+            deadline=deadline
         )
+
+        # Parse response
+        try:
+            data = json.loads(response_json)
+            return data.get("reply", ""), data.get("vibe_check", "unknown"), data.get("memory")
+        except json.JSONDecodeError:
+            # Fallback if something went wrong (also covers "RATE_LIMITED")
+            if response_json != "RATE_LIMITED":
+                logger.error(f"Failed to parse JSON from Gemini: {response_json}")
+            return str(response_json), None, None
+
+    async def interact_coalesced(self, uid: str, session_id: str, fragment: str):
+        """
+        Voice fragment mode: fragments for the same session that arrive within
+        the debounce window become one interact() turn with one LLM call.
+        Returns the turn's (reply, vibe, tier) for the latest fragment and
+        ("MERGED", None, None) for the fragments it superseded.
+        """
+        result = await turn_coalescer.submit(
+            (uid, session_id),
+            fragment,
+            # The turn gets its own budget from when it runs: the first
+            # fragment's request may be up to COALESCE_MAX_WAIT old by then.
+            lambda text: self.interact(uid, session_id, text, Deadline.for_route("interact")),
+        )
+        if result == MERGED:
+            return MERGED, None, None
+        return result
+
+    async def _generate_with_retry(self, prompt: str, system_instruction: str = None, response_schema=None, max_retries: int = 5, light: bool = False, deadline: Deadline = None) -> str:
+        """
+        Generates content through the model router, which fails over between
+        routes on rate limits; backs off exponentially only once every route
+        was rate limited or unavailable. With a deadline, each attempt is
+        bounded by the remaining budget (less WRITE_RESERVE) and no backoff is
+        started that would leave less than MIN_LLM_BUDGET for the next attempt.
+        """
+        generative_models = services.generative_models()
         base_delay = 2
         
-        generation_config = GenerationConfig(
+        generation_config = generative_models.GenerationConfig(
             response_mime_type="application/json",
             response_schema=response_schema
         ) if response_schema else None
 
         for attempt in range(max_retries):
+            call = model_router.generate(
+                prompt,
+                system_instruction=system_instruction,
+                generation_config=generation_config,
+                light=light
+            )
             try:
-                # User requested synchronous generate_content. 
-                # Running in thread to avoid blocking the event loop.
-                response = await asyncio.to_thread(
-                    model.generate_content, 
-                    prompt, 
-                    generation_config=generation_config
-                )
-                return response.text
-            except exceptions.ResourceExhausted as e:
-                jitter = random.uniform(0, 1)
-                wait_time = (base_delay * (2 ** attempt)) + jitter
-                logger.warning(f"Gemini rate limit hit. Retrying in {wait_time:.2f}s... (Attempt {attempt + 1}/{max_retries})")
-                await asyncio.sleep(wait_time)
-            except exceptions.ServiceUnavailable as e:
+                if deadline is None:
+                    return await call
+                deadline.check("llm", MIN_LLM_BUDGET + WRITE_RESERVE)
+                return await deadline.run("llm", call, reserve=WRITE_RESERVE)
+            except RoutesExhausted:
                 jitter = random.uniform(0, 1)
                 wait_time = (base_delay * (2 ** attempt)) + jitter
-                logger.warning(f"Gemini service unavailable. Retrying in {wait_time:.2f}s... (Attempt {attempt + 1}/{max_retries})")
+                if deadline is not None and not deadline.covers(wait_time + MIN_LLM_BUDGET + WRITE_RESERVE):
+                    logger.warning("Gemini rate limited and not enough deadline budget left to retry.")
+                    break
+                logger.warning(f"All Gemini routes rate limited or unavailable. Retrying in {wait_time:.2f}s... (Attempt {attempt + 1}/{max_retries})")
                 await asyncio.sleep(wait_time)
+            except DeadlineExceeded:
+                call.close()
+                raise
             except Exception as e:
                 # For other errors, re-raise immediately
                 logger.error(f"Non-retriable Gemini error: {e}")
                 raise e
         
-        logger.error(f"Gemini rate limit retries exhausted after {max_retries} attempts.")
+        logger.error(f"Gemini rate limit retries exhausted after {attempt + 1} attempts.")
         return "RATE_LIMITED"
 
 nex_service = NexService()
@@ -0,0 +1,264 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from starlette.types import ASGIApp, Receive, Scope, Send
+from .metrics import registry
+
+# Time between stack samples.
+PROFILE_INTERVAL = float(os.getenv("NEX_PROFILE_INTERVAL_MS", "5")) / 1000
+# Upper bound on one profiling run, in either mode.
+PROFILE_MAX_SECONDS = float(os.getenv("NEX_PROFILE_MAX_SECONDS", "60"))
+# Deeper stacks are cut at the root end.
+PROFILE_MAX_DEPTH = 128
+
+profile_runs = registry.counter("nex_profile_runs", "Sampling profiler runs by mode (seconds, route).", ("mode",))
+
+
+class ProfilerBusy(Exception):
+    """
+    A profile is already running on this worker.
+    """
+
+
+class Profile:
+    """
+    Sampled stacks, root first, with how often each was seen.
+    """
+    def __init__(self, stacks: Counter, interval: float, duration: float, requests: int = 0):
+        self.stacks = stacks
+        self.interval = interval
+        self.duration = duration
+        self.requests = requests
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """
+        Folded stacks ("root;...;leaf count" per line) for flamegraph.pl,
+        speedscope, inferno and most other flamegraph tools.
+        """
+        lines = [";".join(_label(frame) for frame in stack) + f" {count}" for stack, count in self.stacks.most_common()]
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str) -> dict:
+        """
+        Speedscope file format (https://www.speedscope.app/file-format-schema.json),
+        one sampled profile weighted in milliseconds.
+        """
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in self.stacks.most_common():
+            sample = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    function, filename, line = frame
+                    frames.append({"name": function, "file": filename, "line": line} if filename else {"name": function})
+                sample.append(index[frame])
+            samples.append(sample)
+            weights.append(round(count * self.interval * 1000, 3))
+        total = round(sum(weights), 3)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "nex-backend",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled", "name": name, "unit": "milliseconds",
+                "startValue": 0, "endValue": total, "samples": samples, "weights": weights,
+            }],
+        }
+
+
+def _label(frame: tuple) -> str:
+    function, filename, line = frame
+    if not filename:
+        return function
+    return f"{function} ({os.path.basename(filename)}:{line})".replace(";", ":")
+
+
+def _code(frame) -> tuple:
+    code = frame.f_code
+    return code.co_name, code.co_filename, code.co_firstlineno
+
+
+def _stack(frame, root: tuple | None) -> tuple:
+    stack = []
+    while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+        stack.append(_code(frame))
+        frame = frame.f_back
+    if root is not None:
+        stack.append(root)
+    stack.reverse()
+    return tuple(stack)
+
+
+def _task_stack(task: asyncio.Task, running_frame) -> tuple:
+    """
+    Stack of one request's task, root first: its chain of awaiting
+    coroutines, then either the plain frames the innermost one is running
+    (`running_frame` is the loop thread's current frame while the task runs)
+    or what it is waiting on.
+    """
+    frames = []
+    awaited = task.get_coro()
+    while awaited is not None and len(frames) < PROFILE_MAX_DEPTH:
+        frame = getattr(awaited, "cr_frame", None) or getattr(awaited, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        awaited = getattr(awaited, "cr_await", None) or getattr(awaited, "gi_yieldfrom", None)
+    stack = [_code(frame) for frame in frames]
+    if running_frame is not None and frames:
+        called = []
+        frame = running_frame
+        while frame is not None and frame is not frames[-1]:
+            called.append(_code(frame))
+            frame = frame.f_back
+        if frame is not None:
+            stack.extend(reversed(called))
+    elif awaited is not None:
+        stack.append((f"<awaiting {type(awaited).__name__}>", "", 0))
+    return tuple(stack)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for this worker: while a run is active, a thread
+    samples interpreter stacks every PROFILE_INTERVAL.
+
+    - profile_for(seconds): every thread, including the event loop and the
+      executor pools, for a fixed time.
+    - profile_route(route, requests): each in-flight request to the route,
+      until that many have completed. This is wall-clock time per request:
+      a request's sample is where it is running, or which await it is
+      suspended in (ending in an <awaiting ...> frame).
+
+    Idle, no thread runs and the middleware does a single attribute check
+    per request. One run at a time per worker.
+    """
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.route: str | None = None
+        self._running = False
+        self._tracked: dict[asyncio.Task, Scope] = {}
+        self._loop_thread: int | None = None
+        self._completed = 0
+        self._wanted = 0
+        self._done: asyncio.Event | None = None
+
+    def _claim(self):
+        if self._running:
+            raise ProfilerBusy()
+        self._running = True
+
+    def _sample_threads(self, stop: threading.Event, stacks: Counter):
+        own = threading.get_ident()
+        while not stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    stacks[_stack(frame, (names.get(ident, f"thread-{ident}"), "", 0))] += 1
+
+    def _sample_route(self, stop: threading.Event, stacks: Counter, loop):
+        current_tasks = getattr(asyncio.tasks, "_current_tasks", {})
+        while not stop.wait(self.interval):
+            running = current_tasks.get(loop)
+            for task, scope in list(self._tracked.items()):
+                if not self._matches(scope):
+                    continue
+                running_frame = sys._current_frames().get(self._loop_thread) if task is running else None
+                stacks[_task_stack(task, running_frame)] += 1
+
+    def _start(self, target, *args):
+        stacks: Counter = Counter()
+        stop = threading.Event()
+        sampler = threading.Thread(target=target, args=(stop, stacks, *args), name="nex-profiler", daemon=True)
+        sampler.start()
+        return stacks, stop, sampler
+
+    async def profile_for(self, seconds: float) -> Profile:
+        self._claim()
+        profile_runs.inc(mode="seconds")
+        try:
+            started = time.monotonic()
+            stacks, stop, sampler = self._start(self._sample_threads)
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                stop.set()
+                sampler.join()  # exits within one interval
+            return Profile(stacks, self.interval, time.monotonic() - started)
+        finally:
+            self._running = False
+
+    async def profile_route(self, route: str, requests: int, timeout: float) -> Profile:
+        """
+        Profiles the next `requests` requests to `route` (a route template
+        such as /archive/{archive_id}, or a literal path), giving up after
+        `timeout` seconds with whatever was sampled.
+        """
+        self._claim()
+        profile_runs.inc(mode="route")
+        self._loop_thread = threading.get_ident()
+        self._completed, self._wanted = 0, requests
+        self._done = asyncio.Event()
+        self.route = route
+        try:
+            started = time.monotonic()
+            stacks, stop, sampler = self._start(self._sample_route, asyncio.get_running_loop())
+            try:
+                await asyncio.wait_for(self._done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self.route = None
+                stop.set()
+                sampler.join()  # exits within one interval
+            return Profile(stacks, self.interval, time.monotonic() - started, self._completed)
+        finally:
+            self._tracked.clear()
+            self._running = False
+
+    def _matches(self, scope: Scope | None) -> bool:
+        if scope is None or self.route is None:
+            return False
+        route = scope.get("route")
+        return scope.get("path") == self.route or (route is not None and getattr(route, "path", None) == self.route)
+
+    async def track(self, app: ASGIApp, scope: Scope, receive: Receive, send: Send):
+        task = asyncio.current_task()
+        self._tracked[task] = scope
+        try:
+            await app(scope, receive, send)
+        finally:
+            self._tracked.pop(task, None)
+            # The route is only known once the router has matched the request.
+            if self.route is not None and self._matches(scope):
+                self._completed += 1
+                if self._completed >= self._wanted:
+                    self._done.set()
+
+
+profiler = SamplingProfiler()
+
+
+class ProfilerMiddleware:
+    """
+    Lets a route-mode profile see which task serves which request. Must sit
+    inside any BaseHTTPMiddleware, which runs the rest of the app in a
+    separate task.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if profiler.route is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        await profiler.track(self.app, scope, receive, send)
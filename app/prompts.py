@@ -67,3 +67,24 @@ Transcript:
 {transcript}
 \"\"\"
 """.strip()
+
+def get_memory_profile_prompt(memories: str) -> str:
+    """
+    Prompt for condensing a user's individual memories into a compact profile.
+    """
+    return f"""
+Condense the following memories about one person into a compact profile.
+Merge facts that say the same thing, drop anything trivial or superseded by a newer fact,
+and keep each entry short. Write in the third person without using their name.
+
+Return exactly this JSON format:
+{{
+  "themes": ["Up to 5 recurring themes, patterns or beliefs"],
+  "facts": ["Up to 15 key personal facts"]
+}}
+
+Memories (oldest first):
+\"\"\"
+{memories}
+\"\"\"
+""".strip()
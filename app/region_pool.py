@@ -0,0 +1,140 @@
+import asyncio
+import os
+import time
+from loguru import logger
+from .metrics import registry
+
+# Vertex AI regions that model routes without an explicit @region are served
+# from. Until probes have run, they are preferred in this order.
+VERTEX_REGIONS = [r.strip() for r in os.getenv("NEX_VERTEX_REGIONS", "us-central1").split(",") if r.strip()]
+# Probed per region, {region} substituted. Any HTTP response counts as
+# reachable; point it at stub endpoints to try region selection locally.
+REGION_PROBE_URL = os.getenv("NEX_REGION_PROBE_URL", "https://{region}-aiplatform.googleapis.com/")
+# Seconds between probe rounds, and how long one probe may take.
+REGION_PROBE_INTERVAL = float(os.getenv("NEX_REGION_PROBE_INTERVAL", "30"))
+REGION_PROBE_TIMEOUT = float(os.getenv("NEX_REGION_PROBE_TIMEOUT", "2"))
+# A region that returns a quota error is ejected for this long, doubled for
+# each further quota error before a successful call, up to REGION_EJECT_MAX.
+REGION_EJECT_SECONDS = float(os.getenv("NEX_REGION_EJECT_SECONDS", "30"))
+REGION_EJECT_MAX = float(os.getenv("NEX_REGION_EJECT_MAX", "600"))
+# Weight of the newest probe in the latency moving average.
+REGION_EWMA_ALPHA = 0.3
+
+region_probe_latency = registry.histogram(
+    "nex_region_probe_seconds", "Round trip of region latency probes.", ("region",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0),
+)
+region_probe_failures = registry.counter("nex_region_probe_failures", "Region probes that got no response.", ("region",))
+region_ejections = registry.counter("nex_region_ejections", "Regions ejected after a quota error.", ("region",))
+
+
+class Region:
+    def __init__(self, name: str, index: int):
+        self.name = name
+        self.index = index
+        self.probe_latency: float | None = None
+        self.reachable = True
+        self.ejected_until = 0.0
+        self.ejections = 0
+
+    def record_probe(self, latency: float | None):
+        if latency is None:
+            self.reachable = False
+            return
+        self.reachable = True
+        if self.probe_latency is None:
+            self.probe_latency = latency
+        else:
+            self.probe_latency += REGION_EWMA_ALPHA * (latency - self.probe_latency)
+
+
+class RegionPool:
+    """
+    The Vertex AI regions pooled model routes can use, ranked per call:
+    reachable regions by probed round-trip time, then unreachable ones, then
+    regions ejected after quota errors (soonest back first).
+
+    While more than one region is configured, a background task probes each
+    region's endpoint every REGION_PROBE_INTERVAL over a kept-alive
+    connection, so the ranking tracks network latency from this worker
+    without spending model quota.
+    """
+    def __init__(self, regions: list[str] = VERTEX_REGIONS, probe_url: str = REGION_PROBE_URL):
+        self.regions = {name: Region(name, i) for i, name in enumerate(regions)}
+        self.probe_url = probe_url
+        self._task: asyncio.Task | None = None
+
+    @property
+    def default_region(self) -> str:
+        return next(iter(self.regions))
+
+    def ranked(self) -> list[str]:
+        now = time.monotonic()
+        available = [r for r in self.regions.values() if r.ejected_until <= now]
+        reachable = sorted(
+            (r for r in available if r.reachable),
+            key=lambda r: (r.probe_latency is None, r.probe_latency or 0.0, r.index),
+        )
+        unreachable = [r for r in available if not r.reachable]
+        ejected = sorted((r for r in self.regions.values() if r.ejected_until > now), key=lambda r: r.ejected_until)
+        return [r.name for r in reachable + unreachable + ejected]
+
+    def ejected_until(self, region: str) -> float:
+        entry = self.regions.get(region)
+        return entry.ejected_until if entry is not None else 0.0
+
+    def eject(self, region: str):
+        entry = self.regions.get(region)
+        if entry is None:
+            return
+        seconds = min(REGION_EJECT_MAX, REGION_EJECT_SECONDS * 2 ** entry.ejections)
+        entry.ejections += 1
+        entry.ejected_until = time.monotonic() + seconds
+        region_ejections.inc(region=region)
+        logger.warning(f"Vertex region {region} returned a quota error; ejected for {seconds:g}s")
+
+    def record_success(self, region: str):
+        entry = self.regions.get(region)
+        if entry is not None:
+            entry.ejections = 0
+
+    async def probe_once(self, client):
+        async def probe(region: Region):
+            started = time.monotonic()
+            try:
+                await client.get(self.probe_url.format(region=region.name))
+            except Exception as e:
+                region.record_probe(None)
+                region_probe_failures.inc(region=region.name)
+                logger.warning(f"Probe of Vertex region {region.name} failed: {e!r}")
+                return
+            latency = time.monotonic() - started
+            region.record_probe(latency)
+            region_probe_latency.observe(latency, region=region.name)
+
+        await asyncio.gather(*(probe(region) for region in self.regions.values()))
+
+    async def _run(self):
+        import httpx
+        async with httpx.AsyncClient(timeout=REGION_PROBE_TIMEOUT) as client:
+            while True:
+                await self.probe_once(client)
+                logger.debug(f"Vertex regions by probe latency: {self.ranked()}")
+                await asyncio.sleep(REGION_PROBE_INTERVAL)
+
+    def start(self):
+        """
+        Starts probing (lifespan startup). Nothing to choose between with one region.
+        """
+        if len(self.regions) > 1 and self._task is None:
+            self._task = asyncio.create_task(self._run(), name="region-probe")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+region_pool = RegionPool()
@@ -0,0 +1,36 @@
+from datetime import datetime
+import orjson
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+# UTC datetimes end in "Z", matching pydantic's JSON output for the same models.
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+
+def _default(obj):
+    # orjson only handles exact datetimes; Firestore returns a subclass.
+    if isinstance(obj, datetime):
+        text = obj.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class NexJSONResponse(ORJSONResponse):
+    """
+    Default response class: bodies are rendered with orjson.
+    """
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+def lean_json(content, response: Response | None = None) -> NexJSONResponse:
+    """
+    Returns `content` (plain dicts and lists shaped like the route's
+    response_model) without validating it against that model again.
+    Headers already set on the injected `response` (ETag, Cache-Control)
+    are carried over, since FastAPI ignores it once a Response is returned.
+    """
+    headers = dict(response.headers) if response is not None else None
+    if headers:
+        headers.pop("content-length", None)
+    return NexJSONResponse(content, headers=headers)
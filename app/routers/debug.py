@@ -0,0 +1,55 @@
+import os
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from ..auth_service import get_admin_user_id
+from ..profiler import profiler, ProfilerBusy, PROFILE_MAX_SECONDS
+from ..responses import NexJSONResponse
+
+router = APIRouter(prefix="/debug", tags=["Debug"])
+
+@router.get("/profile", include_in_schema=False)
+async def profile(
+    seconds: float = None,
+    route: str = None,
+    requests: int = 20,
+    format: Literal["collapsed", "speedscope"] = "collapsed",
+    uid: str = Depends(get_admin_user_id)
+):
+    """
+    Samples this worker's stacks and returns them as collapsed stacks
+    (flamegraph.pl, speedscope) or a speedscope JSON file.
+
+    - ?seconds=N: all threads for N seconds.
+    - ?route=/nex/interact&requests=N: the next N requests to that route
+      (template or literal path), in wall-clock time including awaits;
+      `seconds` then caps the wait.
+
+    Only the worker that receives this request is profiled.
+    """
+    if seconds is None and route is None:
+        raise HTTPException(status_code=400, detail="Pass seconds, or route (with optional seconds as a time limit)")
+    if seconds is not None and not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}]")
+    if not 1 <= requests <= 1000:
+        raise HTTPException(status_code=400, detail="requests must be between 1 and 1000")
+
+    try:
+        if route is None:
+            result = await profiler.profile_for(seconds)
+            name = f"pid {os.getpid()}, {seconds:g}s"
+        else:
+            result = await profiler.profile_route(route, requests, seconds or PROFILE_MAX_SECONDS)
+            name = f"pid {os.getpid()}, {route} x{result.requests}"
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running on this worker")
+
+    headers = {
+        "X-Profile-Samples": str(result.samples),
+        "X-Profile-Requests": str(result.requests),
+        "X-Profile-Seconds": f"{result.duration:.3f}",
+    }
+    if format == "speedscope":
+        headers["Content-Disposition"] = f'attachment; filename="nex-{os.getpid()}.speedscope.json"'
+        return NexJSONResponse(result.speedscope(name), headers=headers)
+    return PlainTextResponse(result.collapsed(), headers=headers)
@@ -1,5 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from ..auth_service import get_current_user_id
+from ..http_cache import make_etag, not_modified
+from ..responses import lean_json
 from ..memory_service import memory_service
 from ..user_service import user_service
 from ..models import MemoryListResponse, CreateMemoryRequest, CreateMemoryResponse, ErrorResponse, TIER_LIMITS, UpdateMemoryRequest, DeleteMemoryResponse, MemoryItem
@@ -7,9 +9,13 @@ from ..models import MemoryListResponse, CreateMemoryRequest, CreateMemoryRespon
 router = APIRouter(prefix="/memory", tags=["Memory"])
 
 @router.get("", response_model=MemoryListResponse)
-async def list_memories(uid: str = Depends(get_current_user_id)):
+async def list_memories(request: Request, response: Response, uid: str = Depends(get_current_user_id)):
     user_state = await user_service.get_user_state(uid)
-    return await memory_service.list_memories(uid, user_state.tier, user_state.memory_used)
+    etag = make_etag("memory", uid, user_state.memory_version, user_state.tier.value, user_state.memory_used)
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+    return lean_json(await memory_service.list_memories(uid, user_state.tier, user_state.memory_used), response)
 
 @router.post("")
 async def create_memory(req: CreateMemoryRequest, uid: str = Depends(get_current_user_id)):
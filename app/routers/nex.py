@@ -1,21 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from ..responses import NexJSONResponse
 from ..auth_service import get_current_user_id
 from ..nex_service import nex_service
 from ..user_service import user_service
-from ..models import InteractionRequest, InteractionResponse, ErrorResponse, TIER_LIMITS, Tier
+from ..deadline import Deadline
+from ..idempotency import idempotency_store, fingerprint
+from ..models import InteractionRequest, InteractionResponse, InteractionMergedResponse, ErrorResponse, TIER_LIMITS, Tier
 
 router = APIRouter(prefix="/nex", tags=["NEX"])
 
-@router.post("/interact", response_model=InteractionResponse | ErrorResponse)
-async def interact(req: InteractionRequest, uid: str = Depends(get_current_user_id)):
+@router.post("/interact", response_model=InteractionResponse | InteractionMergedResponse | ErrorResponse)
+async def interact(
+    req: InteractionRequest,
+    response: Response,
+    uid: str = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key replay the original response")
+):
+    deadline = Deadline.for_route("interact")
+    if idempotency_key is None:
+        status_code, body = await _interact(uid, req, deadline)
+        response.status_code = status_code
+        return body
+
+    record, replayed = await idempotency_store.run(
+        uid, idempotency_key, fingerprint(req.model_dump()), lambda: _interact(uid, req, deadline)
+    )
+    headers = {"Idempotent-Replayed": "true"} if replayed else {}
+    return NexJSONResponse(record["body"], status_code=record["status_code"], headers=headers)
+
+async def _interact(uid: str, req: InteractionRequest, deadline: Deadline):
+    """
+    Runs one interact turn. Returns (status_code, response model); raises HTTPException on failures.
+    """
+    user_state = await user_service.get_user_state(uid)
     # req.session_id is now required in InteractionRequest
-    reply, vibe, tier = await nex_service.interact(uid, req.session_id, req.input)
+    if req.coalesce:
+        reply, vibe, tier = await nex_service.interact_coalesced(uid, req.session_id, req.input)
+    else:
+        reply, vibe, tier = await nex_service.interact(uid, req.session_id, req.input, deadline, user_state)
+
+    if reply == "MERGED":
+        # Accepted as part of a later fragment's turn
+        return 202, InteractionMergedResponse(session_id=req.session_id)
     
     if reply == "SESSION_INVALID":
         raise HTTPException(status_code=400, detail="Invalid Session. Please start a new session.")
 
     if reply == "LIMIT_REACHED":
-        return ErrorResponse(
+        return 200, ErrorResponse(
             error="MESSAGE_LIMIT_REACHED",
             tier=tier,
             upgrade_available=True
@@ -30,13 +63,16 @@ async def interact(req: InteractionRequest, uid: str = Depends(get_current_user_
     if reply == "ERROR":
         raise HTTPException(status_code=500, detail="AI Interaction Failed")
 
-    user_state = await user_service.get_user_state(uid)
+    if reply == "DEADLINE_EXCEEDED":
+        raise HTTPException(status_code=504, detail="NEX took too long to respond. Please try again.")
+
+    # The turn counted one message on top of the state read above.
     limit = TIER_LIMITS[tier]["messages"]
-    remaining = limit - user_state.messages_used_today if limit != float('inf') else float('inf')
+    remaining = limit - user_state.messages_used_today - 1 if limit != float('inf') else float('inf')
 
-    return InteractionResponse(
+    return 200, InteractionResponse(
         reply=reply,
         vibe_check=vibe,
         messages_remaining=remaining,
         tier=tier
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+from ..metrics import registry
+from ..lifecycle import lifecycle
+
+router = APIRouter(tags=["Ops"])
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """
+    Prometheus metrics for this worker process. Unauthenticated for the
+    scraper; the Caddyfile keeps it off the public site.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/ready", include_in_schema=False)
+async def ready():
+    """
+    Readiness probe: 200 once warmup completed, 503 before that and while draining.
+    """
+    body = {
+        "ready": lifecycle.ready,
+        "draining": lifecycle.draining,
+        "warmup": lifecycle.warmup_results,
+    }
+    return JSONResponse(body, status_code=200 if lifecycle.ready else 503)
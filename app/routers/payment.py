@@ -1,7 +1,6 @@
 import os
 import hmac
 import hashlib
-import razorpay
 from loguru import logger
 from fastapi import APIRouter, Depends, HTTPException, status
 from datetime import datetime, timezone
@@ -41,6 +40,7 @@ async def create_order(req: CreateOrderRequest, uid: str = Depends(get_current_u
     amount_inr = TIER_PRICES[req.planId]
     amount_paise = amount_inr * 100
     
+    import razorpay
     client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
     
     # Create Order
@@ -93,6 +93,7 @@ async def verify_payment(req: VerifyPaymentRequest, uid: str = Depends(get_curre
         
     # Logic: Update User Tier
     # Fetch order to get planId from notes to be secure
+    import razorpay
     client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
     try:
         order = client.order.fetch(req.razorpay_order_id)
@@ -1,9 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
-from ..auth_service import get_current_user_id
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Body, Request, Response, WebSocket, WebSocketDisconnect, status
+from loguru import logger
+from ..auth_service import get_current_user_id, verify_token
 from ..session_service import session_service
 from ..archive_service import archive_service
+from ..archive_export import archive_exporter
+from ..user_service import user_service
+from ..http_cache import make_etag, not_modified
+from ..responses import lean_json
+from ..session_channel import SessionChannel, WS_IDLE_TIMEOUT
+from ..deadline import Deadline, DeadlineExceeded
+from ..card_renderer import CARD_FORMATS, CARD_SIZES, DEFAULT_CARD_SIZE
 from ..models import SessionStartResponse, SessionEndResponse, Archive, ErrorResponse, Tier
-from typing import List
+from typing import List, Literal
 from fastapi.responses import StreamingResponse
 
 router = APIRouter(prefix="/session", tags=["Session"])
@@ -21,34 +30,137 @@ async def start_session(uid: str = Depends(get_current_user_id)):
 
 @router.post("/end", response_model=SessionEndResponse)
 async def end_session(session_id: str = Body(..., embed=True), uid: str = Depends(get_current_user_id)):
-    # Verify ownership
-    active = await session_service.get_active_session(uid)
-    
-    if not active or active.session_id != session_id:
-         raise HTTPException(status_code=404, detail="Active session not found or invalid session ID")
+    deadline = Deadline.for_route("session_end")
+    try:
+        # Verify ownership
+        active = await deadline.run("session", session_service.get_active_session(uid, deadline))
+
+        if not active or active.session_id != session_id:
+             raise HTTPException(status_code=404, detail="Active session not found or invalid session ID")
 
-    archive_data = await session_service.end_session(session_id)
+        archive_data = await session_service.end_session(session_id, deadline)
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Ending the session took too long. Please try again.")
     if not archive_data:
         raise HTTPException(status_code=500, detail="Failed to end session")
         
     return SessionEndResponse(**archive_data)
 
+@router.websocket("/ws")
+async def session_channel(websocket: WebSocket):
+    """
+    Persistent session channel. The client authenticates once, with a Bearer
+    Authorization header or a first message {"type": "auth", "token", "session_id"?},
+    then sends {"type": "message", "input"} turns, {"type": "end"} to archive
+    the session, or {"type": "ping"}. Session state stays in memory for the
+    life of the connection and is flushed on disconnect or idle timeout.
+    """
+    await websocket.accept()
+    try:
+        header = websocket.headers.get("authorization", "")
+        if header.lower().startswith("bearer "):
+            token, session_id = header[7:], websocket.query_params.get("session_id")
+        else:
+            hello = await asyncio.wait_for(websocket.receive_json(), timeout=10)
+            if hello.get("type") != "auth":
+                raise ValueError("first message must be auth")
+            token, session_id = hello.get("token", ""), hello.get("session_id")
+        uid = verify_token(token)
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        logger.error(f"WebSocket auth error: {e}")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid or expired Firebase ID token")
+        return
+
+    channel, error = await SessionChannel.open(uid, session_id)
+    if error:
+        await websocket.send_json({"type": "error", "error": error})
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    try:
+        await websocket.send_json(channel.status())
+        while True:
+            try:
+                message = await asyncio.wait_for(websocket.receive_json(), timeout=WS_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                await channel.flush()
+                await websocket.send_json({"type": "idle_timeout", "session_id": channel.session_id})
+                await websocket.close(code=status.WS_1000_NORMAL_CLOSURE)
+                return
+
+            kind = message.get("type")
+            if kind == "message" and message.get("input"):
+                await websocket.send_json(await channel.turn(message["input"]))
+            elif kind == "end":
+                try:
+                    archive_data = await channel.end()
+                except DeadlineExceeded:
+                    # The channel was flushed and can take no more turns; the
+                    # client retries the end with POST /session/end or a new channel.
+                    await websocket.send_json({"type": "error", "error": "DEADLINE_EXCEEDED"})
+                    await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+                    return
+                await websocket.send_json({"type": "ended", **(archive_data or {})})
+                await websocket.close(code=status.WS_1000_NORMAL_CLOSURE)
+                return
+            elif kind == "ping":
+                await websocket.send_json({"type": "pong"})
+            else:
+                await websocket.send_json({"type": "error", "error": "UNKNOWN_MESSAGE"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await channel.flush()
+
 @archive_router.get("", response_model=List[Archive])
-async def get_user_archives(uid: str = Depends(get_current_user_id)):
-    return await archive_service.get_user_archives(uid)
+async def get_user_archives(request: Request, response: Response, uid: str = Depends(get_current_user_id)):
+    user_state = await user_service.get_user_state(uid)
+    cached = not_modified(request, response, make_etag("archives", uid, user_state.archive_version))
+    if cached:
+        return cached
+    return lean_json(await archive_service.get_user_archives(uid), response)
+
+@archive_router.get("/export")
+async def export_archives(
+    format: Literal["png", "webp", "jpeg"] = "png",
+    size: int = DEFAULT_CARD_SIZE,
+    uid: str = Depends(get_current_user_id)
+):
+    """
+    Streams a ZIP of every archive card plus manifest.json.
+    """
+    if size not in CARD_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {', '.join(map(str, CARD_SIZES))}")
+    return StreamingResponse(
+        archive_exporter.stream(uid, format, size),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="nex-archive.zip"'}
+    )
 
 @archive_router.get("/{archive_id}", response_model=Archive)
-async def get_archive(archive_id: str, uid: str = Depends(get_current_user_id)):
-    archive = await archive_service.get_archive(archive_id)
+async def get_archive(archive_id: str, request: Request, response: Response, uid: str = Depends(get_current_user_id)):
+    archive, version = await archive_service.get_archive_with_version(archive_id)
     if not archive or archive.user_id != uid:
         raise HTTPException(status_code=404, detail="Archive not found")
+    cached = not_modified(request, response, make_etag("archive", archive_id, version))
+    if cached:
+        return cached
     return archive
 
 @archive_router.post("/{archive_id}/download")
-async def download_archive(archive_id: str, uid: str = Depends(get_current_user_id)):
+async def download_archive(
+    archive_id: str,
+    format: Literal["png", "webp", "jpeg"] = "png",
+    size: int = DEFAULT_CARD_SIZE,
+    uid: str = Depends(get_current_user_id)
+):
+    if size not in CARD_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {', '.join(map(str, CARD_SIZES))}")
     archive = await archive_service.get_archive(archive_id)
     if not archive or archive.user_id != uid:
         raise HTTPException(status_code=404, detail="Archive not found")
-        
-    img_io = archive_service.generate_archive_image(archive)
-    return StreamingResponse(img_io, media_type="image/png")
+
+    image = await archive_service.render_card(archive, format, size)
+    return Response(content=image, media_type=CARD_FORMATS[format][0])
@@ -1,13 +1,17 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from ..auth_service import get_current_user_id
+from ..http_cache import make_etag, not_modified
 from ..user_service import user_service
 from ..models import SubscriptionStatusResponse, UpgradeSubscriptionRequest, TIER_LIMITS
 
 router = APIRouter(prefix="/subscription", tags=["Subscription"])
 
 @router.get("/status", response_model=SubscriptionStatusResponse)
-async def get_status(uid: str = Depends(get_current_user_id)):
+async def get_status(request: Request, response: Response, uid: str = Depends(get_current_user_id)):
     user_state = await user_service.get_user_state(uid)
+    cached = not_modified(request, response, make_etag("subscription", uid, user_state.tier.value))
+    if cached:
+        return cached
     return SubscriptionStatusResponse(
         tier=user_state.tier,
         daily_limit=user_state.daily_limit,
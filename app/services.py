@@ -1,21 +1,36 @@
 import os
-import firebase_admin
-from firebase_admin import credentials, firestore
 from loguru import logger
 
+# SDK modules that are imported on first use rather than at app import.
+# With gunicorn preload_app they are imported once in the master instead
+# (see preload_sdk_modules), so forked workers share the loaded pages.
+HEAVY_SDK_MODULES = (
+    "firebase_admin.firestore",
+    "firebase_admin.auth",
+    "vertexai.generative_models",
+    "PIL.Image",
+    "PIL.ImageDraw",
+    "PIL.ImageFont",
+    "razorpay",
+)
+
 
 class Services:
     def __init__(self):
         self.db = None
         self.firebase_app = None
+        self.vertex_initialized = False
 
     async def init_services(self):
         """
-        Initialize all core services (Firebase, Firestore, Gemini).
+        Initialize core services (Firebase, Firestore, shared cache).
+        Vertex AI is initialized on first use, see generative_models().
         """
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
         logger.info(f"Starting NEX core services... Instance ID: {id(self)}")
         
-        # Initialize Firebase Admin
         # Initialize Firebase Admin
         try:
             # Check if already initialized
@@ -49,14 +64,95 @@ class Services:
             logger.critical(f"Failed to initialize Firebase: {e}")
             raise e
 
-        # Initialize Vertex AI
-        import vertexai
-        project_id = os.getenv("GOOGLE_CLOUD_PROJECT", "neuralexchange-b6b7f")
-        try:
-            vertexai.init(project=project_id, location="us-central1")
-            logger.info(f"Vertex AI initialized for project {project_id}")
-        except Exception as e:
-            logger.warning(f"Failed to initialize Vertex AI: {e}")
+        # Optional shared cache tier (Redis)
+        from .cache import shared_cache
+        await shared_cache.connect()
+
+    def generative_models(self):
+        """
+        Returns the vertexai.generative_models module, importing the SDK and
+        initializing Vertex AI on first use.
+        """
+        if not self.vertex_initialized:
+            import vertexai
+            from .region_pool import region_pool
+            project_id = os.getenv("GOOGLE_CLOUD_PROJECT", "neuralexchange-b6b7f")
+            try:
+                # Models are addressed by full resource name, so each call
+                # still goes to its route's region; this is only the default.
+                vertexai.init(project=project_id, location=region_pool.default_region)
+                logger.info(f"Vertex AI initialized for project {project_id}")
+            except Exception as e:
+                logger.warning(f"Failed to initialize Vertex AI: {e}")
+            self.vertex_initialized = True
+
+        from vertexai import generative_models
+        return generative_models
+
+    def warmup_steps(self) -> dict:
+        """
+        Blocking steps that pay the first-request costs up front (see lifecycle.warmup).
+        Each runs in a thread and returns False when it doesn't apply.
+        """
+        def firestore_channel():
+            # A point read opens the gRPC channel and fetches an access token.
+            self.db.collection("users").document("_warmup").get()
+
+        def auth_certs():
+            if self.firebase_app is None:
+                return False
+            from firebase_admin import auth, _token_gen
+            # verify_id_token fetches Google's public certs through this
+            # cache-control aware transport; prime its cache.
+            verifier = auth._get_client(self.firebase_app)._token_verifier
+            verifier.request(_token_gen.ID_TOKEN_CERT_URI)
+
+        def vertex_token():
+            self.generative_models()
+            import google.auth.transport.requests
+            from google.cloud.aiplatform import initializer
+            # The prediction client reuses these credentials, so a refreshed
+            # token is picked up by the first Gemini call.
+            creds = initializer.global_config.credentials
+            if creds is not None and not creds.valid:
+                creds.refresh(google.auth.transport.requests.Request())
+
+        def fonts():
+            from .card_renderer import load_fonts
+            load_fonts()
+
+        return {
+            "firestore": firestore_channel,
+            "auth_certs": auth_certs,
+            "vertex_token": vertex_token,
+            "fonts": fonts,
+        }
+
+    def reset_after_fork(self):
+        """
+        Drops Firebase/Firestore handles inherited from a preloading master.
+        gRPC channels are not fork-safe, so each worker must open its own
+        in init_services.
+        """
+        import firebase_admin
+        if firebase_admin._apps:
+            logger.warning("Firebase app was initialized before fork; discarding it in worker.")
+            # Don't delete_app(): that would close the parent's gRPC channel from the child.
+            firebase_admin._apps.clear()
+        self.db = None
+        self.firebase_app = None
+        self.vertex_initialized = False
+
+
+def preload_sdk_modules():
+    """
+    Imports the heavy SDKs without creating any clients, channels or threads.
+    Called in the gunicorn master when preload_app is on.
+    """
+    import importlib
+    for module in HEAVY_SDK_MODULES:
+        importlib.import_module(module)
+    logger.info(f"Preloaded SDK modules: {', '.join(HEAVY_SDK_MODULES)}")
 
 services = Services()
 
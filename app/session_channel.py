@@ -0,0 +1,159 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from loguru import logger
+from .models import Message, Session, Tier, TIER_LIMITS, InteractionResponse, ErrorResponse
+from .session_service import session_service
+from .user_service import user_service
+from .memory_service import memory_service
+from .nex_service import nex_service
+from .lifecycle import lifecycle
+from .model_router import is_light_turn
+from .deadline import Deadline, DeadlineExceeded
+from .metrics import registry
+
+# Connections with no client message for this long are flushed and closed.
+# Keep it below the session inactivity timeout (SESSION_TIMEOUT_MINUTES).
+WS_IDLE_TIMEOUT = float(os.getenv("NEX_WS_IDLE_TIMEOUT", "300"))
+# Messages of the transcript kept in memory and sent as conversation history.
+WS_TRANSCRIPT_TAIL = int(os.getenv("NEX_WS_TRANSCRIPT_TAIL", "50"))
+
+open_channels = registry.gauge("nex_ws_channels", "Open WebSocket session channels in this worker.")
+pending_writes = registry.gauge("nex_ws_pending_writes", "Turns waiting to be written back to Firestore.")
+
+
+class SessionChannel:
+    """
+    In-memory state of one session for the life of a WebSocket connection:
+    session metadata, transcript tail, quota counters and memory context.
+    Turns only call the LLM; their Firestore writes are queued and written
+    back in order by a background task, and flushed on close.
+    """
+    def __init__(self, uid: str, session: Session, tier: Tier, messages_used: int, memory_used: int, memories: str):
+        self.uid = uid
+        self.session = session
+        self.tier = tier
+        self.messages_used = messages_used
+        self.memory_used = memory_used
+        self.memories = memories
+        self.transcript = list(session.transcript[-WS_TRANSCRIPT_TAIL:])
+        self._writes: asyncio.Queue = asyncio.Queue()
+        self._writer = lifecycle.spawn(self._write_back(), name="ws-write-back")
+        self._closed = False
+        open_channels.inc()
+
+    @property
+    def session_id(self) -> str:
+        return self.session.session_id
+
+    @classmethod
+    async def open(cls, uid: str, session_id: str = None) -> tuple["SessionChannel | None", str | None]:
+        """
+        Attaches to the user's active session (starting one when session_id is
+        not given) and loads its state. Returns (channel, error).
+        """
+        session = await session_service.get_active_session(uid)
+        if session_id and (not session or session.session_id != session_id):
+            return None, "SESSION_INVALID"
+        if not session:
+            session, error = await session_service.start_session(uid)
+            if error:
+                return None, error
+
+        user_state = await user_service.get_user_state(uid)
+        memories = await memory_service.get_memory_context(uid)
+        channel = cls(uid, session, user_state.tier, user_state.messages_used_today, user_state.memory_used, memories)
+        return channel, None
+
+    def status(self) -> dict:
+        limit = TIER_LIMITS[self.tier]["messages"]
+        return {
+            "type": "ready",
+            "session_id": self.session_id,
+            "tier": self.tier.value,
+            "messages_remaining": None if limit == float('inf') else limit - self.messages_used,
+        }
+
+    async def turn(self, user_input: str) -> dict:
+        """
+        Answers one user message from in-memory state. Returns the message to send.
+        """
+        if self._closed:
+            # Flushed: nothing would write this turn back.
+            return {"type": "error", "error": "CHANNEL_CLOSED", "detail": "This session channel is closed. Please reconnect."}
+        msg_limit = TIER_LIMITS[self.tier]["messages"]
+        if self.messages_used >= msg_limit:
+            error = ErrorResponse(error="MESSAGE_LIMIT_REACHED", tier=self.tier, upgrade_available=True)
+            return {"type": "error", **error.model_dump(mode="json")}
+
+        user_message = Message(role="user", content=user_input, timestamp=datetime.now(timezone.utc))
+        user_prompt = nex_service.build_prompt(self.memories, self.transcript, user_input)
+        try:
+            reply, vibe, memory_content = await nex_service.generate_reply(
+                user_prompt, light=is_light_turn(user_input), deadline=Deadline.for_route("ws_turn")
+            )
+        except DeadlineExceeded:
+            return {"type": "error", "error": "DEADLINE_EXCEEDED", "detail": "NEX took too long to respond. Please try again."}
+        except Exception as e:
+            logger.error(f"Gemini error: {e}")
+            return {"type": "error", "error": "ERROR", "detail": "AI Interaction Failed"}
+        if reply == "RATE_LIMITED":
+            return {"type": "error", "error": "RATE_LIMITED", "detail": "AI Service is currently overloaded. Please try again later."}
+
+        model_message = Message(role="model", content=reply, timestamp=datetime.now(timezone.utc))
+        self.transcript = (self.transcript + [user_message, model_message])[-WS_TRANSCRIPT_TAIL:]
+        self.messages_used += 1
+
+        new_memory = None
+        if memory_content and self.memory_used < TIER_LIMITS[self.tier]["memory"]:
+            new_memory = memory_content
+            self.memory_used += 1
+            self.memories = f"{self.memories}\n{memory_content}" if self.memories else memory_content
+
+        pending_writes.inc()
+        self._writes.put_nowait((user_message, model_message, new_memory))
+
+        response = InteractionResponse(
+            reply=reply,
+            vibe_check=vibe,
+            messages_remaining=msg_limit - self.messages_used if msg_limit != float('inf') else float('inf'),
+            tier=self.tier
+        )
+        return {"type": "reply", **response.model_dump(mode="json")}
+
+    async def _write_back(self):
+        while True:
+            item = await self._writes.get()
+            if item is None:
+                return
+            user_message, model_message, new_memory = item
+            try:
+                await session_service.record_turn(self.uid, self.session_id, [user_message, model_message])
+                if new_memory and not await memory_service.remember(self.uid, new_memory):
+                    # Merged into an existing memory; give back the slot counted in turn()
+                    self.memory_used -= 1
+            except Exception as e:
+                logger.error(f"Write-back failed for session {self.session_id}: {e}")
+            finally:
+                pending_writes.dec()
+
+    async def flush(self):
+        """
+        Waits until every queued turn has been written back, then stops the writer.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        open_channels.dec()
+        if not self._writer.done():
+            self._writes.put_nowait(None)
+            # Shielded: a cancelled handler must not abort the write-back.
+            await asyncio.shield(self._writer)
+
+    async def end(self) -> dict | None:
+        """
+        Flushes pending turns, then ends and archives the session.
+        Raises DeadlineExceeded if archiving runs out of time.
+        """
+        await self.flush()
+        return await session_service.end_session(self.session_id, Deadline.for_route("session_end"))
@@ -4,11 +4,21 @@ from .services import get_db
 from .models import Session, Message, UserState, Tier, TIER_LIMITS
 from .user_service import user_service
 from .archive_service import archive_service
-from firebase_admin import firestore
+from .cache import shared_cache, ACTIVE_SESSION_TTL
+from .doc_loader import document_loader
+from .counters import ShardedCounter
+from .deadline import Deadline
 from loguru import logger
 import asyncio
+import os
 
 SESSION_TIMEOUT_MINUTES = 20
+# Compact per-session history entries carry an expire_at this far out; with a
+# Firestore TTL policy on the `entries` collection group they delete themselves.
+SESSION_HISTORY_RETENTION_DAYS = int(os.getenv("NEX_SESSION_HISTORY_RETENTION_DAYS", "90"))
+# message_count is counted in sessions/{id}/count_shards while the session is
+# active and folded back into the session doc when it ends.
+session_counter = ShardedCounter("count_shards")
 
 class SessionService:
     @property
@@ -18,14 +28,61 @@ class SessionService:
     def _get_session_ref(self):
         return self.db.collection("sessions")
 
-    async def get_active_session(self, uid: str) -> Session | None:
+    def _get_history_ref(self, uid: str):
+        return self.db.collection("session_history").document(uid)
+
+    def compact(self, writer, uid: str, sessions: list[dict], last_started_at: datetime = None, archive_id: str = None):
         """
-        Retrieves the active session for the user.
-        Checks for inactivity timeout and auto-closes if needed.
+        Moves ended sessions out of `sessions` through `writer` (a WriteBatch):
+        each becomes a small session_history/{uid}/entries/{session_id} record
+        and its session document is deleted. The summary on session_history/{uid}
+        (last_started_at for the daily limit, running totals) is merged in;
+        pass `last_started_at` only when it is newer than the stored one.
+        """
+        from firebase_admin import firestore
+        history_ref = self._get_history_ref(uid)
+        expire_at = datetime.now(timezone.utc) + timedelta(days=SESSION_HISTORY_RETENTION_DAYS)
+        for data in sessions:
+            entry = {
+                "started_at": data["started_at"],
+                "ended_at": data.get("ended_at") or data.get("last_message_at"),
+                "message_count": data.get("message_count", 0),
+                "expire_at": expire_at,
+            }
+            if archive_id:
+                entry["archive_id"] = archive_id
+            writer.set(history_ref.collection("entries").document(data["session_id"]), entry)
+            writer.delete(self._get_session_ref().document(data["session_id"]))
+        summary = {
+            "sessions_ended": firestore.Increment(len(sessions)),
+            "messages_total": firestore.Increment(sum(data.get("message_count", 0) for data in sessions)),
+        }
+        if last_started_at is not None:
+            summary["last_started_at"] = last_started_at
+        writer.set(history_ref, summary, merge=True)
+
+    async def _load_session(self, session_ref) -> Session | None:
         """
+        The session with message_count rolled up from its count shards
+        (one batched read), or None if it does not exist.
+        """
+        doc, shards = await session_counter.load(session_ref)
+        if not doc.exists:
+            return None
+        return Session(**session_counter.rollup(doc.to_dict(), shards, ("message_count",)))
+
+    async def _find_active_session(self, uid: str, timeout: float = None) -> Session | None:
+        # Fast path: the shared cache points straight at the active session doc.
+        pointer = await shared_cache.get_json("session:active", uid)
+        if pointer:
+            session = await self._load_session(self._get_session_ref().document(pointer))
+            if session is not None and session.is_active and session.user_id == uid:
+                return session
+            await shared_cache.delete("session:active", uid)
+
         docs = self._get_session_ref()\
             .where("user_id", "==", uid)\
-            .limit(50).stream() # Get recent sessions (unordered)
+            .limit(50).stream(timeout=timeout) # Get recent sessions (unordered)
         
         # Sort in memory
         sessions = []
@@ -35,12 +92,19 @@ class SessionService:
         # Sort by started_at desc
         sessions.sort(key=lambda x: x.started_at, reverse=True)
         
-        active_session = None
         for s in sessions:
             if s.is_active:
-                active_session = s
-                break
-        
+                await shared_cache.set_json("session:active", uid, s.session_id, ACTIVE_SESSION_TTL)
+                return await self._load_session(self._get_session_ref().document(s.session_id))
+        return None
+
+    async def get_active_session(self, uid: str, deadline: Deadline = None) -> Session | None:
+        """
+        Retrieves the active session for the user.
+        Checks for inactivity timeout and auto-closes if needed.
+        `deadline` bounds the session query (Firestore `timeout=`).
+        """
+        active_session = await self._find_active_session(uid, deadline.timeout("session") if deadline else None)
         if not active_session:
             return None
 
@@ -77,8 +141,18 @@ class SessionService:
             # Query recent sessions for user and count today's sessions manually
             now = datetime.now(timezone.utc)
             start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            
-            # Optimization: limit to 50 sessions
+
+            # Ended sessions are compacted into the history summary.
+            history = await document_loader.load(self._get_history_ref(uid))
+            last_started_at = history.to_dict().get("last_started_at") if history.exists else None
+            if last_started_at is not None:
+                if last_started_at.tzinfo is None:
+                    last_started_at = last_started_at.replace(tzinfo=timezone.utc)
+                if last_started_at >= start_of_day:
+                    return None, "DAILY_SESSION_LIMIT_REACHED"
+
+            # Whatever is still in `sessions`: ones not compacted yet
+            # (see app.jobs.compact_sessions). Optimization: limit to 50 sessions
             docs = self._get_session_ref()\
                 .where("user_id", "==", uid)\
                 .limit(50).stream()
@@ -110,47 +184,97 @@ class SessionService:
         )
         
         self._get_session_ref().document(session_id).set(new_session.dict())
+        await shared_cache.set_json("session:active", uid, session_id, ACTIVE_SESSION_TTL)
         return new_session, None
 
-    async def add_message(self, session_id: str, role: str, content: str):
+    async def add_message(self, session_id: str, role: str, content: str, timeout: float = None):
         """
         Adds a message to the session transcript.
         """
+        from firebase_admin import firestore
         session_ref = self._get_session_ref().document(session_id)
         
         new_message = Message(role=role, content=content, timestamp=datetime.now(timezone.utc))
         
-        session_ref.update({
+        batch = self.db.batch()
+        batch.update(session_ref, {
             "transcript": firestore.ArrayUnion([new_message.dict()]),
-            "last_message_at": datetime.now(timezone.utc),
-            "message_count": firestore.Increment(1)
+            "last_message_at": datetime.now(timezone.utc)
         })
+        session_counter.increment(batch, session_ref, {"message_count": 1})
+        batch.commit(timeout=timeout)
 
-    async def end_session(self, session_id: str) -> dict | None:
+    async def record_turn(self, uid: str, session_id: str, messages: list[Message]):
         """
-        Ends the session, generates reflection, archives, and clears transcript.
-        Returns archive data.
+        Persists a completed turn in one batched commit: appends the messages to
+        the transcript and counts one message against the user's daily usage.
+        A session ended (compacted) meanwhile gets the messages counted on its
+        history entry instead; its transcript is gone, so theirs is dropped too.
         """
+        from firebase_admin import firestore
+        from google.api_core import exceptions
         session_ref = self._get_session_ref().document(session_id)
-        doc = session_ref.get()
-        if not doc.exists:
-            return None
-            
-        session_data = Session(**doc.to_dict())
-        
-        if not session_data.is_active:
+        batch = self.db.batch()
+        batch.update(session_ref, {
+            "transcript": firestore.ArrayUnion([m.dict() for m in messages]),
+            "last_message_at": messages[-1].timestamp
+        })
+        session_counter.increment(batch, session_ref, {"message_count": len(messages)})
+        user_service.add_usage(batch, uid, messages=1)
+        try:
+            await asyncio.to_thread(batch.commit)
+        except exceptions.NotFound:
+            history_ref = self._get_history_ref(uid)
+            batch = self.db.batch()
+            batch.update(history_ref.collection("entries").document(session_id), {"message_count": firestore.Increment(len(messages))})
+            batch.set(history_ref, {"messages_total": firestore.Increment(len(messages))}, merge=True)
+            user_service.add_usage(batch, uid, messages=1)
+            try:
+                await asyncio.to_thread(batch.commit)
+            except exceptions.NotFound:
+                # No history entry either (expired, or never compacted); keep the usage.
+                batch = self.db.batch()
+                user_service.add_usage(batch, uid, messages=1)
+                await asyncio.to_thread(batch.commit)
+            logger.info(f"Turn for ended session {session_id} counted without its transcript")
+        await user_service.apply_usage_delta(uid, messages=1)
+
+    async def end_session(self, session_id: str, deadline: Deadline = None) -> dict | None:
+        """
+        Ends the session, generates reflection, archives, and compacts it into the
+        user's session history.
+        Returns archive data. Raises DeadlineExceeded if the budget runs out
+        before the archive is written.
+        """
+        deadline = deadline or Deadline.for_route("session_end")
+        session_ref = self._get_session_ref().document(session_id)
+        session_data = await deadline.run("session", self._load_session(session_ref))
+        if session_data is None or not session_data.is_active:
              return None
 
         # 1. Generate Archive
-        archive_entry = await archive_service.create_archive_entry(session_data.user_id, session_data.transcript)
+        archive_entry = await archive_service.prepare_archive_entry(session_data.user_id, session_data.transcript, deadline)
         
-        # 2. Clear Session & Mark Inactive
-        # Clearing transcript for privacy as per PRD
-        session_ref.update({
-            "is_active": False,
-            "transcript": [],
-            "ended_at": datetime.now(timezone.utc) 
-        })
+        # 2. Save the archive and compact the Session in one commit, so a
+        # request cut off here leaves either both or neither, and a retry
+        # cannot archive the session twice.
+        # The transcript is dropped for privacy as per PRD; the session doc is
+        # replaced by a history entry with the final message_count, and its
+        # count shards removed.
+        batch = self.db.batch()
+        archive_service.add_archive_entry(batch, archive_entry)
+        ended = {
+            "session_id": session_id,
+            "started_at": session_data.started_at,
+            "ended_at": datetime.now(timezone.utc),
+            "message_count": session_data.message_count,
+        }
+        self.compact(batch, session_data.user_id, [ended], session_data.started_at, archive_entry.archive_id)
+        for shard_ref in session_counter.shard_refs(session_ref):
+            batch.delete(shard_ref)
+        batch.commit(timeout=deadline.timeout("session_write"))
+        await user_service.apply_usage_delta(session_data.user_id, bump=("archive_version",))
+        await shared_cache.delete("session:active", session_data.user_id)
         
         return {
             "archive_id": archive_entry.archive_id,
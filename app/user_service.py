@@ -1,9 +1,31 @@
 from datetime import datetime, timezone
+import os
+import time
 from .services import get_db
 from .models import Tier, TIER_LIMITS, UserState
+from .cache import shared_cache, USER_STATE_TTL
+from .counters import ShardedCounter
 from loguru import logger
 
+USER_CACHE_FIELDS = ("tier", "messages_used_today", "memory_used", "memory_version", "archive_version")
+# Usage counters live in users/{uid}/usage_shards, off the user doc that every
+# turn would otherwise write; the user doc keeps their base values.
+USAGE_FIELDS = ("messages_used_today", "memory_used")
+# List ETag versions, bumped by memory and archive writes, are counted in the
+# same shards so those writes never touch the user doc either.
+VERSION_FIELDS = ("memory_version", "archive_version")
+usage_counter = ShardedCounter("usage_shards")
+# Without the shared cache, each worker keeps rolled-up user states this long
+# (seconds) so a turn does not re-read the user doc and all its shards. Other
+# workers' usage shows up after at most this delay.
+LOCAL_USER_STATE_TTL = float(os.getenv("NEX_LOCAL_USER_STATE_TTL", "5"))
+# Users kept in that per-worker cache; expired entries are dropped past this.
+LOCAL_USER_STATE_MAX = 10000
+
 class UserService:
+    def __init__(self):
+        self._local: dict[str, tuple[dict, float]] = {}
+
     @property
     def db(self):
         return get_db()
@@ -11,14 +33,86 @@ class UserService:
     def _get_user_ref(self, uid: str):
         return self.db.collection("users").document(uid)
 
+    def _build_state(self, uid: str, user_data: dict) -> UserState:
+        tier = Tier(user_data["tier"])
+        limits = TIER_LIMITS[tier]
+        return UserState(
+            uid=uid,
+            tier=tier,
+            messages_used_today=int(user_data["messages_used_today"]),
+            daily_limit=limits["messages"],
+            memory_used=int(user_data["memory_used"]),
+            memory_limit=limits["memory"],
+            memory_version=int(user_data.get("memory_version", 0)),
+            archive_version=int(user_data.get("archive_version", 0))
+        )
+
+    async def _cache_state(self, state: UserState):
+        mapping = {
+            "tier": state.tier.value,
+            "messages_used_today": state.messages_used_today,
+            "memory_used": state.memory_used,
+            "memory_version": state.memory_version,
+            "archive_version": state.archive_version,
+        }
+        if not shared_cache.enabled:
+            now = time.monotonic()
+            if len(self._local) >= LOCAL_USER_STATE_MAX:
+                self._local = {uid: entry for uid, entry in self._local.items() if entry[1] > now}
+            self._local[state.uid] = (mapping, now + LOCAL_USER_STATE_TTL)
+            return
+        await shared_cache.set_hash("user", state.uid, mapping, USER_STATE_TTL)
+
+    def _local_state(self, uid: str) -> dict | None:
+        entry = self._local.get(uid)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._local[uid]
+            return None
+        return entry[0]
+
+    def add_usage(self, writer, uid: str, messages: int = 0, memory: int = 0, bump: tuple = ()):
+        """
+        Adds a usage increment to `writer` (a WriteBatch); `bump` names version
+        counters to increment by one. Follow the commit with apply_usage_delta.
+        """
+        deltas = {}
+        if messages:
+            deltas["messages_used_today"] = messages
+        if memory:
+            deltas["memory_used"] = memory
+        for field in bump:
+            deltas[field] = 1
+        usage_counter.increment(writer, self._get_user_ref(uid), deltas)
+
+    async def apply_usage_delta(self, uid: str, messages: int = 0, memory: int = 0, bump: tuple = ()):
+        """
+        Write-through of counter increments already committed to Firestore.
+        `bump` names version counters (memory_version, archive_version) that
+        were incremented by one in the same write (see add_usage).
+        """
+        increments = {}
+        if messages:
+            increments["messages_used_today"] = messages
+        if memory:
+            increments["memory_used"] = memory
+        for field in bump:
+            increments[field] = 1
+        local = self._local_state(uid)
+        if local is not None:
+            for field, delta in increments.items():
+                local[field] += delta
+        await shared_cache.update_hash("user", uid, increments=increments)
+
     async def bootstrap_user(self, uid: str, email: str = None) -> UserState:
         """
         Get or create user record.
         """
         user_ref = self._get_user_ref(uid)
-        doc = user_ref.get()
+        user_data = await usage_counter.totals(user_ref, USAGE_FIELDS + VERSION_FIELDS)
 
-        if not doc.exists:
+        if user_data is None:
             # First login
             user_data = {
                 "email": email,
@@ -30,42 +124,31 @@ class UserService:
             }
             user_ref.set(user_data)
             logger.info(f"Bootstrapped new user: {uid}")
-        else:
-            user_data = doc.to_dict()
-            # In a real app, you'd check if 'messages_used_today' needs resetting based on timestamp
-            # For simplicity, we assume this is handled or updated elsewhere for now.
+        # For an existing user, in a real app, you'd check if 'messages_used_today' needs resetting based on timestamp
+        # For simplicity, we assume this is handled or updated elsewhere for now.
 
-        limits = TIER_LIMITS[user_data["tier"]]
-        return UserState(
-            uid=uid,
-            tier=user_data["tier"],
-            messages_used_today=user_data["messages_used_today"],
-            daily_limit=limits["messages"],
-            memory_used=user_data["memory_used"],
-            memory_limit=limits["memory"]
-        )
+        state = self._build_state(uid, user_data)
+        await self._cache_state(state)
+        return state
 
     async def get_user_state(self, uid: str) -> UserState:
-        user_ref = self._get_user_ref(uid)
-        doc = user_ref.get()
-        if not doc.exists:
+        cached = self._local_state(uid) or await shared_cache.get_hash("user", uid, required=USER_CACHE_FIELDS)
+        if cached:
+            return self._build_state(uid, cached)
+
+        # The user doc and its usage shards come back in one batched read
+        user_data = await usage_counter.totals(self._get_user_ref(uid), USAGE_FIELDS + VERSION_FIELDS)
+        if user_data is None:
             # Should not happen if bootstrapped
             return await self.bootstrap_user(uid)
         
-        user_data = doc.to_dict()
-        limits = TIER_LIMITS[user_data["tier"]]
-        return UserState(
-            uid=uid,
-            tier=user_data["tier"],
-            messages_used_today=user_data["messages_used_today"],
-            daily_limit=limits["messages"],
-            memory_used=user_data["memory_used"],
-            memory_limit=limits["memory"]
-        )
+        state = self._build_state(uid, user_data)
+        await self._cache_state(state)
+        return state
 
-    async def increment_message_usage(self, uid: str):
-        user_ref = self._get_user_ref(uid)
-        user_ref.update({"messages_used_today": firestore.Increment(1)})
+    async def increment_message_usage(self, uid: str, timeout: float = None):
+        usage_counter.commit(self.db, self._get_user_ref(uid), {"messages_used_today": 1}, timeout=timeout)
+        await self.apply_usage_delta(uid, messages=1)
 
     async def update_tier(self, uid: str, tier: Tier, expiry: str = None):
         user_ref = self._get_user_ref(uid)
@@ -73,6 +156,9 @@ class UserService:
             "tier": tier,
             "subscription_expiry": expiry
         })
+        local = self._local_state(uid)
+        if local is not None:
+            local["tier"] = Tier(tier).value
+        await shared_cache.update_hash("user", uid, sets={"tier": Tier(tier).value})
 
 user_service = UserService()
-from firebase_admin import firestore # Ensure firestore increment works
@@ -1,4 +1,5 @@
 import multiprocessing
+import os
 
 # Gunicorn configuration for high-performance FastAPI
 bind = "0.0.0.0:8000"
@@ -6,6 +7,27 @@ workers = multiprocessing.cpu_count() * 2 + 1
 worker_class = "uvicorn.workers.UvicornWorker"
 keepalive = 120
 timeout = 60
+# Time a worker gets to finish requests after SIGTERM. The app keeps serving for
+# NEX_DRAIN_GRACE (6s) while /ready fails, then drains in-flight LLM calls and
+# background tasks within NEX_DRAIN_TIMEOUT (25s).
+graceful_timeout = 40
 loglevel = "info"
 accesslog = "-"
 errorlog = "-"
+
+# Import the app (and its heavy SDKs) once in the master and fork workers from it,
+# so they start faster and share the loaded module pages copy-on-write.
+preload_app = os.getenv("NEX_PRELOAD_APP", "true").lower() == "true"
+
+
+def on_starting(server):
+    if preload_app:
+        from app.services import preload_sdk_modules
+        preload_sdk_modules()
+
+
+def post_fork(server, worker):
+    # Clients (Firebase, Firestore gRPC, Vertex) are created per worker in the
+    # app lifespan; drop anything the master may have initialized before fork.
+    from app.services import services
+    services.reset_after_fork()
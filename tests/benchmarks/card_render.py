@@ -0,0 +1,119 @@
+"""
+Archive card rendering throughput (app.card_renderer), per output format and size.
+
+Renders a fixed set of cards with the render cache bypassed and reports, per
+format and size, renders per second per core (CPU time, single thread), the
+median time spent drawing vs encoding, and the median encoded size. With
+--compare it fails when throughput dropped by more than the tolerance.
+
+Usage:
+    python tests/benchmarks/card_render.py --output tests/benchmarks/card_render.json
+    python tests/benchmarks/card_render.py --compare tests/benchmarks/card_render.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.card_renderer import CardRenderer, CARD_FORMATS, EMOTION_COLORS, encode
+from app.models import Archive
+
+SIZES = (540, 1080)
+
+REFLECTIONS = (
+    "Some weight is lighter once it is said out loud.",
+    "You kept showing up for people even on the days nobody asked how you were doing, and that quiet steadiness is its own kind of courage.",
+    "Rest is not a reward you earn.",
+    "The tiredness you describe sounds less like weakness and more like the cost of carrying too much for too long without setting any of it down.",
+)
+
+
+def sample_archives() -> list[Archive]:
+    emotions = list(EMOTION_COLORS) + ["unknown"]
+    return [
+        Archive(
+            archive_id=f"bench-{i}",
+            user_id="bench",
+            title="Evening Thoughts",
+            reflection=REFLECTIONS[i % len(REFLECTIONS)],
+            emotion_tag=emotions[i % len(emotions)],
+            created_at=datetime(2026, 1, 1 + i, tzinfo=timezone.utc),
+        )
+        for i in range(16)
+    ]
+
+
+def measure(renderer: CardRenderer, archives: list[Archive], fmt: str, size: int, rounds: int) -> dict:
+    for archive in archives:
+        renderer.draw(archive, size)  # warm fonts, templates and glyph tables
+
+    draw_ms, encode_ms, sizes = [], [], []
+    cpu_started = time.process_time()
+    for _ in range(rounds):
+        for archive in archives:
+            t = time.perf_counter()
+            img = renderer.draw(archive, size)
+            drawn = time.perf_counter()
+            data = encode(img, fmt)
+            encoded = time.perf_counter()
+            draw_ms.append((drawn - t) * 1000)
+            encode_ms.append((encoded - drawn) * 1000)
+            sizes.append(len(data))
+    cpu_seconds = time.process_time() - cpu_started
+
+    return {
+        "renders_per_core_second": round(len(draw_ms) / cpu_seconds, 1),
+        "draw_ms": round(statistics.median(draw_ms), 2),
+        "encode_ms": round(statistics.median(encode_ms), 2),
+        "kb": round(statistics.median(sizes) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    args = parser.parse_args()
+
+    renderer = CardRenderer(cache_bytes=0)
+    archives = sample_archives()
+    report = {
+        f"{fmt}@{size}": measure(renderer, archives, fmt, size, args.rounds)
+        for fmt in CARD_FORMATS for size in SIZES
+    }
+    report["python"] = sys.version.split()[0]
+
+    for name, r in report.items():
+        if name == "python":
+            continue
+        print(f"{name:<10} {r['renders_per_core_second']:>7.1f} renders/s/core  "
+              f"draw {r['draw_ms']:>6.2f} ms  encode {r['encode_ms']:>6.2f} ms  {r['kb']:>6.1f} KB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        failed = False
+        for name, r in report.items():
+            if name == "python" or name not in baseline:
+                continue
+            before, after = baseline[name]["renders_per_core_second"], r["renders_per_core_second"]
+            if after < before * (1 - args.tolerance):
+                print(f"REGRESSION: {name} renders/s/core {before} -> {after}")
+                failed = True
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Microbenchmarks for the CPU-bound request paths. Runs offline: no Firestore,
+Gemini or network access.
+
+Cases:
+- prompt@N:        NexService.build_prompt with an N-message transcript and a
+                   consolidated memory context (what interact sends to Gemini)
+- session@N:       Session(**doc) for a session document with N transcript messages
+- card@FMT:        ArchiveService.generate_archive_image at the default size,
+                   render cache disabled
+- memories@N,
+  archives@N:      lean list serialization (see serialization.py) of large lists
+- verify_token:    app.auth_service.verify_token on a Firebase-shaped RS256 ID
+                   token, with the public certificate served locally in place
+                   of Google's certificate endpoint
+
+Each case is timed in batches sized to about --batch-ms, repeated --repeat
+times; the median and best time per call are reported. With --compare it fails
+when a case's best time got slower by more than the tolerance (the best of
+several batches is far less sensitive to scheduler noise than the median).
+
+Usage:
+    python tests/benchmarks/hotpaths.py --output tests/benchmarks/hotpaths.json
+    python tests/benchmarks/hotpaths.py --compare tests/benchmarks/hotpaths.json
+    python tests/benchmarks/hotpaths.py --only prompt,session
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.models import Archive, Session
+from serialization import archive_docs, archives_lean, memory_docs, memories_lean
+
+PROJECT_ID = "nex-bench"
+LINES = (
+    "I keep replaying the conversation with my manager and wondering if I said too much.",
+    "That sounds exhausting. What part of it keeps pulling you back?",
+    "Probably the moment I admitted I was struggling. It felt like I handed over something.",
+    "You named something true out loud. What did you hope would happen after?",
+)
+
+
+def transcript_docs(count: int) -> list[dict]:
+    start = dt.datetime(2026, 1, 1, 21, 0, tzinfo=dt.timezone.utc)
+    return [
+        {"role": "user" if i % 2 == 0 else "model", "content": LINES[i % len(LINES)], "timestamp": start + dt.timedelta(seconds=20 * i)}
+        for i in range(count)
+    ]
+
+
+def memory_context(count: int) -> str:
+    facts = "\n".join(f"- Remembers detail number {i}: prefers quiet evenings and long walks after work." for i in range(count))
+    return f"Recurring themes: work stress, family, rest\n{facts}"
+
+
+def prompt_case(messages: int):
+    from app.nex_service import nex_service
+    from app.models import Message
+    transcript = [Message(**doc) for doc in transcript_docs(messages)]
+    memories = memory_context(30)
+    return lambda: nex_service.build_prompt(memories, transcript, "I think I just need to rest tonight.")
+
+
+def session_case(messages: int):
+    started = dt.datetime(2026, 1, 1, 21, 0, tzinfo=dt.timezone.utc)
+    doc = {
+        "session_id": "bench-session", "user_id": "bench", "started_at": started, "last_message_at": started,
+        "is_active": True, "message_count": messages, "transcript": transcript_docs(messages),
+    }
+    return lambda: Session(**doc)
+
+
+def card_case(fmt: str):
+    from app.archive_service import archive_service
+    from app.card_renderer import card_renderer
+    card_renderer.cache_bytes = 0  # every call renders
+    archive = Archive(
+        archive_id="bench-card", user_id="bench", title="Evening Thoughts",
+        reflection="The tiredness you describe sounds less like weakness and more like the cost of carrying too much for too long.",
+        emotion_tag="reflective", created_at=dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc),
+    )
+    return lambda: archive_service.generate_archive_image(archive, fmt)
+
+
+def memories_case(count: int):
+    docs = memory_docs(count)
+    return lambda: memories_lean(docs)
+
+
+def archives_case(count: int):
+    docs = archive_docs(count)
+    return lambda: archives_lean(docs)
+
+
+class _CertResponse:
+    status = 200
+    headers = {}
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+def verify_token_case():
+    """
+    Signs an ID token with a throwaway key and points the SDK's certificate
+    fetch at that key's certificate, so the full verification (claim checks,
+    certificate parsing, RS256 signature) runs without network access.
+    """
+    import firebase_admin
+    from firebase_admin import auth, credentials
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+    from google.auth import crypt, jwt
+    from app.auth_service import verify_token
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "nex-bench")])
+    now = dt.datetime.now(dt.timezone.utc)
+    cert = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(1).not_valid_before(now - dt.timedelta(days=1)).not_valid_after(now + dt.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    key_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    certs = json.dumps({"bench-kid": cert.public_bytes(serialization.Encoding.PEM).decode()}).encode()
+
+    issued = int(time.time())
+    token = jwt.encode(crypt.RSASigner.from_string(key_pem, key_id="bench-kid"), {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}", "aud": PROJECT_ID, "sub": "bench-user",
+        "auth_time": issued, "iat": issued, "exp": issued + 3600,
+    }).decode()
+
+    try:
+        app = firebase_admin.get_app()
+    except ValueError:
+        service_account = credentials.Certificate({
+            "type": "service_account", "project_id": PROJECT_ID, "private_key_id": "bench-kid",
+            "private_key": key_pem.decode(), "client_email": f"bench@{PROJECT_ID}.iam.gserviceaccount.com",
+            "token_uri": "https://oauth2.googleapis.com/token",
+        })
+        app = firebase_admin.initialize_app(service_account, {"projectId": PROJECT_ID})
+    verifier = auth._get_client(app)._token_verifier
+    verifier.request = lambda url, method="GET", **kwargs: _CertResponse(certs)
+    assert verify_token(token) == "bench-user"
+    return lambda: verify_token(token)
+
+
+CASES = {
+    "prompt@50": lambda: prompt_case(50),
+    "prompt@400": lambda: prompt_case(400),
+    "session@50": lambda: session_case(50),
+    "session@400": lambda: session_case(400),
+    "card@png": lambda: card_case("png"),
+    "card@webp": lambda: card_case("webp"),
+    "memories@500": lambda: memories_case(500),
+    "archives@100": lambda: archives_case(100),
+    "verify_token": verify_token_case,
+}
+
+
+def measure(fn, batch_ms: float, repeat: int) -> dict:
+    fn()  # warm up caches (fonts, templates, certificates)
+    loops, elapsed = 1, 0.0
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= batch_ms / 1000 or loops >= 1_000_000:
+            break
+        loops *= 2
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - started) / loops * 1e6)
+    return {
+        "median_us": round(statistics.median(samples), 2),
+        "best_us": round(min(samples), 2),
+        "calls_per_batch": loops,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help="Comma-separated case name prefixes to run")
+    parser.add_argument("--batch-ms", type=float, default=100)
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    args = parser.parse_args()
+
+    prefixes = tuple(args.only.split(",")) if args.only else ("",)
+    report = {}
+    for name, setup in CASES.items():
+        if not name.startswith(prefixes):
+            continue
+        report[name] = measure(setup(), args.batch_ms, args.repeat)
+        r = report[name]
+        print(f"{name:<14} median {r['median_us']:>10.2f} us  best {r['best_us']:>10.2f} us")
+    report["python"] = sys.version.split()[0]
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        failed = False
+        for name, r in report.items():
+            if name == "python" or name not in baseline:
+                continue
+            before, after = baseline[name]["best_us"], r["best_us"]
+            change = after / before - 1
+            print(f"{name:<14} {before:>10.2f} -> {after:>10.2f} us  ({change:+.0%})")
+            if change > args.tolerance:
+                print(f"REGRESSION: {name} best {before} -> {after} us")
+                failed = True
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Import-time report for worker cold start, based on `python -X importtime`.
+
+Measures, in fresh interpreters:
+- app:  `import app.main` (what every worker pays without preload_app)
+- sdks: the deferred SDKs from app.services.HEAVY_SDK_MODULES (what a worker
+        pays on first use, or the master pays once with preload_app)
+
+For each, it reports the median wall time, peak RSS and the top-level packages
+with the most self import time. With --compare it fails when app import
+time or RSS regressed by more than the tolerance.
+
+Usage:
+    python tests/benchmarks/importtime.py --output tests/benchmarks/importtime.json
+    python tests/benchmarks/importtime.py --compare tests/benchmarks/importtime.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TARGETS = {
+    "app": "import app.main",
+    "sdks": "from app.services import HEAVY_SDK_MODULES; import importlib; [importlib.import_module(m) for m in HEAVY_SDK_MODULES]",
+}
+
+# Wraps the target so the child reports its own wall time and peak RSS.
+PROBE = """
+import resource, time, json, sys
+t = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - t
+sys.stdout.write(json.dumps({{"seconds": elapsed, "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    Returns self import time in microseconds summed per top-level package,
+    so nested imports are charged to the package they belong to.
+    """
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_field, _, name_field = line.split("|")
+        self_us = int(self_field.split(":")[1])
+        top = name_field.strip().split(".")[0]
+        packages[top] = packages.get(top, 0) + self_us
+    return packages
+
+
+def measure(code: str, runs: int) -> dict:
+    samples = []
+    packages = {}
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROBE.format(code=code)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+        packages = parse_importtime(result.stderr)
+    top = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:10]
+    return {
+        "seconds": round(statistics.median(s["seconds"] for s in samples), 3),
+        "max_rss_mb": round(statistics.median(s["max_rss_mb"] for s in samples), 1),
+        "top_packages_ms": {name: round(us / 1000, 1) for name, us in top},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    args = parser.parse_args()
+
+    report = {name: measure(code, args.runs) for name, code in TARGETS.items()}
+    report["python"] = sys.version.split()[0]
+
+    for name in TARGETS:
+        r = report[name]
+        print(f"{name}: {r['seconds'] * 1000:.0f} ms, peak RSS {r['max_rss_mb']:.0f} MB")
+        for package, ms in r["top_packages_ms"].items():
+            print(f"    {package:<24} {ms:>8.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["app"]
+        current = report["app"]
+        failed = False
+        for metric in ("seconds", "max_rss_mb"):
+            if current[metric] > baseline[metric] * (1 + args.tolerance):
+                print(f"REGRESSION: app {metric} {baseline[metric]} -> {current[metric]}")
+                failed = True
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
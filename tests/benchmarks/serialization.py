@@ -0,0 +1,162 @@
+"""
+Response serialization cost of the hot list endpoints (GET /archive, GET /memory).
+
+Compares, per list item, the validated path the endpoints used before (build
+pydantic models in the service, validate them again against the route's
+response_model, dump to JSON-compatible Python, render with json.dumps) with
+the lean path they use now (plain dicts from the service rendered once with
+orjson by app.responses.NexJSONResponse). Firestore timestamps are
+DatetimeWithNanoseconds, as returned by the SDK. With --compare it fails when
+the lean path got slower by more than the tolerance.
+
+Usage:
+    python tests/benchmarks/serialization.py --output tests/benchmarks/serialization.json
+    python tests/benchmarks/serialization.py --compare tests/benchmarks/serialization.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import timezone
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from fastapi.responses import JSONResponse
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from pydantic import TypeAdapter
+
+from app.archive_service import ARCHIVE_FIELDS
+from app.models import Archive, MemoryItem, MemoryListResponse
+from app.responses import NexJSONResponse
+
+REFLECTION = (
+    "The tiredness you describe sounds less like weakness and more like the cost of carrying "
+    "too much for too long without setting any of it down."
+)
+
+
+def archive_docs(count: int) -> list[dict]:
+    return [
+        {
+            "archive_id": f"bench-{i:04d}",
+            "user_id": "bench",
+            "title": "Evening Thoughts",
+            "reflection": REFLECTION,
+            "emotion_tag": "reflective",
+            "created_at": DatetimeWithNanoseconds(2026, 1, 1 + i % 28, 21, 30, i % 60, 123456, tzinfo=timezone.utc),
+        }
+        for i in range(count)
+    ]
+
+
+def memory_docs(count: int) -> list[tuple[str, dict]]:
+    return [
+        (f"mem{i:016d}", {
+            "content": "Has a younger sister they are close to and talks to her most weekends.",
+            "created_at": DatetimeWithNanoseconds(2026, 1, 1 + i % 28, 9, 0, i % 60, 654321, tzinfo=timezone.utc),
+        })
+        for i in range(count)
+    ]
+
+
+def archives_validated(docs: list[dict], adapter: TypeAdapter) -> bytes:
+    archives = [Archive(**doc) for doc in docs]
+    content = adapter.dump_python(adapter.validate_python(archives), mode="json")
+    return JSONResponse(content).body
+
+
+def archives_lean(docs: list[dict]) -> bytes:
+    return NexJSONResponse([{field: doc[field] for field in ARCHIVE_FIELDS} for doc in docs]).body
+
+
+def memories_validated(docs: list[tuple[str, dict]], adapter: TypeAdapter) -> bytes:
+    items = [MemoryItem(id=doc_id, content=data["content"], created_at=data["created_at"].isoformat()) for doc_id, data in docs]
+    result = MemoryListResponse(memory_limit=20, memory_used=len(items), items=items)
+    content = adapter.dump_python(adapter.validate_python(result), mode="json")
+    return JSONResponse(content).body
+
+
+def memories_lean(docs: list[tuple[str, dict]]) -> bytes:
+    items = [{"id": doc_id, "content": data["content"], "created_at": data["created_at"].isoformat()} for doc_id, data in docs]
+    return NexJSONResponse({"memory_limit": 20, "memory_used": len(items), "items": items}).body
+
+
+def per_item_us(fn, items: int, rounds: int) -> float:
+    fn()  # warm up
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+        best = min(best, time.perf_counter() - started)
+    return round(best / rounds / items * 1e6, 3)
+
+
+def measure(name: str, validated, lean, items: int, rounds: int) -> dict:
+    before, after = validated(), lean()
+    # Both paths must produce the same document; only the byte layout may differ.
+    assert json.loads(before) == json.loads(after), f"{name}: lean and validated bodies differ"
+    validated_us = per_item_us(validated, items, rounds)
+    lean_us = per_item_us(lean, items, rounds)
+    return {
+        "items": items,
+        "validated_us_per_item": validated_us,
+        "lean_us_per_item": lean_us,
+        "speedup": round(validated_us / lean_us, 1),
+        "bytes_per_item": round(len(after) / items),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    args = parser.parse_args()
+
+    archive_adapter = TypeAdapter(List[Archive])
+    memory_adapter = TypeAdapter(MemoryListResponse)
+    report = {}
+    # GET /archive returns at most 10; memory lists run up to the top tier's limit.
+    for count in (10,):
+        docs = archive_docs(count)
+        report[f"archives@{count}"] = measure(
+            "archives", lambda: archives_validated(docs, archive_adapter), lambda: archives_lean(docs), count, args.rounds
+        )
+    for count in (20, 100):
+        docs = memory_docs(count)
+        report[f"memories@{count}"] = measure(
+            "memories", lambda: memories_validated(docs, memory_adapter), lambda: memories_lean(docs), count, args.rounds
+        )
+    report["python"] = sys.version.split()[0]
+
+    for name, r in report.items():
+        if name == "python":
+            continue
+        print(f"{name:<13} validated {r['validated_us_per_item']:>6.2f} us/item  "
+              f"lean {r['lean_us_per_item']:>6.2f} us/item  {r['speedup']:>5.1f}x  {r['bytes_per_item']:>4} B/item")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        failed = False
+        for name, r in report.items():
+            if name == "python" or name not in baseline:
+                continue
+            before, after = baseline[name]["lean_us_per_item"], r["lean_us_per_item"]
+            if after > before * (1 + args.tolerance):
+                print(f"REGRESSION: {name} lean us/item {before} -> {after}")
+                failed = True
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,619 @@
+"""
+In-process stand-ins for Firestore and Gemini used by the load-test server.
+
+FakeFirestore implements the subset of the google-cloud-firestore client API
+that the app uses (collections, documents, queries, field transforms) on top of
+a thread-safe in-memory dict. FakeGenerativeModel mimics
+vertexai.generative_models.GenerativeModel with configurable latency and error
+distributions so backend behaviour under a slow or flaky LLM can be measured.
+"""
+import copy
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import transforms
+
+
+# ---------------------------------------------------------------------------
+# Firestore
+# ---------------------------------------------------------------------------
+
+class FakeSnapshot:
+    def __init__(self, reference, data, create_time=None, update_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.create_time = create_time
+        self.update_time = update_time
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field: str):
+        value = self._data
+        for part in field.split("."):
+            value = value[part]
+        return copy.deepcopy(value)
+
+
+class FakeDocumentReference:
+    def __init__(self, client, path: tuple):
+        self._client = client
+        self._path = path
+
+    @property
+    def id(self) -> str:
+        return self._path[-1]
+
+    @property
+    def path(self) -> str:
+        return "/".join(self._path)
+
+    @property
+    def parent(self):
+        return FakeCollectionReference(self._client, self._path[:-1])
+
+    def collection(self, name: str):
+        return FakeCollectionReference(self._client, self._path + (name,))
+
+    def get(self, *args, **kwargs) -> FakeSnapshot:
+        self._client._tick()
+        with self._client._lock:
+            entry = self._client._docs.get(self._path)
+            if entry is None:
+                return FakeSnapshot(self, None)
+            return FakeSnapshot(self, copy.deepcopy(entry["data"]), entry["create_time"], entry["update_time"])
+
+    def set(self, data: dict, merge: bool = False, **kwargs):
+        self._client._tick()
+        return self._set(data, merge)
+
+    def _set(self, data: dict, merge: bool = False):
+        with self._client._lock:
+            now = datetime.now(timezone.utc)
+            entry = self._client._docs.get(self._path)
+            if entry is not None and merge:
+                base = entry["data"]
+            else:
+                base = {}
+            _apply_updates(base, data, now)
+            self._client._docs[self._path] = {
+                "data": base,
+                "create_time": entry["create_time"] if entry else now,
+                "update_time": now,
+            }
+        return SimpleNamespace(update_time=now)
+
+    def create(self, data: dict, **kwargs):
+        with self._client._lock:
+            if self._path in self._client._docs:
+                raise exceptions.AlreadyExists(f"Document already exists: {self.path}")
+        return self.set(data)
+
+    def update(self, data: dict, option=None, **kwargs):
+        self._client._tick()
+        return self._update(data, option)
+
+    def _update(self, data: dict, option=None):
+        with self._client._lock:
+            entry = self._client._docs.get(self._path)
+            if entry is None:
+                raise exceptions.NotFound(f"No document to update: {self.path}")
+            if option is not None and option.last_update_time != entry["update_time"]:
+                raise exceptions.FailedPrecondition(f"Document changed since last read: {self.path}")
+            now = datetime.now(timezone.utc)
+            _apply_updates(entry["data"], data, now)
+            entry["update_time"] = now
+        return SimpleNamespace(update_time=now)
+
+    def delete(self, option=None, **kwargs):
+        self._client._tick()
+        self._delete(option)
+
+    def _delete(self, option=None):
+        with self._client._lock:
+            entry = self._client._docs.get(self._path)
+            if option is not None and (entry is None or option.last_update_time != entry["update_time"]):
+                raise exceptions.FailedPrecondition(f"Document changed since last read: {self.path}")
+            self._client._docs.pop(self._path, None)
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocumentReference) and other._path == self._path
+
+    def __hash__(self):
+        return hash(self._path)
+
+
+class FakeQuery:
+    def __init__(self, client, parent_path: tuple, all_descendants: bool = False,
+                 filters=(), orders=(), limit=None, start_after=None, start_at=None, end_before=None, select=None):
+        self._client = client
+        self._parent_path = parent_path
+        self._all_descendants = all_descendants
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._start_after = start_after
+        self._start_at = start_at
+        self._end_before = end_before
+        self._select = select
+
+    def _copy(self, **changes):
+        state = dict(
+            filters=self._filters,
+            orders=self._orders,
+            limit=self._limit,
+            start_after=self._start_after,
+            start_at=self._start_at,
+            end_before=self._end_before,
+            select=self._select,
+        )
+        state.update(changes)
+        return FakeQuery(self._client, self._parent_path, self._all_descendants, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING"):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int):
+        return self._copy(limit=count)
+
+    def select(self, field_paths):
+        return self._copy(select=tuple(field_paths))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(start_after=document_fields_or_snapshot)
+
+    # start_at / end_before only support document-name cursors ({"__name__": ref}).
+    def start_at(self, document_fields_or_snapshot):
+        return self._copy(start_at=_cursor_path(document_fields_or_snapshot))
+
+    def end_before(self, document_fields_or_snapshot):
+        return self._copy(end_before=_cursor_path(document_fields_or_snapshot))
+
+    def count(self, alias: str = None):
+        """
+        Aggregation query returning the number of matching documents.
+        """
+        query = self
+        return SimpleNamespace(get=lambda *args, **kwargs: [[SimpleNamespace(alias=alias, value=len(query.get()))]])
+
+    def get_partitions(self, partition_count: int, **kwargs):
+        """
+        Splits the matching documents into up to `partition_count` ranges of
+        document names, like CollectionGroup.get_partitions.
+        """
+        paths = sorted(path for path in self._client._docs if self._matches(path))
+        size = max(1, -(-len(paths) // partition_count))
+        bounds = [FakeDocumentReference(self._client, path) for path in paths[size::size]]
+        for start, end in zip([None] + bounds, bounds + [None]):
+            yield SimpleNamespace(start_at=start, end_at=end)
+
+    def _matches(self, path: tuple) -> bool:
+        parent = path[:-1]
+        if self._all_descendants:
+            return parent[-1] == self._parent_path[-1]
+        return parent == self._parent_path
+
+    def stream(self, *args, **kwargs):
+        self._client._tick()
+        with self._client._lock:
+            snapshots = [
+                FakeSnapshot(FakeDocumentReference(self._client, path), copy.deepcopy(entry["data"]),
+                             entry["create_time"], entry["update_time"])
+                for path, entry in self._client._docs.items()
+                if self._matches(path)
+            ]
+
+        snapshots = [s for s in snapshots if all(_compare(_lookup(s._data, f), op, v) for f, op, v in self._filters)]
+
+        # Sort one key at a time (last key first) so mixed directions work.
+        orders = list(self._orders) or [("__name__", "ASCENDING")]
+        for field, direction in reversed(orders):
+            snapshots.sort(
+                key=lambda s: (s.reference.path if field == "__name__" else _sortable(_lookup(s._data, field))),
+                reverse=(direction == "DESCENDING"),
+            )
+
+        if self._start_after is not None:
+            cursor = self._start_after
+            cursor_path = _cursor_path(cursor)
+            if isinstance(cursor, dict) and cursor_path is not None:
+                snapshots = [s for s in snapshots if s.reference.path > cursor_path]
+            elif cursor_path is not None:
+                for index, snapshot in enumerate(snapshots):
+                    if snapshot.reference.path == cursor_path:
+                        snapshots = snapshots[index + 1:]
+                        break
+        if self._start_at is not None:
+            snapshots = [s for s in snapshots if s.reference.path >= self._start_at]
+        if self._end_before is not None:
+            snapshots = [s for s in snapshots if s.reference.path < self._end_before]
+
+        if self._limit is not None:
+            snapshots = snapshots[: self._limit]
+        if self._select is not None:
+            for snapshot in snapshots:
+                snapshot._data = {f: snapshot._data[f] for f in self._select if f in snapshot._data}
+
+        for snapshot in snapshots:
+            yield snapshot
+
+    def get(self, *args, **kwargs):
+        return list(self.stream())
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, path: tuple):
+        super().__init__(client, path)
+        self._path = path
+
+    @property
+    def id(self) -> str:
+        return self._path[-1]
+
+    def document(self, document_id: str = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self._client, self._path + (document_id or uuid.uuid4().hex[:20],))
+
+    def add(self, data: dict):
+        ref = self.document()
+        result = ref.set(data)
+        return result.update_time, ref
+
+
+_MUST_NOT_EXIST = object()
+
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, reference, data, merge=False):
+        self._ops.append((None, reference, lambda: reference._set(data, merge=merge)))
+
+    def create(self, reference, data):
+        self._ops.append((_MUST_NOT_EXIST, reference, lambda: reference._set(data)))
+
+    def update(self, reference, data, option=None):
+        self._ops.append((option, reference, lambda: reference._update(data)))
+
+    def delete(self, reference, option=None):
+        self._ops.append((option, reference, lambda: reference._delete()))
+
+    def commit(self, **kwargs):
+        # One round trip, all-or-nothing: preconditions are checked before anything is written.
+        self._client._tick()
+        with self._client._lock:
+            for option, reference, _ in self._ops:
+                entry = self._client._docs.get(reference._path)
+                if option is _MUST_NOT_EXIST:
+                    if entry is not None:
+                        raise exceptions.AlreadyExists(f"Document already exists: {reference.path}")
+                elif option is not None and (entry is None or option.last_update_time != entry["update_time"]):
+                    raise exceptions.FailedPrecondition(f"Document changed since last read: {reference.path}")
+            for _, _, op in self._ops:
+                op()
+        self._ops = []
+
+
+class FakeFirestore:
+    """
+    Thread-safe in-memory Firestore client.
+    `latency_ms` adds a fixed delay to every round trip to approximate a remote database.
+    """
+    def __init__(self, latency_ms: float = None):
+        if latency_ms is None:
+            latency_ms = float(os.getenv("NEX_FAKE_FIRESTORE_LATENCY_MS", "0"))
+        self._latency = latency_ms / 1000.0
+        self._docs: dict[tuple, dict] = {}
+        self._lock = threading.RLock()
+
+    def _tick(self):
+        if self._latency:
+            time.sleep(self._latency)
+
+    def collection(self, name: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, (name,))
+
+    def collection_group(self, name: str) -> FakeQuery:
+        return FakeQuery(self, (name,), all_descendants=True)
+
+    def document(self, path: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self, tuple(path.split("/")))
+
+    def get_all(self, references, *args, **kwargs):
+        self._tick()
+        for ref in references:
+            with self._lock:
+                entry = self._docs.get(ref._path)
+                if entry is None:
+                    yield FakeSnapshot(ref, None)
+                else:
+                    yield FakeSnapshot(ref, copy.deepcopy(entry["data"]), entry["create_time"], entry["update_time"])
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    @staticmethod
+    def write_option(last_update_time=None, **kwargs):
+        return SimpleNamespace(last_update_time=last_update_time)
+
+
+def _cursor_path(cursor):
+    if isinstance(cursor, FakeSnapshot):
+        return cursor.reference.path
+    if isinstance(cursor, dict):
+        cursor = cursor.get("__name__")
+    return getattr(cursor, "path", None)
+
+
+def _lookup(data: dict, field: str):
+    value = data
+    for part in field.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _sortable(value):
+    # None sorts first, like Firestore's null ordering.
+    if value is None:
+        return (0, 0)
+    if isinstance(value, datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (1, value)
+
+
+def _compare(left, op: str, right) -> bool:
+    if isinstance(left, datetime) and left.tzinfo is None:
+        left = left.replace(tzinfo=timezone.utc)
+    if isinstance(right, datetime) and right.tzinfo is None:
+        right = right.replace(tzinfo=timezone.utc)
+    if op == "==":
+        return left == right
+    if op == "!=":
+        return left != right
+    if op == "in":
+        return left in right
+    if op == "not-in":
+        return left not in right
+    if op == "array_contains":
+        return isinstance(left, list) and right in left
+    if op == "array_contains_any":
+        return isinstance(left, list) and any(value in left for value in right)
+    if left is None:
+        return False
+    try:
+        if op == "<":
+            return left < right
+        if op == "<=":
+            return left <= right
+        if op == ">":
+            return left > right
+        if op == ">=":
+            return left >= right
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported operator: {op}")
+
+
+def _apply_updates(target: dict, updates: dict, now: datetime):
+    for key, value in updates.items():
+        parts = key.split(".")
+        container = target
+        for part in parts[:-1]:
+            container = container.setdefault(part, {})
+        field = parts[-1]
+
+        if value is transforms.DELETE_FIELD:
+            container.pop(field, None)
+        elif value is transforms.SERVER_TIMESTAMP:
+            container[field] = now
+        elif isinstance(value, transforms.Increment):
+            container[field] = (container.get(field) or 0) + value.value
+        elif isinstance(value, transforms.ArrayUnion):
+            current = list(container.get(field) or [])
+            for item in value.values:
+                if item not in current:
+                    current.append(copy.deepcopy(item))
+            container[field] = current
+        elif isinstance(value, transforms.ArrayRemove):
+            container[field] = [item for item in (container.get(field) or []) if item not in value.values]
+        else:
+            container[field] = copy.deepcopy(value)
+
+
+# ---------------------------------------------------------------------------
+# Gemini
+# ---------------------------------------------------------------------------
+
+class GeminiProfile:
+    """
+    Latency and error distribution for FakeGenerativeModel.
+
+    Latency is log-normal around `median_ms` with shape `sigma`, which gives the
+    long right tail real LLM calls have. `error_rates` maps an error kind
+    (resource_exhausted, unavailable, internal) to its probability per call.
+    """
+    ERRORS = {
+        "resource_exhausted": exceptions.ResourceExhausted,
+        "unavailable": exceptions.ServiceUnavailable,
+        "internal": exceptions.InternalServerError,
+    }
+
+    def __init__(self, median_ms: float = 800, sigma: float = 0.35, error_rates: dict = None, seed: int = None):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rates = error_rates or {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "GeminiProfile":
+        rates = {}
+        for pair in filter(None, os.getenv("NEX_FAKE_GEMINI_ERRORS", "").split(",")):
+            kind, _, rate = pair.partition("=")
+            rates[kind.strip()] = float(rate)
+        seed = os.getenv("NEX_FAKE_GEMINI_SEED")
+        return cls(
+            median_ms=float(os.getenv("NEX_FAKE_GEMINI_LATENCY_MS", "800")),
+            sigma=float(os.getenv("NEX_FAKE_GEMINI_LATENCY_SIGMA", "0.35")),
+            error_rates=rates,
+            seed=int(seed) if seed else None,
+        )
+
+    def sample(self) -> tuple[float, type | None]:
+        with self._lock:
+            delay = self._random.lognormvariate(0, self.sigma) * self.median_ms / 1000.0
+            roll = self._random.random()
+        for kind, rate in self.error_rates.items():
+            if roll < rate:
+                return delay, self.ERRORS[kind]
+            roll -= rate
+        return delay, None
+
+    def describe(self) -> dict:
+        return {"median_ms": self.median_ms, "sigma": self.sigma, "error_rates": self.error_rates}
+
+    @classmethod
+    def regions_from_env(cls, default: "GeminiProfile") -> dict:
+        """
+        Per-region profiles, for trying out the region pool:
+        NEX_FAKE_GEMINI_REGIONS="asia-south1=300,us-central1=900" sets a
+        region's median latency, NEX_FAKE_GEMINI_REGION_ERRORS=
+        "asia-south1=resource_exhausted:0.5" its error rates (in place of
+        NEX_FAKE_GEMINI_ERRORS). Other regions use `default`.
+        """
+        medians, rates = {}, {}
+        for pair in filter(None, os.getenv("NEX_FAKE_GEMINI_REGIONS", "").split(",")):
+            region, _, median = pair.partition("=")
+            medians[region.strip()] = float(median)
+        for pair in filter(None, os.getenv("NEX_FAKE_GEMINI_REGION_ERRORS", "").split(",")):
+            region, _, error = pair.partition("=")
+            kind, _, rate = error.partition(":")
+            rates.setdefault(region.strip(), {})[kind.strip()] = float(rate)
+        return {
+            region: cls(medians.get(region, default.median_ms), default.sigma, rates.get(region, default.error_rates))
+            for region in set(medians) | set(rates)
+        }
+
+
+_REPLIES = [
+    "That sounds heavy. What part of it sits with you the most?",
+    "Fair. Some days just drag. Anything small that went right?",
+    "I hear the frustration in that. What would you tell a friend in the same spot?",
+]
+_MEMORIES = [
+    "Works late most evenings.",
+    "Has a younger sister they are close to.",
+    None,
+    None,
+]
+_EMOTIONS = ["hopeful", "conflicted", "lonely", "weary", "determined", "peaceful", "reflective"]
+
+
+class FakeGenerativeModel:
+    """
+    Drop-in for vertexai.generative_models.GenerativeModel.
+    Returns schema-shaped JSON for interact turns, reflections and memory profiles.
+    """
+    profile = GeminiProfile.from_env()
+    region_profiles = GeminiProfile.regions_from_env(profile)
+
+    def __init__(self, model_name: str, *, system_instruction=None, **kwargs):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        # projects/{project}/locations/{region}/publishers/google/models/{model}
+        parts = model_name.split("/")
+        region = parts[3] if len(parts) > 3 and parts[2] == "locations" else None
+        self.profile = self.region_profiles.get(region, self.profile)
+
+    def _sample(self):
+        delay, error = self.profile.sample()
+        time.sleep(delay)
+        if error is not None:
+            raise error("Fake Gemini error")
+
+    def _payload(self, prompt) -> str:
+        prompt = str(prompt)
+        if "Analyze the following conversation transcript" in prompt:
+            return json.dumps({
+                "title": "Evening Thoughts",
+                "reflection": "Some weight is lighter once it is said out loud.",
+                "emotion_tag": random.choice(_EMOTIONS),
+            })
+        if "Condense the following memories" in prompt:
+            memories = prompt.split('"""')[-2].strip().splitlines()
+            return json.dumps({
+                "themes": ["Looking for steadiness"],
+                "facts": list(dict.fromkeys(memories))[:15],
+            })
+        return json.dumps({
+            "reply": random.choice(_REPLIES),
+            "vibe_check": random.choice(["anchoring", "echoing", "drifting"]),
+            "memory": random.choice(_MEMORIES),
+        })
+
+    def generate_content(self, contents, generation_config=None, **kwargs):
+        self._sample()
+        return SimpleNamespace(text=self._payload(contents))
+
+    async def generate_content_async(self, contents, generation_config=None, **kwargs):
+        import asyncio
+        delay, error = self.profile.sample()
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error("Fake Gemini error")
+        return SimpleNamespace(text=self._payload(contents))
+
+
+class RegionStubServer:
+    """
+    Stand-in Vertex regional endpoints for the region pool's latency probes:
+    GET /{region} answers 204 after that region's round trip, from
+    NEX_FAKE_REGION_RTT_MS="asia-south1=20,us-central1=240" (others 50 ms).
+    Point NEX_REGION_PROBE_URL at http://127.0.0.1:{port}/{region}.
+    """
+    def __init__(self, port: int = 0):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        rtts = {}
+        for pair in filter(None, os.getenv("NEX_FAKE_REGION_RTT_MS", "").split(",")):
+            region, _, rtt = pair.partition("=")
+            rtts[region.strip()] = float(rtt) / 1000.0
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(rtts.get(self.path.strip("/"), 0.05))
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="region-stubs", daemon=True).start()
+
+    @property
+    def probe_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/{{region}}"
+
+    def close(self):
+        self._server.shutdown()
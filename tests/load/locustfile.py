@@ -0,0 +1,89 @@
+"""
+Locust load test modelling a full NEX user journey.
+
+Each simulated user bootstraps, upgrades to TIER_2 (so repeated sessions are not
+blocked by the free-tier daily limit), then loops over:
+session start -> N interacts -> memory CRUD -> session end -> archive list/get/download.
+Polled endpoints (archive list, subscription status) are requested with the last
+ETag seen, like the app does, so unchanged answers come back as 304s.
+
+Usage (against tests/load/server.py):
+    python tests/load/server.py --port 8089 &
+    locust -f tests/load/locustfile.py --host http://127.0.0.1:8089 \\
+        --headless -u 50 -r 10 -t 2m --csv tests/load/results/run
+    python tests/load/report.py tests/load/results/run_stats.csv --baseline tests/load/baseline.json
+
+NEX_LOAD_TURNS sets the number of interacts per session (default 4). TIER_2 allows
+50 messages per user per day, so keep runs short enough that users stay under it.
+"""
+import os
+import uuid
+
+from locust import HttpUser, between, task
+
+TURNS_PER_SESSION = int(os.getenv("NEX_LOAD_TURNS", "4"))
+
+USER_INPUTS = [
+    "I feel a bit lost today.",
+    "Work was exhausting, my manager keeps moving deadlines.",
+    "I called my sister after a long time, it was nice.",
+    "Not sure why, but I can't sleep lately.",
+]
+
+
+class NexUser(HttpUser):
+    wait_time = between(0.5, 2)
+
+    def on_start(self):
+        self.uid = f"load_{uuid.uuid4().hex[:12]}"
+        self.client.headers["Authorization"] = f"Bearer {self.uid}"
+        self.client.post("/auth/bootstrap")
+        self.client.post("/subscription/upgrade", json={"new_tier": "TIER_2"})
+        self.etags = {}
+
+    def poll(self, url: str):
+        headers = {"If-None-Match": self.etags[url]} if url in self.etags else {}
+        response = self.client.get(url, headers=headers)
+        if response.status_code == 200 and "ETag" in response.headers:
+            self.etags[url] = response.headers["ETag"]
+
+    @task
+    def session_journey(self):
+        with self.client.post("/session/start", catch_response=True) as response:
+            if response.status_code != 200:
+                response.failure(f"start failed: {response.status_code}")
+                return
+            session_id = response.json()["session_id"]
+
+        for turn in range(TURNS_PER_SESSION):
+            self.client.post(
+                "/nex/interact",
+                json={"input": USER_INPUTS[turn % len(USER_INPUTS)], "session_id": session_id},
+                headers={"Idempotency-Key": uuid.uuid4().hex},
+            )
+
+        self.memory_crud()
+
+        with self.client.post("/session/end", json={"session_id": session_id}, catch_response=True) as response:
+            if response.status_code != 200:
+                response.failure(f"end failed: {response.status_code}")
+                return
+            archive_id = response.json()["archive_id"]
+
+        self.poll("/archive")
+        self.client.get(f"/archive/{archive_id}", name="/archive/[id]")
+        self.client.post(f"/archive/{archive_id}/download", name="/archive/[id]/download")
+        self.poll("/subscription/status")
+
+    def memory_crud(self):
+        self.client.post("/memory", json={"content": f"Load test fact {uuid.uuid4().hex[:6]}"})
+        response = self.client.get("/memory")
+        if response.status_code != 200:
+            return
+        items = response.json()["items"]
+        if not items:
+            return
+        memory_id = items[0]["id"]
+        self.client.get(f"/memory/{memory_id}", name="/memory/[id]")
+        self.client.put(f"/memory/{memory_id}", json={"content": "Updated fact"}, name="/memory/[id]")
+        self.client.delete(f"/memory/{memory_id}", name="/memory/[id]")
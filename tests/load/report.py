@@ -0,0 +1,122 @@
+"""
+Summarises a Locust run per endpoint and compares it against a stored baseline.
+
+Reads the `<prefix>_stats.csv` file written by `locust --csv <prefix>` and prints
+p50/p95/p99 latency, throughput and failure rate per endpoint. With --baseline,
+exits non-zero when any endpoint regressed beyond the tolerance.
+
+Usage:
+    python tests/load/report.py tests/load/results/run_stats.csv --baseline tests/load/baseline.json
+    python tests/load/report.py tests/load/results/run_stats.csv --write-baseline tests/load/baseline.json \\
+        --run-args="-u 20 -r 10 -t 60s"
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+# Fractional slowdown (or throughput drop) tolerated before a run is flagged.
+DEFAULT_TOLERANCE = 0.25
+# Latency deltas below this many ms are noise, whatever the ratio.
+MIN_LATENCY_DELTA_MS = 50
+# p99 of a small sample is effectively the max; only gate on it with enough requests.
+MIN_REQUESTS_FOR_P99 = 200
+
+
+def load_stats(path: str) -> dict:
+    stats = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            if row["Name"] == "Aggregated":
+                key = "Aggregated"
+            else:
+                key = f"{row['Type']} {row['Name']}"
+            requests = int(row["Request Count"])
+            failures = int(row["Failure Count"])
+            stats[key] = {
+                "requests": requests,
+                "failure_rate": round(failures / requests, 4) if requests else 0.0,
+                "p50": float(row["50%"] or 0),
+                "p95": float(row["95%"] or 0),
+                "p99": float(row["99%"] or 0),
+                "rps": round(float(row["Requests/s"] or 0), 2),
+            }
+    return stats
+
+
+def print_table(stats: dict, baseline: dict = None):
+    header = f"{'endpoint':<34} {'reqs':>6} {'fail%':>6} {'p50':>7} {'p95':>7} {'p99':>7} {'req/s':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, s in sorted(stats.items(), key=lambda kv: (kv[0] == "Aggregated", kv[0])):
+        line = (
+            f"{name:<34} {s['requests']:>6} {s['failure_rate'] * 100:>5.1f}% "
+            f"{s['p50']:>7.0f} {s['p95']:>7.0f} {s['p99']:>7.0f} {s['rps']:>7.2f}"
+        )
+        if baseline and name in baseline:
+            b = baseline[name]
+            line += f"   (baseline p95 {b['p95']:.0f}, p99 {b['p99']:.0f}, {b['rps']:.2f} req/s)"
+        print(line)
+
+
+def compare(stats: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, base in baseline.items():
+        current = stats.get(name)
+        if current is None:
+            regressions.append(f"{name}: missing from this run")
+            continue
+        metrics = ("p95", "p99") if current["requests"] >= MIN_REQUESTS_FOR_P99 else ("p95",)
+        for metric in metrics:
+            delta = current[metric] - base[metric]
+            if delta > MIN_LATENCY_DELTA_MS and current[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {base[metric]:.0f}ms -> {current[metric]:.0f}ms")
+        if name == "Aggregated" and current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['rps']:.2f} -> {current['rps']:.2f} req/s")
+        if current["failure_rate"] > base["failure_rate"] + 0.01:
+            regressions.append(
+                f"{name}: failure rate {base['failure_rate'] * 100:.1f}% -> {current['failure_rate'] * 100:.1f}%"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("stats_csv")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--write-baseline", help="Store this run as the baseline at the given path")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--run-args", default="", help="Locust arguments used for the run, stored with the baseline")
+    args = parser.parse_args()
+
+    stats = load_stats(args.stats_csv)
+
+    if args.write_baseline:
+        config = {k: v for k, v in os.environ.items() if k.startswith(("NEX_FAKE_", "NEX_LOAD_"))}
+        if args.run_args:
+            config["locust"] = args.run_args
+        with open(args.write_baseline, "w") as f:
+            json.dump({"config": config, "endpoints": stats}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.write_baseline}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["endpoints"]
+
+    print_table(stats, baseline)
+
+    if baseline:
+        regressions = compare(stats, baseline, args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for r in regressions:
+                print(f"  - {r}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
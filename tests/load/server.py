@@ -0,0 +1,65 @@
+"""
+Runs the NEX API with local stand-ins for its Google dependencies, for load testing.
+
+- Firestore: the Firestore emulator when FIRESTORE_EMULATOR_HOST is set,
+  otherwise the in-process FakeFirestore.
+- Gemini: FakeGenerativeModel (see NEX_FAKE_GEMINI_* in fakes.py).
+- Vertex region probes: RegionStubServer when NEX_FAKE_REGION_RTT_MS is set.
+- Firebase Auth: the bearer token (HTTP or WebSocket) is taken as the uid, so
+  Locust users can authenticate as themselves without minting ID tokens.
+- Shared cache: whatever NEX_CACHE_URL points at (memory:// or a local Redis).
+
+Usage:
+    python tests/load/server.py --port 8089
+"""
+import argparse
+import os
+import sys
+from types import SimpleNamespace
+
+import uvicorn
+
+# Add app to path
+sys.path.append(os.getcwd())
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeFirestore, FakeGenerativeModel, RegionStubServer
+from app.main import app
+from app.services import services
+from app.cache import shared_cache
+from app.region_pool import region_pool
+
+
+async def _init_local_services():
+    if os.getenv("FIRESTORE_EMULATOR_HOST"):
+        from google.cloud import firestore
+        services.db = firestore.Client(project=os.getenv("GOOGLE_CLOUD_PROJECT", "nex-load-test"))
+    else:
+        services.db = FakeFirestore()
+    await shared_cache.connect()
+
+
+def install_fakes():
+    from firebase_admin import auth
+    from vertexai import generative_models
+
+    services.init_services = _init_local_services
+    # Auth certs and Vertex tokens need real Google credentials; warm up the rest.
+    warmup_steps = services.warmup_steps
+    services.warmup_steps = lambda: {k: v for k, v in warmup_steps().items() if k in ("firestore", "fonts")}
+    services.vertex_initialized = True
+    auth.verify_id_token = lambda token, **kwargs: {"uid": token}
+    auth.get_user = lambda uid: SimpleNamespace(uid=uid, email=f"{uid}@load.test")
+    generative_models.GenerativeModel = FakeGenerativeModel
+    if os.getenv("NEX_FAKE_REGION_RTT_MS"):
+        region_pool.probe_url = RegionStubServer().probe_url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    args = parser.parse_args()
+
+    install_fakes()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)